@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import os
+import tempfile
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from thermal_local.db.connection import writer
+from thermal_local.db.migrations import migrate_sqlite
+from thermal_local.db.points import DATASET_COLUMNS
+from thermal_local.services import measurements
+
+
+@pytest.fixture(params=["single", "sharded"])
+def db_path(request, tmp_path: Path) -> Path:
+    """A fresh local database in each storage layout."""
+    path = tmp_path / "db" / "app.db"
+    path.parent.mkdir()
+    migrate_sqlite(path, layout=request.param)
+    return path
+
+
+@pytest.fixture
+def single_db_path(tmp_path: Path) -> Path:
+    path = tmp_path / "db" / "app.db"
+    path.parent.mkdir()
+    migrate_sqlite(path, layout="single")
+    return path
+
+
+@pytest.fixture
+def no_server(monkeypatch) -> None:
+    """Skip the server side of local writes (soft deletes)."""
+    monkeypatch.setattr(measurements, "_sync_soft_delete_to_server", lambda ids: None)
+
+
+@pytest.fixture(scope="session")
+def server_dsn():
+    """
+    A throwaway PostgreSQL standing in for the server: THERMAL_TEST_SERVER_DSN if
+    set, else a local one started with `pgserver` if installed, else skip.
+    """
+    dsn = os.environ.get("THERMAL_TEST_SERVER_DSN")
+    if dsn:
+        yield dsn
+        return
+    pgserver = pytest.importorskip("pgserver")
+    server = pgserver.get_server(tempfile.mkdtemp(), cleanup_mode="stop")
+    yield server.get_uri()
+    server.cleanup()
+
+
+@pytest.fixture
+def server_config(server_dsn):
+    """psycopg2.connect() arguments for a fresh, empty schema on the stand-in server."""
+    psycopg2 = pytest.importorskip("psycopg2")
+    schema = f"t_{uuid.uuid4().hex[:12]}"
+    admin = psycopg2.connect(server_dsn)
+    admin.autocommit = True
+    admin.cursor().execute(f"CREATE SCHEMA {schema}")
+    yield {"dsn": server_dsn, "options": f"-csearch_path={schema}"}
+    admin.cursor().execute(f"DROP SCHEMA {schema} CASCADE")
+    admin.close()
+
+
+@pytest.fixture
+def server(server_config):
+    """connect() for a fresh schema on the stand-in server, with the server's measurements table."""
+    import psycopg2
+
+    def connect():
+        return psycopg2.connect(**server_config)
+
+    with connect() as conn:
+        conn.cursor().execute(
+            """
+            CREATE TABLE measurements (
+                id TEXT PRIMARY KEY,
+                device_id TEXT NOT NULL,
+                num_order INTEGER NOT NULL,
+                name TEXT,
+                created_by TEXT,
+                created_at TEXT
+            )
+            """
+        )
+    conn.close()
+    yield connect
+
+
+@pytest.fixture
+def full_server(server, server_config, monkeypatch):
+    """
+    `server` with every table the app reads and writes, and the app's server
+    connections (SERVER_DB_CONFIG) pointed at it.
+    """
+    from thermal_local.db.migrations import migrate_server
+    from thermal_local.services import reconcile, snapshot, sync
+
+    with server() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            CREATE TABLE users (
+                id TEXT PRIMARY KEY, username TEXT, role TEXT, active BOOLEAN,
+                hashed_password TEXT, created_at TEXT
+            );
+            CREATE TABLE devices (
+                id TEXT PRIMARY KEY, name TEXT UNIQUE, structure_json TEXT, experiment_by TEXT,
+                created_by TEXT, created_at TEXT, is_delete BOOLEAN NOT NULL DEFAULT FALSE
+            );
+            ALTER TABLE measurements ADD COLUMN is_delete BOOLEAN NOT NULL DEFAULT FALSE;
+            """
+        )
+        for table, cols in DATASET_COLUMNS.items():
+            cur.execute(
+                f"""
+                CREATE TABLE {table} (
+                    id TEXT PRIMARY KEY,
+                    measurement_id TEXT NOT NULL,
+                    {', '.join(f'{c} DOUBLE PRECISION' for c in cols)},
+                    is_delete BOOLEAN NOT NULL DEFAULT FALSE
+                )
+                """
+            )
+        migrate_server(cur)
+    for module in (measurements, reconcile, snapshot, sync):
+        monkeypatch.setattr(module, "SERVER_DB_CONFIG", server_config)
+    return server
+
+
+def add_measurement(db_path: Path, measurement_id: str, *, device: str = "D1", created_by: str = "alice") -> str:
+    with writer(db_path) as conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO devices (id, name, is_delete) VALUES (?, ?, 0)",
+            (f"dev-{device}", device),
+        )
+        conn.execute(
+            """
+            INSERT INTO measurements (id, device_id, name, num_order, created_by, created_at, is_delete)
+            SELECT ?, ?, ?, COALESCE(MAX(num_order), 0) + 1, ?, '2024-01-01T00:00:00', 0
+            FROM measurements WHERE device_id = ?
+            """,
+            (measurement_id, f"dev-{device}", measurement_id, created_by, f"dev-{device}"),
+        )
+    return measurement_id
+
+
+def step_trace(n: int = 100, *, onset: float = 0.0, tau: float = 1.0) -> pd.DataFrame:
+    t = np.linspace(0.0, 10.0, n)
+    v = np.where(t < onset, 0.0, 1.0 - np.exp(-(t - onset) / tau))
+    return pd.DataFrame({"time": t, "voltage": v})
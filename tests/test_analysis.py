@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import numpy as np
+
+from tests.conftest import add_measurement
+from thermal_local.db.connection import writer
+from thermal_local.db.shards import points_writer, shard_of
+from thermal_local.services import analysis
+from thermal_local.services.analysis import cole_impedance, get_cole_cole_fit
+from thermal_local.services.measurements import replace_dataset, soft_delete_measurements
+from thermal_local.services.point_cache import invalidate_points
+
+
+def _cole_cole(n: int) -> np.ndarray:
+    freq = np.logspace(1, 6, n)
+    z = cole_impedance(freq, 1000.0, 100.0, 1e-4, 0.1)
+    return np.column_stack([freq, z.real, -z.imag, np.full(n, np.nan)])
+
+
+def _replace(db_path, measurement_id, values) -> None:
+    with points_writer(db_path, shard_of(db_path, measurement_id)) as conn:
+        replace_dataset(conn.cursor(), measurement_id, "cole_cole", values)
+
+
+def test_replacing_data_drops_the_cached_fit(db_path):
+    mid = add_measurement(db_path, "m1")
+    _replace(db_path, mid, _cole_cole(40))
+    assert get_cole_cole_fit(db_path, mid) is not None
+
+    _replace(db_path, mid, _cole_cole(3))  # too few points to fit
+    assert get_cole_cole_fit(db_path, mid) is None
+
+
+def test_deleting_a_measurement_drops_its_cached_fit(db_path, no_server):
+    mid = add_measurement(db_path, "m1")
+    _replace(db_path, mid, _cole_cole(40))
+    assert get_cole_cole_fit(db_path, mid) is not None
+
+    soft_delete_measurements(db_path, [mid], username="alice")
+    assert get_cole_cole_fit(db_path, mid) is None
+
+
+def test_cached_fit_is_served_without_reading_points_until_they_change(db_path, monkeypatch):
+    mid = add_measurement(db_path, "m1")
+    _replace(db_path, mid, _cole_cole(40))
+    first = get_cole_cole_fit(db_path, mid)
+
+    reads = []
+    read_all = analysis._read_all_cole_cole
+    monkeypatch.setattr(analysis, "_read_all_cole_cole", lambda *a: reads.append(a) or read_all(*a))
+    assert get_cole_cole_fit(db_path, mid) == first
+    assert reads == []
+
+    with writer(db_path) as conn:
+        invalidate_points(conn.cursor())  # e.g. a sync: same data, new version
+    assert get_cole_cole_fit(db_path, mid) == first  # checked by hash, not refitted
+    assert get_cole_cole_fit(db_path, mid) == first
+    assert len(reads) == 1
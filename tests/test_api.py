@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import http.client
+import json
+import socket
+import threading
+
+import pytest
+
+from tests.conftest import add_measurement
+from thermal_local.db.connection import writer
+from thermal_local.db.shards import shard_files
+from thermal_local.services import api
+
+
+@pytest.fixture
+def server(db_path):
+    server = api.ApiServer(db_path, ("127.0.0.1", 0), pool_size=2)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(server):
+    def get(path: str) -> tuple[int, bytes]:
+        conn = http.client.HTTPConnection(*server.server_address, timeout=10)
+        try:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            return response.status, response.read()
+        finally:
+            conn.close()
+
+    return get
+
+
+def test_deleted_devices_are_hidden(db_path, client):
+    add_measurement(db_path, "m1", device="D1")
+    add_measurement(db_path, "m2", device="D2")
+    with writer(db_path) as conn:
+        conn.execute("UPDATE devices SET is_delete = 1 WHERE name = 'D2'")
+
+    status, body = client("/devices")
+    assert status == 200
+    assert [d["name"] for d in json.loads(body)] == ["D1"]
+    assert client("/devices/D2/measurements")[0] == 404
+    assert client("/measurements/m2")[0] == 404
+
+
+def test_points_of_a_device_without_a_shard_are_read_without_creating_it(db_path, client):
+    add_measurement(db_path, "m1")
+    shards_before = shard_files(db_path)
+
+    status, body = client("/measurements/m1/standard_plot")
+    assert status == 200
+    assert json.loads(body)["n_rows"] == 0
+    assert client("/measurements/m1")[0] == 200
+    assert shard_files(db_path) == shards_before
+
+
+def test_error_mid_stream_aborts_the_response(db_path, server, monkeypatch):
+    add_measurement(db_path, "m1")
+
+    def failing_chunks(*args):
+        yield b'{"measurement_id": "m1"'
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(api, "json_chunks", failing_chunks)
+    with socket.create_connection(server.server_address, timeout=10) as sock:
+        sock.sendall(b"GET /measurements/m1/standard_plot HTTP/1.1\r\nHost: test\r\n\r\n")
+        received = b""
+        while data := sock.recv(65536):  # times out unless the server closes
+            received += data
+
+    assert received.startswith(b"HTTP/1.1 200")
+    assert received.count(b"HTTP/1.1") == 1  # no error response inside the body
+    assert not received.endswith(b"0\r\n\r\n")  # truncated, not terminated
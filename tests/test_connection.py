@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import threading
+
+from thermal_local.db.connection import ReadPool, writer
+
+
+def test_readers_never_block_or_see_partial_writes_while_writers_run(single_db_path):
+    with writer(single_db_path) as conn:
+        conn.execute("CREATE TABLE counter (id INTEGER PRIMARY KEY, a INTEGER, b INTEGER)")
+        conn.execute("INSERT INTO counter VALUES (1, 0, 0)")
+
+    writers, increments = 4, 50
+    pool = ReadPool(single_db_path, size=4)
+    done = threading.Event()
+    errors: list[BaseException] = []
+    reads = [0]
+
+    def write() -> None:
+        try:
+            for _ in range(increments):
+                with writer(single_db_path) as conn:
+                    # Read-modify-write in two statements: lost updates if not serialized.
+                    (a,) = conn.execute("SELECT a FROM counter").fetchone()
+                    conn.execute("UPDATE counter SET a = ?", (a + 1,))
+                    conn.execute("UPDATE counter SET b = ?", (a + 1,))
+        except BaseException as exc:
+            errors.append(exc)
+
+    def read() -> None:
+        try:
+            last = 0
+            while not done.is_set():
+                with pool.connection() as conn:
+                    a, b = conn.execute("SELECT a, b FROM counter").fetchone()
+                assert a == b, "reader saw half a transaction"
+                assert a >= last, "reader went back in time"
+                last = a
+                reads[0] += 1
+        except BaseException as exc:
+            errors.append(exc)
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    threads = [threading.Thread(target=write) for _ in range(writers)]
+    for t in readers + threads:
+        t.start()
+    for t in threads:
+        t.join(60)
+    done.set()
+    for t in readers:
+        t.join(60)
+    pool.close()
+
+    assert not errors, errors
+    assert reads[0] > 0
+    with writer(single_db_path) as conn:
+        assert conn.execute("SELECT a FROM counter").fetchone() == (writers * increments,)
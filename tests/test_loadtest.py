@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import threading
+
+from thermal_local.db.shards import connect_points, shard_files
+from thermal_local.services.loadtest import _import_loop, _sync_loop
+
+
+def _scratch_rows(db_path) -> tuple[int, int]:
+    """(live, total) Standard Plot rows of the scratch measurement (the only one)."""
+    device = next(iter(shard_files(db_path)), None)
+    conn = connect_points(db_path, device)
+    try:
+        return conn.execute("SELECT SUM(is_delete = 0), COUNT(*) FROM standard_plot").fetchone()
+    finally:
+        conn.close()
+
+
+def test_import_loop_replaces_rather_than_appends(db_path):
+    stop = threading.Event()
+    timer = threading.Timer(0.5, stop.set)
+    timer.start()
+    runs = _import_loop(db_path, 200, 0.02, stop)
+    timer.join()
+
+    assert runs > 1
+    assert _scratch_rows(db_path) == (200, 200 * runs)
+
+
+def test_import_keeps_running_while_syncs_remove_its_scratch_data(db_path, full_server):
+    stop = threading.Event()
+    results: dict[str, int] = {}
+    errors: list[BaseException] = []
+
+    def job(name, fn):
+        try:
+            results[name] = fn()
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    threads = [
+        threading.Thread(target=job, args=("import", lambda: _import_loop(db_path, 200, 0.01, stop))),
+        threading.Thread(target=job, args=("sync", lambda: _sync_loop(db_path, 0.05, stop))),
+    ]
+    for t in threads:
+        t.start()
+    stop.wait(2.0)
+    stop.set()
+    for t in threads:
+        t.join(30)
+
+    assert errors == []
+    assert results["sync"] > 2 and results["import"] > results["sync"]
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import uuid
+
+from tests.conftest import add_measurement, step_trace
+from thermal_local.db.connection import connect, writer
+from thermal_local.db.shards import connect_points, is_sharded, points_writer, shard_of
+from thermal_local.services.maintenance import run_maintenance
+from thermal_local.services.measurements import (
+    insert_standard_plot,
+    read_standard_plot_from_db,
+    replace_dataset,
+    soft_delete_measurements,
+)
+from thermal_local.services.sync import sync_server_to_sqlite
+
+
+def _point_rows(db_path, measurement_id) -> int:
+    # By device: the measurement row itself may have been purged.
+    conn = connect(db_path)
+    sharded = is_sharded(conn)
+    conn.close()
+    conn = connect_points(db_path, "dev-D1" if sharded else None)
+    try:
+        return conn.execute(
+            "SELECT COUNT(*) FROM standard_plot WHERE measurement_id = ?", (measurement_id,)
+        ).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_soft_deleted_within_retention_keeps_points(db_path, no_server):
+    mid = add_measurement(db_path, "m1")
+    insert_standard_plot(db_path, mid, step_trace(100))
+    soft_delete_measurements(db_path, [mid], username="alice")
+
+    report = run_maintenance(db_path, db_path.parent / "archive.db", retention_days=30, vacuum=False)
+
+    assert report.measurements_purged == 0
+    assert report.rows_archived["standard_plot"] == 0
+    assert _point_rows(db_path, mid) == 100
+
+
+def test_soft_deleted_past_retention_is_purged(db_path, no_server):
+    mid = add_measurement(db_path, "m1")
+    insert_standard_plot(db_path, mid, step_trace(100))
+    soft_delete_measurements(db_path, [mid], username="alice")
+
+    report = run_maintenance(db_path, db_path.parent / "archive.db", retention_days=-1, vacuum=False)
+
+    assert report.measurements_purged == 1
+    assert report.rows_archived["standard_plot"] == 100
+    assert _point_rows(db_path, mid) == 0
+
+
+def test_deleted_rows_of_live_measurement_are_archived(db_path, no_server):
+    mid = add_measurement(db_path, "m1")
+    insert_standard_plot(db_path, mid, step_trace(100))
+    with points_writer(db_path, shard_of(db_path, mid)) as conn:
+        # The first 100 rows are soft-deleted.
+        replace_dataset(conn.cursor(), mid, "standard_plot", step_trace(50).to_numpy())
+
+    report = run_maintenance(db_path, db_path.parent / "archive.db", retention_days=30, vacuum=False)
+
+    assert report.rows_archived["standard_plot"] == 100
+    assert len(read_standard_plot_from_db(db_path, mid)) == 50
+
+
+def test_compaction_with_vacuum_reclaims_space(db_path, no_server):
+    keep, drop = add_measurement(db_path, "keep"), add_measurement(db_path, "drop")
+    insert_standard_plot(db_path, keep, step_trace(100))
+    insert_standard_plot(db_path, drop, step_trace(50_000))
+    soft_delete_measurements(db_path, [drop], username="alice")
+
+    report = run_maintenance(db_path, db_path.parent / "archive.db", retention_days=-1, vacuum=True)
+
+    assert report.measurements_purged == 1
+    assert report.bytes_reclaimed > 0
+    conn = connect(db_path)
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2  # incremental
+    conn.close()
+    assert len(read_standard_plot_from_db(db_path, keep, cache=False)) == 100
+
+
+def _server_points(cur, measurement_id, n, *, is_delete=False) -> None:
+    cur.executemany(
+        "INSERT INTO standard_plot (id, measurement_id, time, voltage, is_delete) VALUES (%s, %s, %s, %s, %s)",
+        [(str(uuid.uuid4()), measurement_id, float(i), 1.0, is_delete) for i in range(n)],
+    )
+
+
+def _local_measurements(db_path) -> dict:
+    conn = connect(db_path)
+    try:
+        return dict(conn.execute("SELECT id, deleted_at FROM measurements"))
+    finally:
+        conn.close()
+
+
+def test_purge_holds_across_server_syncs(db_path, full_server):
+    with full_server() as conn:
+        cur = conn.cursor()
+        cur.execute("INSERT INTO devices (id, name) VALUES ('dev-D1', 'D1')")
+        cur.executemany(
+            """
+            INSERT INTO measurements (id, device_id, num_order, name, created_by, created_at, is_delete)
+            VALUES (%s, 'dev-D1', %s, %s, 'alice', '2000-01-01T00:00:00', %s)
+            """,
+            [("old", 1, "old", True), ("recent", 2, "recent", True), ("live", 3, "live", False)],
+        )
+        _server_points(cur, "old", 40, is_delete=True)
+        _server_points(cur, "recent", 20, is_delete=True)
+        _server_points(cur, "live", 50)
+        _server_points(cur, "live", 30, is_delete=True)  # replaced rows of a live measurement
+
+    sync_server_to_sqlite(db_path, mode="full")
+    # Deleted long ago on this station; "recent" was only just seen deleted.
+    with writer(db_path) as conn:
+        conn.execute("UPDATE measurements SET deleted_at = '2000-01-02T00:00:00' WHERE id = 'old'")
+    sync_server_to_sqlite(db_path, mode="full")
+    deleted_at = _local_measurements(db_path)
+    assert deleted_at["old"] == "2000-01-02T00:00:00"  # carried through the reload
+    assert deleted_at["recent"] > "2000-01-02"  # not counted from created_at
+    assert _point_rows(db_path, "live") == 50  # replaced rows are not pulled
+
+    report = run_maintenance(db_path, db_path.parent / "archive.db", retention_days=30, vacuum=False)
+    assert report.measurements_purged == 1
+    assert report.rows_archived["standard_plot"] == 40
+
+    sync_server_to_sqlite(db_path, mode="full")
+
+    assert set(_local_measurements(db_path)) == {"recent", "live"}
+    assert _point_rows(db_path, "old") == 0
+    assert _point_rows(db_path, "recent") == 20
+    assert _point_rows(db_path, "live") == 50
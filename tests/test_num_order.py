@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+
+import pytest
+
+from tests.conftest import add_measurement
+from thermal_local.db.migrations import migrate_server
+from thermal_local.services.measurements import create_measurements_on_server
+
+WRITERS = 8
+PER_WRITER = 6
+DEVICES = ("D1", "D2")
+
+
+def _upload(db_path, server, ids, start: threading.Barrier, errors: list) -> None:
+    s_conn = sqlite3.connect(db_path)
+    p_conn = server()
+    try:
+        start.wait()
+        with p_conn:
+            create_measurements_on_server(s_conn.cursor(), p_conn.cursor(), ids)
+    except Exception as e:
+        errors.append(e)
+    finally:
+        p_conn.close()
+        s_conn.close()
+
+
+def test_concurrent_allocation_has_no_duplicates_or_gaps(single_db_path, server):
+    with server() as conn:
+        migrate_server(conn.cursor())
+        # D1 already has orders 1..3 on the server; its counter is seeded from them.
+        conn.cursor().executemany(
+            "INSERT INTO measurements (id, device_id, num_order) VALUES (%s, 'dev-D1', %s)",
+            [(f"old{i}", i) for i in (1, 2, 3)],
+        )
+    batches = [
+        [
+            add_measurement(single_db_path, f"w{w}m{i}", device=DEVICES[(w + i) % len(DEVICES)])
+            for i in range(PER_WRITER)
+        ]
+        for w in range(WRITERS)
+    ]
+
+    start = threading.Barrier(WRITERS)
+    errors: list = []
+    threads = [
+        threading.Thread(target=_upload, args=(single_db_path, server, ids, start, errors)) for ids in batches
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    with server() as conn:
+        cur = conn.cursor()
+        for device in DEVICES:
+            cur.execute("SELECT num_order FROM measurements WHERE device_id = %s ORDER BY num_order", (f"dev-{device}",))
+            orders = [r[0] for r in cur.fetchall()]
+            assert orders == list(range(1, len(orders) + 1))
+        cur.execute("SELECT COUNT(*) FROM measurements")
+        assert cur.fetchone()[0] == 3 + WRITERS * PER_WRITER
+
+
+def test_allocation_needs_migrated_server(single_db_path, server):
+    mid = add_measurement(single_db_path, "m1")
+    s_conn = sqlite3.connect(single_db_path)
+    p_conn = server()
+    try:
+        with pytest.raises(RuntimeError, match="migrate-server"):
+            create_measurements_on_server(s_conn.cursor(), p_conn.cursor(), [mid])
+    finally:
+        p_conn.rollback()
+        p_conn.close()
+        s_conn.close()
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from tests.conftest import add_measurement
+from thermal_local.db.points import DATASET_COLUMNS
+from thermal_local.db.shards import connect_points, points_writer, shard_of
+from thermal_local.services.measurements import insert_cole_cole, replace_dataset
+from thermal_local.services.reconcile import (
+    local_fingerprints,
+    reconcile_to_server,
+    server_fingerprints,
+    upload_datasets,
+)
+
+
+def _cole_cole(n: int = 2000) -> pd.DataFrame:
+    f = np.logspace(1, 6, n)
+    return pd.DataFrame({
+        "frequency": f,
+        "resistance": 1e6 / (1 + (f * 1e-4) ** 2),
+        "reactance": -1e6 * (f * 1e-4) / (1 + (f * 1e-4) ** 2),
+        "capacitance": 1e-9,
+    })
+
+
+def _fingerprint(db_path, mid, df: pd.DataFrame) -> str:
+    with points_writer(db_path, shard_of(db_path, mid)) as conn:
+        replace_dataset(conn.cursor(), mid, "cole_cole", df.to_numpy(dtype=float))
+    return local_fingerprints(db_path, [mid])["cole_cole"][mid]
+
+
+def test_fingerprint_detects_swapped_values(db_path):
+    mid = add_measurement(db_path, "m1")
+    df = _cole_cole()
+    base = _fingerprint(db_path, mid, df)
+
+    swapped = df.copy()
+    swapped.loc[[10, 11], "resistance"] = df.loc[[11, 10], "resistance"].to_numpy()
+
+    assert _fingerprint(db_path, mid, swapped) != base
+
+
+def test_fingerprint_detects_small_edit(db_path):
+    mid = add_measurement(db_path, "m1")
+    df = _cole_cole()
+    base = _fingerprint(db_path, mid, df)
+
+    edited = df.copy()
+    edited.loc[500, "resistance"] *= 1 + 1e-12
+
+    assert _fingerprint(db_path, mid, edited) != base
+
+
+def test_fingerprint_ignores_row_order(db_path):
+    mid = add_measurement(db_path, "m1")
+    df = _cole_cole()
+    base = _fingerprint(db_path, mid, df)
+
+    assert _fingerprint(db_path, mid, df.iloc[::-1]) == base
+
+
+def test_local_and_server_fingerprints_agree(single_db_path, server):
+    mid = add_measurement(single_db_path, "m1")
+    df = _cole_cole(500)
+    df.loc[0, "reactance"] = -0.0
+    df.loc[1, "capacitance"] = np.inf  # stored as NULL
+    insert_cole_cole(single_db_path, mid, df)
+
+    p_conn = server()
+    try:
+        cur = p_conn.cursor()
+        for table, cols in DATASET_COLUMNS.items():
+            cur.execute(
+                f"""
+                CREATE TABLE {table} (
+                    id TEXT PRIMARY KEY,
+                    measurement_id TEXT NOT NULL,
+                    {', '.join(f'{c} DOUBLE PRECISION' for c in cols)},
+                    is_delete BOOLEAN NOT NULL DEFAULT FALSE
+                )
+                """
+            )
+        s_conn = connect_points(single_db_path)
+        upload_datasets(s_conn.cursor(), cur, [mid], "cole_cole")
+        s_conn.close()
+
+        local = local_fingerprints(single_db_path, [mid])["cole_cole"][mid]
+        assert server_fingerprints(cur, [mid])["cole_cole"][mid] == local
+
+        # Re-pair two resistances on the server only.
+        cur.execute(
+            """
+            WITH two AS (SELECT id, resistance FROM cole_cole ORDER BY frequency LIMIT 2)
+            UPDATE cole_cole c SET resistance = (SELECT resistance FROM two WHERE two.id <> c.id)
+            WHERE c.id IN (SELECT id FROM two)
+            """
+        )
+        assert server_fingerprints(cur, [mid])["cole_cole"][mid] != local
+    finally:
+        p_conn.rollback()
+        p_conn.close()
+
+
+def test_storing_and_pushing_again_never_duplicates_server_rows(db_path, full_server):
+    mid = add_measurement(db_path, "m1")
+    insert_cole_cole(db_path, mid, _cole_cole(100))
+    assert reconcile_to_server(db_path, measurement_ids=[mid]).uploaded == [(mid, "cole_cole")]
+    assert reconcile_to_server(db_path, measurement_ids=[mid]).uploaded == []  # unchanged: nothing sent
+
+    insert_cole_cole(db_path, mid, _cole_cole(60))  # "Sync again" with a new file
+    reconcile_to_server(db_path, measurement_ids=[mid])
+
+    with full_server() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*) FROM cole_cole WHERE measurement_id = %s AND NOT is_delete", (mid,))
+        assert cur.fetchone()[0] == 60
+        assert server_fingerprints(cur, [mid]) == local_fingerprints(db_path, [mid])
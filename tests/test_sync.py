@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import threading
+
+import pytest
+
+from thermal_local.db.connection import writer
+from thermal_local.services import sync
+
+
+def _sync_in_thread(db_path) -> list:
+    """Run a full pull; returns what it raised. Fails the test if it hangs."""
+    raised: list = []
+
+    def target():
+        try:
+            sync.sync_server_to_sqlite(db_path, mode="full")
+        except BaseException as e:
+            raised.append(e)
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout=30)
+    assert not thread.is_alive(), "sync hung waiting on a dead fetcher"
+    return raised
+
+
+def _writer_is_free(db_path) -> bool:
+    acquired = threading.Event()
+
+    def target():
+        with writer(db_path):
+            acquired.set()
+
+    threading.Thread(target=target, daemon=True).start()
+    return acquired.wait(timeout=5)
+
+
+def test_fetcher_that_dies_before_reporting_surfaces_its_error(single_db_path, monkeypatch):
+    def dies(*args):
+        raise ImportError("No module named 'psycopg2'")
+
+    monkeypatch.setattr(sync, "_fetch_table", dies)
+
+    raised = _sync_in_thread(single_db_path)
+
+    assert len(raised) == 1 and isinstance(raised[0], ImportError)
+    assert _writer_is_free(single_db_path)
+
+
+def test_unreachable_server_surfaces_its_error(single_db_path, monkeypatch):
+    pytest.importorskip("psycopg2")
+    monkeypatch.setattr(sync, "SERVER_DB_CONFIG", {"host": "127.0.0.1", "port": 1, "connect_timeout": 2})
+
+    raised = _sync_in_thread(single_db_path)
+
+    assert len(raised) == 1
+    assert _writer_is_free(single_db_path)
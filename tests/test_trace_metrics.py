@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+import pytest
+
+from tests.conftest import add_measurement, step_trace
+from thermal_local.services.measurements import get_trace_metrics, insert_standard_plot, read_standard_plot_from_db
+from thermal_local.services.trace_metrics import compute_trace_metrics
+
+
+@pytest.mark.parametrize("onset", [0.0, 2.0, 3.0])
+def test_time_constant_is_measured_from_the_step_onset(onset):
+    trace = step_trace(1000, onset=onset, tau=1.0)
+    metrics = compute_trace_metrics(trace["time"], trace["voltage"])
+    assert metrics["time_constant"] == pytest.approx(1.0, abs=0.05)
+
+
+def test_falling_step():
+    trace = step_trace(1000, onset=2.0, tau=0.5)
+    metrics = compute_trace_metrics(trace["time"], 1.0 - trace["voltage"])
+    assert metrics["time_constant"] == pytest.approx(0.5, abs=0.05)
+
+
+def test_storing_a_trace_again_replaces_it_and_its_metrics(db_path):
+    mid = add_measurement(db_path, "m1")
+    insert_standard_plot(db_path, mid, step_trace(200, onset=1.0, tau=0.5))
+    insert_standard_plot(db_path, mid, step_trace(100, onset=2.0, tau=1.0))  # "Sync again"
+
+    assert len(read_standard_plot_from_db(db_path, mid)) == 100
+    metrics = get_trace_metrics(db_path).set_index("measurement").loc["m1"]
+    assert metrics["n_points"] == 100
+    assert metrics["time_constant"] == pytest.approx(1.0, abs=0.15)
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from tests.conftest import add_measurement
+from thermal_local.services.measurements import (
+    insert_cole_cole,
+    insert_nanothickness,
+    read_dataset_arrays,
+    read_nanothickness_arrays,
+)
+from thermal_local.services.validation import get_dataset_quality
+
+
+def _nanothickness(n: int) -> pd.DataFrame:
+    return pd.DataFrame({f"pos{i}": np.linspace(1.0, 2.0, n) for i in range(1, 6)})
+
+
+def test_quality_mask_matches_the_stored_rows_after_storing_again(db_path):
+    mid = add_measurement(db_path, "m1")
+    insert_nanothickness(db_path, mid, _nanothickness(10))
+    again = _nanothickness(6)
+    again.loc[4, "pos2"] = 9.9e37  # overflow sentinel
+    insert_nanothickness(db_path, mid, again)
+
+    stored = read_nanothickness_arrays(db_path, mid)
+    summary, mask = get_dataset_quality(db_path, mid, "nanothickness")
+    assert len(stored["pos1"]) == len(mask) == 6
+    assert np.flatnonzero(mask).tolist() == [4]
+    assert np.isnan(stored["pos2"][4])
+
+
+def test_cole_cole_is_replaced_with_its_quality(db_path):
+    mid = add_measurement(db_path, "m1")
+    df = pd.DataFrame({
+        "frequency": np.logspace(1, 3, 8),
+        "resistance": 100.0,
+        "reactance": 10.0,
+        "capacitance": 1e-9,
+    })
+    insert_cole_cole(db_path, mid, df)
+    insert_cole_cole(db_path, mid, df.iloc[:5])
+
+    stored = read_dataset_arrays(db_path, mid, "cole_cole")
+    summary, mask = get_dataset_quality(db_path, mid, "cole_cole")
+    assert len(stored["frequency"]) == summary["n_rows"] == len(mask) == 5
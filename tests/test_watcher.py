@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from tests.conftest import add_measurement, step_trace
+from thermal_local.services.measurements import has_standard_plot
+from thermal_local.services.watcher import FolderWatcher
+
+
+def _watcher(db_path) -> FolderWatcher:
+    watcher = FolderWatcher(
+        db_path, db_path.parent / "blobs", db_path.parent.parent / "devices", poll_interval=0, settle=0
+    )
+    watcher.drain_upload_queue = lambda: 0  # no server
+    return watcher
+
+
+def test_csv_before_its_measurement_is_ingested_once_the_row_exists(db_path):
+    folder = db_path.parent.parent / "devices" / "D1" / "m1"
+    folder.mkdir(parents=True)
+    step_trace(50).to_csv(folder / "_trace.csv", index=False)
+    watcher = _watcher(db_path)
+
+    watcher.poll_once()  # first sighting: not settled yet
+    first = watcher.poll_once()
+    again = watcher.poll_once()
+    assert [reason for _, reason in first.skipped] == ["no matching measurement"]
+    assert again.skipped == []  # reported once per file version
+
+    mid = add_measurement(db_path, "m1")
+    report = watcher.poll_once()
+
+    assert [(m, kind) for _, m, kind in report.ingested] == [(mid, "standard_plot")]
+    assert has_standard_plot(db_path, mid)
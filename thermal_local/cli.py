@@ -0,0 +1,310 @@
+"""
+Command-line entrypoint for batch jobs (run from cron or by hand).
+
+Usage: python -m thermal_local.cli <command> [options]
+"""
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+
+from thermal_local.config import (
+    API_HOST,
+    API_PORT,
+    MAINTENANCE_RETENTION_DAYS,
+    SERVER_DB_CONFIG,
+    SHARD_WORKERS,
+    SNAPSHOT_SOURCE,
+)
+from thermal_local.db.migrations import migrate_server, migrate_sqlite
+from thermal_local.paths import get_paths
+
+
+def _cmd_fit_cole_cole(args, paths) -> None:
+    from thermal_local.services.analysis import fit_cole_cole
+
+    n = fit_cole_cole(paths.db_path, workers=args.workers, force=args.force)
+    print(f"Fitted {n} measurement(s)")
+
+
+def _cmd_migrate_server(args, paths) -> None:
+    import psycopg2
+
+    pg_conn = psycopg2.connect(**SERVER_DB_CONFIG)
+    try:
+        with pg_conn:
+            migrate_server(pg_conn.cursor())
+    finally:
+        pg_conn.close()
+    print(f"Server objects are up to date on {SERVER_DB_CONFIG['host']}:{SERVER_DB_CONFIG['port']}")
+
+
+def _cmd_reconcile(args, paths) -> None:
+    from thermal_local.services.reconcile import reconcile_to_server
+
+    report = reconcile_to_server(paths.db_path, dry_run=args.dry_run)
+    verb = "Would upload" if args.dry_run else "Uploaded"
+    print(
+        f"Checked {report.devices_checked} device(s): {report.devices_differing} differing, "
+        f"{report.measurements_differing} measurement(s) differing"
+    )
+    print(f"{verb} {len(report.uploaded)} dataset(s)")
+    for mid, table in report.uploaded:
+        print(f"  {mid} {table}")
+    if report.remote_only:
+        print(f"{len(report.remote_only)} dataset(s) exist only on the server")
+
+
+def _cmd_maintenance(args, paths) -> None:
+    from thermal_local.services.maintenance import run_maintenance
+
+    report = run_maintenance(
+        paths.db_path,
+        paths.archive_path,
+        retention_days=args.retention_days,
+        vacuum=not args.no_vacuum,
+    )
+    print(f"Purged {report.measurements_purged} measurement(s)")
+    for table, n in report.rows_archived.items():
+        if n:
+            print(f"  archived {n} row(s) from {table}")
+    if report.converted_to_incremental:
+        print("Converted database to incremental auto-vacuum (full VACUUM)")
+    print(f"Reclaimed {report.bytes_reclaimed / 1024 / 1024:.1f} MiB")
+
+
+def _cmd_bench_readers(args, paths) -> None:
+    from thermal_local.services.bench import bench_readers
+
+    results = bench_readers(paths.db_path, args.table, measurement_id=args.measurement, repeats=args.repeats)
+    if not results:
+        print(f"No {args.table} data to benchmark")
+        return
+    print(f"{args.table}: {results[0].rows} rows, best of {args.repeats}")
+    for r in results:
+        print(f"  {r.reader:32s} {r.best_seconds * 1000:9.2f} ms  peak {r.peak_bytes / 1024 / 1024:8.2f} MiB")
+
+
+def _cmd_scan_raw(args, paths) -> None:
+    from thermal_local.services.blobs import scan_raw_files
+
+    report = scan_raw_files(paths.db_path, paths.blobs_dir, paths.data_root / "devices")
+    print(f"Scanned {report.files} raw file(s): {report.unique_blobs} distinct")
+    print(
+        f"  {report.bytes_seen / 1024:.1f} KiB on disk, "
+        f"{report.bytes_stored / 1024:.1f} KiB in the blob store"
+    )
+    for path, error in report.errors:
+        print(f"  skipped {path}: {error}")
+
+
+def _cmd_watch(args, paths) -> None:
+    import logging
+
+    from thermal_local.services.watcher import FolderWatcher
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    watcher = FolderWatcher(paths.db_path, paths.blobs_dir, paths.data_root / "devices")
+    print(f"Watching {watcher.devices_root} (Ctrl+C to stop)")
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+
+
+def _cmd_snapshot_build(args, paths) -> None:
+    from thermal_local.services.snapshot import build_snapshot
+
+    source = paths.db_path if args.from_local else None
+    manifest = build_snapshot(Path(args.out), source_db=source)
+    print(f"Built {Path(args.out) / 'snapshot.db'}: {manifest.size / 1024 / 1024:.1f} MiB")
+    for table, n in manifest.tables.items():
+        print(f"  {table}: {n} row(s)")
+
+
+def _cmd_snapshot_install(args, paths) -> None:
+    from thermal_local.services.snapshot import catch_up, install_snapshot
+
+    manifest = install_snapshot(paths.db_path, Path(args.source), force=args.force)
+    print(f"Installed snapshot built {manifest.created_at}")
+    if args.no_catch_up:
+        return
+    report = catch_up(paths.db_path)
+    removed = sum(report.removed.values())
+    print(f"Caught up: {len(report.datasets_pulled)} dataset(s) pulled, {removed} row(s) removed")
+
+
+def _cmd_serve(args, paths) -> None:
+    import logging
+
+    from thermal_local.services.api import serve
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    print(f"Serving {paths.db_path} read-only on http://{args.host}:{args.port} (Ctrl+C to stop)")
+    try:
+        serve(paths.db_path, args.host, args.port)
+    except KeyboardInterrupt:
+        pass
+
+
+def _cmd_shard(args, paths) -> None:
+    from thermal_local.services.shards import convert_to_shards
+
+    copied = convert_to_shards(paths.db_path, workers=args.workers)
+    print(f"Moved point data of {len(copied)} device(s) to {paths.shards_dir}")
+    print(f"  {sum(copied.values())} row(s); run `maintenance` to shrink {paths.db_path.name}")
+
+
+def _cmd_shard_drop(args, paths) -> None:
+    from thermal_local.services.measurements import get_device_id
+    from thermal_local.services.shards import drop_device_points
+
+    n = drop_device_points(paths.db_path, get_device_id(paths.db_path, args.device))
+    print(f"Removed local point data of {args.device} ({n} measurement(s))")
+
+
+def _cmd_export(args, paths) -> None:
+    from thermal_local.services.shards import export_devices
+
+    exports = export_devices(paths.db_path, Path(args.out), device_names=args.device, workers=args.workers)
+    for e in exports:
+        print(f"  {e.device_name}: {e.rows} point row(s) -> {e.path}")
+    print(f"Exported {len(exports)} device(s)")
+
+
+def _cmd_loadtest(args, paths) -> None:
+    from thermal_local.services.loadtest import run_load_test
+
+    def ms(p) -> str:
+        return f"p50 {p.p50 * 1000:8.1f}  p95 {p.p95 * 1000:8.1f}  p99 {p.p99 * 1000:8.1f}  max {p.max * 1000:8.1f} ms"
+
+    r = run_load_test(
+        paths.db_path,
+        users=args.users,
+        iterations=args.iterations,
+        paths=args.path,
+        think_s=args.think,
+        import_rows=None if args.no_import else args.import_rows,
+        sync=not args.no_sync,
+    )
+    print(f"{r.users} user(s), {r.overall.count} click(s) in {r.seconds:.1f} s")
+    print(f"  {'all':14s} {ms(r.overall)}")
+    for c in r.clicks:
+        errors = f"  {c.errors} error(s)" if c.errors else ""
+        print(f"  {c.click:14s} {ms(c.latency)}  n={c.latency.count}{errors}")
+    print(f"Lock waits: {r.lock_waits.count} write(s)  {ms(r.lock_waits)}")
+    peak = sorted(r.session_peak_bytes)
+    if peak:
+        print(
+            f"Session data: median {peak[len(peak) // 2] / 1024 / 1024:.2f} MiB, "
+            f"max {peak[-1] / 1024 / 1024:.2f} MiB; shared point cache {r.point_cache_bytes / 1024 / 1024:.1f} MiB"
+        )
+    for job in r.jobs:
+        status = f"failed: {job.error}" if job.error else "ok"
+        print(f"  {job.name}: {job.runs} run(s), {status}")
+    for error in r.errors[:10]:
+        print(f"  error {error}")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="thermal_local")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("fit-cole-cole", help="Fit the Cole model for all changed measurements")
+    p.add_argument("--workers", type=int, default=None, help="Process pool size (1 = no pool)")
+    p.add_argument("--force", action="store_true", help="Refit even if data is unchanged")
+    p.set_defaults(func=_cmd_fit_cole_cole)
+
+    p = sub.add_parser("migrate-server", help="Create this app's objects on the server (run once, as an admin)")
+    p.set_defaults(func=_cmd_migrate_server)
+
+    p = sub.add_parser("reconcile", help="Upload only datasets whose checksums differ from the server")
+    p.add_argument("--dry-run", action="store_true", help="Report differences without uploading")
+    p.set_defaults(func=_cmd_reconcile)
+
+    p = sub.add_parser("maintenance", help="Archive old soft-deleted data and compact the database")
+    p.add_argument(
+        "--retention-days",
+        type=int,
+        default=MAINTENANCE_RETENTION_DAYS,
+        help="Keep soft-deleted measurements this many days before archiving",
+    )
+    p.add_argument("--no-vacuum", action="store_true", help="Archive and purge only, skip VACUUM")
+    p.set_defaults(func=_cmd_maintenance)
+
+    p = sub.add_parser("bench-readers", help="Compare DataFrame and NumPy point-data readers")
+    p.add_argument(
+        "--table",
+        choices=("cole_cole", "standard_plot", "nanothickness"),
+        default="standard_plot",
+    )
+    p.add_argument("--measurement", default=None, help="Measurement id (default: largest dataset)")
+    p.add_argument("--repeats", type=int, default=5)
+    p.set_defaults(func=_cmd_bench_readers)
+
+    p = sub.add_parser("scan-raw", help="Store and parse raw CSVs under root/devices (deduplicated)")
+    p.set_defaults(func=_cmd_scan_raw)
+
+    p = sub.add_parser("watch", help="Ingest new instrument CSVs from root/devices as they appear")
+    p.set_defaults(func=_cmd_watch)
+
+    p = sub.add_parser("snapshot-build", help="Build a compacted SQLite snapshot for new stations")
+    p.add_argument("--out", required=True, help="Folder (local path or share) to publish the snapshot in")
+    p.add_argument(
+        "--from-local",
+        action="store_true",
+        help="Snapshot this station's database instead of pulling the server",
+    )
+    p.set_defaults(func=_cmd_snapshot_build)
+
+    p = sub.add_parser("snapshot-install", help="Bootstrap this station from a published snapshot")
+    p.add_argument("--source", default=SNAPSHOT_SOURCE, required=SNAPSHOT_SOURCE is None)
+    p.add_argument("--force", action="store_true", help="Replace a database that already has measurements")
+    p.add_argument("--no-catch-up", action="store_true", help="Skip the incremental server catch-up")
+    p.set_defaults(func=_cmd_snapshot_install)
+
+    p = sub.add_parser("serve", help="Serve devices, measurements and point data over local HTTP (read-only)")
+    p.add_argument("--host", default=API_HOST, help="Interface to bind (default: localhost only)")
+    p.add_argument("--port", type=int, default=API_PORT)
+    p.set_defaults(func=_cmd_serve)
+
+    p = sub.add_parser("shard", help="Convert to the sharded layout (one point-data file per device)")
+    p.add_argument("--workers", type=int, default=SHARD_WORKERS, help="Devices copied at the same time")
+    p.set_defaults(func=_cmd_shard)
+
+    p = sub.add_parser("shard-drop", help="Delete a device's local point data file (sharded layout)")
+    p.add_argument("device", help="Device name")
+    p.set_defaults(func=_cmd_shard_drop)
+
+    p = sub.add_parser("export", help="Write one standalone SQLite file per device")
+    p.add_argument("--out", required=True, help="Folder to write <device_id>.db files to")
+    p.add_argument("--device", action="append", default=None, help="Device name (repeatable; default all)")
+    p.add_argument("--workers", type=int, default=SHARD_WORKERS, help="Devices exported at the same time")
+    p.set_defaults(func=_cmd_export)
+
+    p = sub.add_parser("loadtest", help="Simulate concurrent UI sessions during a sync and an import")
+    p.add_argument("--users", type=int, default=20, help="Concurrent virtual users")
+    p.add_argument("--iterations", type=int, default=3, help="Times each user walks its click path")
+    p.add_argument(
+        "--path",
+        action="append",
+        choices=("browse", "inspect", "revisit"),
+        default=None,
+        help="Click path (repeatable; default all, assigned round-robin)",
+    )
+    p.add_argument("--think", type=float, default=0.5, help="Max seconds between a user's clicks")
+    p.add_argument("--import-rows", type=int, default=20_000, help="Rows per background import")
+    p.add_argument("--no-import", action="store_true", help="Skip the background import")
+    p.add_argument("--no-sync", action="store_true", help="Skip the background server sync")
+    p.set_defaults(func=_cmd_loadtest)
+
+    args = parser.parse_args(argv)
+    paths = get_paths()
+    paths.db_dir.mkdir(parents=True, exist_ok=True)
+    migrate_sqlite(paths.db_path)
+    args.func(args, paths)
+
+
+if __name__ == "__main__":
+    main()
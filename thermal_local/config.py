@@ -6,3 +6,74 @@ SERVER_DB_CONFIG = {
     "password": "password",
 }
 
+
+# Local SQLite tuning (see thermal_local.db.connection).
+SQLITE_BUSY_TIMEOUT_S = 30
+SQLITE_CACHE_SIZE_KIB = 64 * 1024
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+
+# Storage layout (see thermal_local.db.shards). "single" keeps everything in
+# db/app.db; "sharded" keeps users, devices and measurements in app.db (the
+# catalog) and each device's point data in db/shards/<device_id>.db. Applies
+# when a database is created; `cli shard` converts an existing one.
+STORAGE_LAYOUT = "single"
+# Shards synced, compacted or exported at the same time.
+SHARD_WORKERS = 4
+
+# Server -> local pull (see thermal_local.services.sync).
+SYNC_FETCH_WORKERS = 4
+SYNC_BATCH_ROWS = 5000
+SYNC_QUEUE_BATCHES = 8
+
+# Point-data sync scope. "full" pulls every measurement's points; "scoped" pulls
+# metadata for everything but points only for the scope below, and fetches
+# other measurements' points the first time they are opened.
+SYNC_MODE = "full"
+SYNC_SCOPE_PINNED_DEVICES: list[str] = []
+SYNC_SCOPE_LAST_DAYS = 30
+
+# Maintenance job (see thermal_local.services.maintenance).
+MAINTENANCE_RETENTION_DAYS = 30
+MAINTENANCE_INTERVAL_HOURS = 24
+
+# Raw file store (see thermal_local.services.blobs): "gzip" or None.
+BLOB_COMPRESSION: str | None = "gzip"
+
+# Watch-folder ingest (see thermal_local.services.watcher). A file is ingested
+# once its size and mtime have been unchanged for WATCH_SETTLE_S seconds.
+WATCH_ENABLED = True
+WATCH_POLL_INTERVAL_S = 2.0
+WATCH_SETTLE_S = 5.0
+
+# Snapshot bootstrap (see thermal_local.services.snapshot). Folder (local path or
+# network share) holding snapshot.db + snapshot.json built by `snapshot-build`;
+# a station with an empty database installs it instead of a full first sync.
+SNAPSHOT_SOURCE: str | None = None
+
+# Ingest validation (see thermal_local.services.validation). Values this large in
+# magnitude are instrument overflow markers (e.g. 9.9e37) and are stored as NULL.
+SENTINEL_MIN_ABS = 9.0e37
+# Plausible (min, max) per point column, None = unbounded. Rows outside are
+# flagged, not changed.
+VALIDATION_RANGES: dict[str, tuple[float | None, float | None]] = {
+    "frequency": (0.0, 1e9),
+    "resistance": (0.0, None),
+    "time": (0.0, None),
+    **{f"pos{i}": (0.0, None) for i in range(1, 6)},
+}
+
+# Dataset views (see thermal_local.ui.app): charts show at most this many points
+# of the selected window; tables are paged.
+CHART_MAX_POINTS = 5000
+TABLE_PAGE_ROWS = 500
+
+# Point-read cache (see thermal_local.services.point_cache), shared by all
+# sessions in the app process. Least-recently-used reads are evicted past this.
+POINT_CACHE_BYTES = 256 * 1024 * 1024
+
+# Local read-only HTTP API (see thermal_local.services.api, `cli serve`).
+API_HOST = "127.0.0.1"
+API_PORT = 8765
+API_POOL_SIZE = 4
+# Point data is streamed in chunks of this many rows (one Arrow record batch each).
+API_CHUNK_ROWS = 50_000
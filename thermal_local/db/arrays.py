@@ -0,0 +1,101 @@
+"""
+NumPy fast path for point data: fill float arrays straight from a cursor.
+
+`pd.read_sql_query` materializes every row as Python objects and then builds a
+DataFrame; plotting and fitting only need contiguous float columns. Here the
+row count is known up front, so `np.fromiter` writes into one preallocated
+buffer while the cursor is iterated.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from contextlib import contextmanager
+from itertools import chain
+from typing import Iterator
+
+import numpy as np
+
+
+@contextmanager
+def read_snapshot(conn: sqlite3.Connection) -> Iterator[None]:
+    """
+    Keep the COUNT and the data query on one snapshot, so a concurrent writer
+    cannot change the row count in between. No-op inside an open transaction.
+    """
+    if conn.in_transaction:
+        yield
+        return
+    conn.execute("BEGIN")
+    try:
+        yield
+    finally:
+        conn.rollback()
+
+
+def float_columns_sql(columns: tuple[str, ...] | list[str]) -> str:
+    # NULL -> 'nan' so every value converts to float64 (no per-row Python checks).
+    return ", ".join(f"IFNULL({c}, 'nan')" for c in columns)
+
+
+def fetch_float_matrix(
+    cur: sqlite3.Cursor,
+    sql: str,
+    params: tuple | list,
+    n_rows: int,
+    n_cols: int,
+) -> np.ndarray:
+    """Run `sql` (exactly `n_rows` rows of `n_cols` numeric values) into a (n_rows, n_cols) array."""
+    cur.execute(sql, params)
+    flat = np.fromiter(chain.from_iterable(cur), dtype=np.float64, count=n_rows * n_cols)
+    return flat.reshape(n_rows, n_cols)
+
+
+def split_columns(matrix: np.ndarray, columns: tuple[str, ...] | list[str]) -> dict[str, np.ndarray]:
+    """Column-major copy of `matrix`, so each returned column is contiguous."""
+    by_column = np.ascontiguousarray(matrix.T)
+    return {c: by_column[i] for i, c in enumerate(columns)}
+
+
+def read_grouped(
+    conn: sqlite3.Connection,
+    table: str,
+    columns: tuple[str, ...] | list[str],
+    *,
+    measurement_ids: list[str] | None = None,
+    order_by: str | None = None,
+) -> tuple[list[str], np.ndarray, np.ndarray]:
+    """
+    Live rows of `table` for many measurements as one float matrix.
+
+    Returns (measurement_ids, offsets, matrix): rows of measurement_ids[i] are
+    matrix[offsets[i]:offsets[i + 1]], in seq order unless `order_by` is given.
+    Ids are not repeated per row.
+    """
+    where = "is_delete = 0"
+    params: list[str] = []
+    if measurement_ids is not None:
+        where += f" AND measurement_id IN ({','.join('?' * len(measurement_ids))})"
+        params = list(measurement_ids)
+
+    cur = conn.cursor()
+    with read_snapshot(conn):
+        cur.execute(
+            f"SELECT measurement_id, COUNT(*) FROM {table} WHERE {where} "
+            "GROUP BY measurement_id ORDER BY measurement_id",
+            params,
+        )
+        counts = cur.fetchall()
+        ids = [r[0] for r in counts]
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum([r[1] for r in counts], out=offsets[1:])
+
+        order = f"measurement_id, {order_by or 'seq'}"
+        matrix = fetch_float_matrix(
+            cur,
+            f"SELECT {float_columns_sql(columns)} FROM {table} WHERE {where} ORDER BY {order}",
+            params,
+            int(offsets[-1]),
+            len(columns),
+        )
+    return ids, offsets, matrix
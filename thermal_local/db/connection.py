@@ -0,0 +1,182 @@
+"""
+SQLite connection setup shared by the UI, services and batch jobs.
+
+The database runs in WAL mode so readers never wait for a writer. Writes go
+through `writer()`, which serializes them per database file inside this
+process; other processes (cron jobs) are handled by the busy timeout.
+`record_lock_waits()` collects how long writers waited for that lock (used by
+the load test, see thermal_local.services.loadtest).
+"""
+
+from __future__ import annotations
+
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from thermal_local.config import (
+    SQLITE_BUSY_TIMEOUT_S,
+    SQLITE_CACHE_SIZE_KIB,
+    SQLITE_MMAP_SIZE,
+)
+
+_write_locks: dict[str, threading.RLock] = {}
+_write_locks_guard = threading.Lock()
+# Sample lists filled by record_lock_waits(); empty (and free) otherwise.
+_lock_wait_recorders: list[list[float]] = []
+
+
+def connect(db_path: Path, *, readonly: bool = False) -> sqlite3.Connection:
+    if readonly:
+        conn = sqlite3.connect(
+            f"file:{Path(db_path).as_posix()}?mode=ro",
+            uri=True,
+            timeout=SQLITE_BUSY_TIMEOUT_S,
+            check_same_thread=False,
+        )
+    else:
+        conn = sqlite3.connect(db_path, timeout=SQLITE_BUSY_TIMEOUT_S)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KIB}")
+    conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+    # NORMAL is durable across application crashes in WAL mode.
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+
+def enable_wal(db_path: Path) -> None:
+    """Switch the database file to WAL journaling (persistent, so once is enough)."""
+    conn = sqlite3.connect(db_path, timeout=SQLITE_BUSY_TIMEOUT_S)
+    # Only takes effect on a brand-new file (must precede the WAL switch);
+    # older files are converted by the maintenance job.
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.close()
+
+
+def _write_lock(db_path: Path) -> threading.RLock:
+    key = str(Path(db_path).resolve())
+    with _write_locks_guard:
+        lock = _write_locks.get(key)
+        if lock is None:
+            lock = _write_locks[key] = threading.RLock()
+        return lock
+
+
+@contextmanager
+def record_lock_waits() -> Iterator[list[float]]:
+    """
+    Collect, while the block runs, how long each `writer()` transaction waited
+    for its write lock (in-process lock plus BEGIN IMMEDIATE), in seconds.
+    """
+    samples: list[float] = []
+    _lock_wait_recorders.append(samples)
+    try:
+        yield samples
+    finally:
+        _lock_wait_recorders.remove(samples)
+
+
+@contextmanager
+def writer(
+    db_path: Path,
+    *,
+    attach: dict[str, Path] | None = None,
+) -> Iterator[sqlite3.Connection]:
+    """
+    Single-writer transaction: commits on success, rolls back on error.
+
+    BEGIN IMMEDIATE takes the write lock up front, so a transaction that reads
+    before writing cannot fail halfway with SQLITE_BUSY. `attach` maps schema
+    names to extra database files (ATTACH must happen before BEGIN); their
+    writer locks are held too, all taken in path order so writers that share
+    files cannot deadlock.
+    """
+    paths = sorted({str(Path(p).resolve()) for p in (db_path, *(attach or {}).values())})
+    t0 = time.perf_counter()
+    with ExitStack() as locks:
+        for path in paths:
+            locks.enter_context(_write_lock(path))
+        conn = connect(db_path)
+        conn.isolation_level = None
+        try:
+            for name, path in (attach or {}).items():
+                conn.execute("ATTACH DATABASE ? AS " + name, (str(path),))
+            conn.execute("BEGIN IMMEDIATE")
+            for samples in tuple(_lock_wait_recorders):
+                samples.append(time.perf_counter() - t0)
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+
+@contextmanager
+def exclusive(db_path: Path) -> Iterator[sqlite3.Connection]:
+    """Autocommit connection held under the writer lock, for VACUUM and checkpoints."""
+    with _write_lock(db_path):
+        conn = connect(db_path)
+        conn.isolation_level = None
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+
+class ReadPool:
+    """
+    Read-only connections shared by request threads (see thermal_local.services.api).
+    Connections are opened on demand up to `size` and reused; `connection()`
+    blocks while all of them are in use. Never takes the writer lock.
+    """
+
+    def __init__(self, db_path: Path, size: int) -> None:
+        self.db_path = Path(db_path)
+        self.size = size
+        self._idle: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+        self._opened = 0
+        self._guard = threading.Lock()
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._guard:
+            grow = self._opened < self.size
+            if grow:
+                self._opened += 1
+        if not grow:
+            return self._idle.get()
+        try:
+            return connect(self.db_path, readonly=True)
+        except BaseException:
+            with self._guard:
+                self._opened -= 1
+            raise
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
@@ -3,6 +3,10 @@ from __future__ import annotations
 import sqlite3
 from pathlib import Path
 
+from thermal_local.config import STORAGE_LAYOUT
+from thermal_local.db.connection import connect, enable_wal
+from thermal_local.db.points import DATASET_COLUMNS
+
 
 def _existing_columns(cur: sqlite3.Cursor, table: str) -> set[str]:
     cur.execute(f"PRAGMA table_info({table})")
@@ -16,10 +20,101 @@ def _add_column_if_missing(cur: sqlite3.Cursor, table: str, col: str, col_def: s
     cur.execute(f"ALTER TABLE {table} ADD COLUMN {col} {col_def}")
 
 
-def migrate_sqlite(db_path: Path) -> None:
-    conn = sqlite3.connect(db_path)
-    conn.execute("PRAGMA foreign_keys = ON")
+def _point_table_sql(
+    table: str,
+    value_columns: tuple[str, ...],
+    *,
+    name: str | None = None,
+    foreign_key: bool = True,
+) -> str:
+    values = "".join(f"        {c} REAL,\n" for c in value_columns)
+    # Shard files have no measurements table to reference (see thermal_local.db.shards).
+    fk = """,
+        FOREIGN KEY (measurement_id)
+            REFERENCES measurements(id)
+            ON DELETE CASCADE""" if foreign_key else ""
+    return f"""
+    CREATE TABLE IF NOT EXISTS {name or table} (
+        measurement_id TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        id TEXT,
+{values}        is_delete INTEGER DEFAULT 0,
+
+        PRIMARY KEY (measurement_id, seq){fk}
+    ) WITHOUT ROWID;
+    """
+
+
+def _table_exists(cur: sqlite3.Cursor, table: str) -> bool:
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    return cur.fetchone() is not None
+
+
+def create_point_tables(conn: sqlite3.Connection, *, foreign_key: bool = True) -> None:
+    """
+    Point tables and their range indexes. Clustered on (measurement_id, seq),
+    see thermal_local.db.points. Tables from before that layout are converted
+    in place, keeping row order.
+    """
     cur = conn.cursor()
+    for table, value_columns in DATASET_COLUMNS.items():
+        cur.execute(_point_table_sql(table, value_columns, foreign_key=foreign_key))
+        _add_column_if_missing(cur, table, "is_delete", "INTEGER DEFAULT 0")
+        _cluster_point_table(conn, table, value_columns)
+
+    # Windowed reads (time window, frequency band) over live rows.
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_standard_plot_time "
+        "ON standard_plot (measurement_id, time) WHERE is_delete = 0"
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_cole_cole_frequency "
+        "ON cole_cole (measurement_id, frequency) WHERE is_delete = 0"
+    )
+
+
+def _cluster_point_table(conn: sqlite3.Connection, table: str, value_columns: tuple[str, ...]) -> None:
+    """Rebuild an old UUID-keyed point table as WITHOUT ROWID, numbering rows by rowid."""
+    cur = conn.cursor()
+    if "seq" in _existing_columns(cur, table):
+        return
+    conn.commit()
+    # Dropping a table with foreign keys on would run a row-by-row DELETE first.
+    cur.execute("PRAGMA foreign_keys = OFF")
+    try:
+        cur.execute("BEGIN IMMEDIATE")
+        new = f"{table}__clustered"
+        cur.execute(f"DROP TABLE IF EXISTS {new}")
+        cur.execute(_point_table_sql(table, value_columns, name=new))
+        cols = ", ".join(("id", *value_columns, "is_delete"))
+        cur.execute(f"""
+            INSERT INTO {new} (measurement_id, seq, {cols})
+            SELECT measurement_id,
+                   ROW_NUMBER() OVER (PARTITION BY measurement_id ORDER BY rowid) - 1,
+                   {cols}
+            FROM {table}
+            ORDER BY measurement_id, rowid
+        """)
+        cur.execute(f"DROP TABLE {table}")
+        cur.execute(f"ALTER TABLE {new} RENAME TO {table}")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        cur.execute("PRAGMA foreign_keys = ON")
+
+
+def migrate_sqlite(db_path: Path, *, layout: str | None = None) -> None:
+    """
+    Create or upgrade the local schema. A new database gets `layout` (default
+    STORAGE_LAYOUT); an existing one keeps its own: a catalog without point
+    tables is sharded (see thermal_local.db.shards).
+    """
+    enable_wal(db_path)
+    conn = connect(db_path)
+    cur = conn.cursor()
+    new_database = not _table_exists(cur, "measurements")
 
     # Keep schema aligned with sync from server.
     cur.execute("""
@@ -82,60 +177,311 @@ def migrate_sqlite(db_path: Path) -> None:
     _add_column_if_missing(cur, "measurements", "num_order", "INTEGER")
     _add_column_if_missing(cur, "measurements", "created_at", "TEXT")
     _add_column_if_missing(cur, "measurements", "is_delete", "INTEGER DEFAULT 0")
+    _add_column_if_missing(cur, "measurements", "deleted_at", "TEXT")
+
+    # ---------------- Point tables: ColeCole, StandardPlot, Nanothickness ----------------
+    # In the sharded layout they live in the per-device shard files instead.
+    if _table_exists(cur, "standard_plot") or (
+        new_database and (layout or STORAGE_LAYOUT) != "sharded"
+    ):
+        create_point_tables(conn)
 
-    # ---------------- Nanothickness ----------------
+    # ---------------- Cole-Cole fits (local cache) ----------------
+    # No FK: server sync deletes/reloads measurements. A fit is current while
+    # its points' data version (data_versions) is unchanged; after a change the
+    # data hash decides whether to refit. Local replaces and deletes drop it.
     cur.execute("""
-    CREATE TABLE IF NOT EXISTS nanothickness (
-        id TEXT PRIMARY KEY,
-        measurement_id TEXT NOT NULL,
-        pos1 REAL,
-        pos2 REAL,
-        pos3 REAL,
-        pos4 REAL,
-        pos5 REAL,
-        is_delete INTEGER DEFAULT 0,
+    CREATE TABLE IF NOT EXISTS cole_cole_fits (
+        measurement_id TEXT PRIMARY KEY,
+        data_hash TEXT NOT NULL,
+        r0 REAL,
+        r_inf REAL,
+        tau REAL,
+        alpha REAL,
+        rmse REAL,
+        n_points INTEGER,
+        converged INTEGER,
+        residuals BLOB,
+        fitted_at TEXT,
+        data_version TEXT
+    );
+    """)
+    _add_column_if_missing(cur, "cole_cole_fits", "data_version", "TEXT")
 
-        FOREIGN KEY (measurement_id)
-            REFERENCES measurements(id)
-            ON DELETE CASCADE
+    # ---------------- StandardPlot metrics (computed at ingest) ----------------
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS standard_plot_metrics (
+        measurement_id TEXT PRIMARY KEY,
+        n_points INTEGER,
+        duration REAL,
+        v_initial REAL,
+        v_steady REAL,
+        rise_time REAL,
+        time_constant REAL,
+        drift REAL,
+        computed_at TEXT
     );
     """)
-    _add_column_if_missing(cur, "nanothickness", "is_delete", "INTEGER DEFAULT 0")
 
-    # ---------------- ColeCole ----------------
+    # ---------------- Local point-data cache (scoped sync) ----------------
+    # Measurements whose point rows are present locally; the rest are fetched
+    # from the server on first view.
     cur.execute("""
-    CREATE TABLE IF NOT EXISTS cole_cole (
-        id TEXT PRIMARY KEY,
-        measurement_id TEXT NOT NULL,
-        frequency REAL,
-        resistance REAL,
-        reactance REAL,
-        capacitance REAL,
-        is_delete INTEGER DEFAULT 0,
+    CREATE TABLE IF NOT EXISTS local_points (
+        measurement_id TEXT PRIMARY KEY,
+        fetched_at TEXT
+    );
+    """)
 
-        FOREIGN KEY (measurement_id)
-            REFERENCES measurements(id)
-            ON DELETE CASCADE
+    # ---------------- Sidebar search index (FTS5) ----------------
+    # One row per device (rowid = devices.rowid) with its live measurement names,
+    # kept current by triggers so sync and local edits need no extra work.
+    cur.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS catalog_fts USING fts5(
+        device_name,
+        measurement_names,
+        prefix = '1 2 3'
     );
     """)
-    _add_column_if_missing(cur, "cole_cole", "is_delete", "INTEGER DEFAULT 0")
+    _measurement_names = """
+        COALESCE((
+            SELECT group_concat(name, ' ')
+            FROM measurements
+            WHERE device_id = {dev} AND is_delete = 0
+        ), '')
+    """
+    cur.executescript(f"""
+    CREATE TRIGGER IF NOT EXISTS catalog_fts_devices_ai AFTER INSERT ON devices BEGIN
+        INSERT INTO catalog_fts (rowid, device_name, measurement_names)
+        VALUES (NEW.rowid, NEW.name, {_measurement_names.format(dev="NEW.id")});
+    END;
+    CREATE TRIGGER IF NOT EXISTS catalog_fts_devices_au AFTER UPDATE OF name ON devices BEGIN
+        UPDATE catalog_fts SET device_name = NEW.name WHERE rowid = NEW.rowid;
+    END;
+    CREATE TRIGGER IF NOT EXISTS catalog_fts_devices_ad AFTER DELETE ON devices BEGIN
+        DELETE FROM catalog_fts WHERE rowid = OLD.rowid;
+    END;
+    CREATE TRIGGER IF NOT EXISTS catalog_fts_measurements_ai AFTER INSERT ON measurements BEGIN
+        UPDATE catalog_fts SET measurement_names = {_measurement_names.format(dev="NEW.device_id")}
+        WHERE rowid = (SELECT rowid FROM devices WHERE id = NEW.device_id);
+    END;
+    CREATE TRIGGER IF NOT EXISTS catalog_fts_measurements_au
+    AFTER UPDATE OF name, is_delete, device_id ON measurements BEGIN
+        UPDATE catalog_fts SET measurement_names = {_measurement_names.format(dev="NEW.device_id")}
+        WHERE rowid = (SELECT rowid FROM devices WHERE id = NEW.device_id);
+        UPDATE catalog_fts SET measurement_names = {_measurement_names.format(dev="OLD.device_id")}
+        WHERE rowid = (SELECT rowid FROM devices WHERE id = OLD.device_id)
+          AND OLD.device_id IS NOT NEW.device_id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS catalog_fts_measurements_ad AFTER DELETE ON measurements BEGIN
+        UPDATE catalog_fts SET measurement_names = {_measurement_names.format(dev="OLD.device_id")}
+        WHERE rowid = (SELECT rowid FROM devices WHERE id = OLD.device_id);
+    END;
+    """)
+    # Backfill for databases created before the index existed.
+    cur.execute("SELECT (SELECT COUNT(*) FROM devices) != (SELECT COUNT(*) FROM catalog_fts)")
+    if cur.fetchone()[0]:
+        cur.execute("DELETE FROM catalog_fts")
+        cur.execute(f"""
+            INSERT INTO catalog_fts (rowid, device_name, measurement_names)
+            SELECT d.rowid, d.name, {_measurement_names.format(dev="d.id")}
+            FROM devices d
+        """)
 
-    # ---------------- StandardPlot ----------------
+    # ---------------- Device structure fields ----------------
+    # devices.structure_json flattened to one row per leaf value (key = JSON path
+    # without "$.", e.g. "material" or "layers[0].thickness"), refreshed by triggers.
     cur.execute("""
-    CREATE TABLE IF NOT EXISTS standard_plot (
-        id TEXT PRIMARY KEY,
+    CREATE TABLE IF NOT EXISTS device_structure_fields (
+        device_id TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value_text TEXT COLLATE NOCASE,
+        value_num REAL,
+        value_type TEXT,
+
+        PRIMARY KEY (device_id, key)
+    );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_structure_fields_text ON device_structure_fields (key, value_text)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_structure_fields_num ON device_structure_fields (key, value_num)")
+    _structure_rows = """
+        INSERT OR REPLACE INTO device_structure_fields (device_id, key, value_text, value_num, value_type)
+        SELECT
+            {dev},
+            substr(fullkey, 3),
+            CAST(atom AS TEXT),
+            CASE
+                WHEN type IN ('integer', 'real') THEN atom
+                WHEN type = 'text' AND atom GLOB '[0-9.+-]*' THEN CAST(atom AS REAL)
+            END,
+            type
+        FROM json_tree(CASE WHEN json_valid({js}) THEN {js} ELSE '{{}}' END)
+        WHERE type NOT IN ('object', 'array') AND fullkey != '$'
+    """
+    cur.executescript(f"""
+    CREATE TRIGGER IF NOT EXISTS structure_fields_ai AFTER INSERT ON devices BEGIN
+        {_structure_rows.format(dev="NEW.id", js="NEW.structure_json")};
+    END;
+    CREATE TRIGGER IF NOT EXISTS structure_fields_au AFTER UPDATE OF structure_json, id ON devices BEGIN
+        DELETE FROM device_structure_fields WHERE device_id = OLD.id;
+        {_structure_rows.format(dev="NEW.id", js="NEW.structure_json")};
+    END;
+    CREATE TRIGGER IF NOT EXISTS structure_fields_ad AFTER DELETE ON devices BEGIN
+        DELETE FROM device_structure_fields WHERE device_id = OLD.id;
+    END;
+    """)
+    # Backfill for databases created before the table existed.
+    cur.execute("""
+        SELECT
+            (SELECT COUNT(*) FROM devices
+             WHERE json_valid(structure_json) AND json_type(structure_json) = 'object')
+            != (SELECT COUNT(DISTINCT device_id) FROM device_structure_fields)
+    """)
+    if cur.fetchone()[0]:
+        cur.execute("DELETE FROM device_structure_fields")
+        cur.execute(
+            _structure_rows.replace("FROM json_tree", "FROM devices d, json_tree").format(
+                dev="d.id", js="d.structure_json"
+            )
+        )
+
+    # ---------------- Data versions ----------------
+    # Monotonic counters per scope ("devices", "measurements", and the point-data
+    # scopes of thermal_local.services.point_cache), used as cache keys by the UI,
+    # the point cache and the HTTP API's ETags.
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS data_versions (
+        scope TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    );
+    """)
+    _bump_devices = """
+        INSERT INTO data_versions (scope, version) VALUES ('devices', 1)
+        ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+    """
+    cur.executescript(f"""
+    CREATE TRIGGER IF NOT EXISTS data_versions_devices_ai AFTER INSERT ON devices BEGIN {_bump_devices} END;
+    CREATE TRIGGER IF NOT EXISTS data_versions_devices_au AFTER UPDATE ON devices BEGIN {_bump_devices} END;
+    CREATE TRIGGER IF NOT EXISTS data_versions_devices_ad AFTER DELETE ON devices BEGIN {_bump_devices} END;
+    """)
+    _bump_measurements = _bump_devices.replace("'devices'", "'measurements'")
+    cur.executescript(f"""
+    CREATE TRIGGER IF NOT EXISTS data_versions_measurements_ai AFTER INSERT ON measurements BEGIN {_bump_measurements} END;
+    CREATE TRIGGER IF NOT EXISTS data_versions_measurements_au AFTER UPDATE ON measurements BEGIN {_bump_measurements} END;
+    CREATE TRIGGER IF NOT EXISTS data_versions_measurements_ad AFTER DELETE ON measurements BEGIN {_bump_measurements} END;
+    """)
+
+    # ---------------- Maintenance runs ----------------
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS maintenance_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        started_at TEXT NOT NULL,
+        finished_at TEXT,
+        report_json TEXT
+    );
+    """)
+
+    # Tombstones of measurements the maintenance job archived and purged;
+    # server pulls skip them so they do not come back.
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS purged_measurements (
+        measurement_id TEXT PRIMARY KEY,
+        purged_at TEXT NOT NULL
+    );
+    """)
+
+    # ---------------- Raw file store (content-addressed) ----------------
+    # One row per distinct file content; the file itself lives under
+    # db/blobs/<sha[:2]>/<sha>. `parsed` holds the parsed float64 matrix
+    # (n_rows x len(DATASET_COLUMNS[kind])) so identical files are parsed once.
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS raw_blobs (
+        sha256 TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        stored_size INTEGER NOT NULL,
+        compression TEXT,
+        n_rows INTEGER,
+        parsed BLOB,
+        created_at TEXT
+    );
+    """)
+    # Which measurement's dataset came from which raw file.
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS raw_blob_refs (
         measurement_id TEXT NOT NULL,
-        time REAL,
-        voltage REAL,
-        is_delete INTEGER DEFAULT 0,
+        kind TEXT NOT NULL,
+        sha256 TEXT NOT NULL REFERENCES raw_blobs(sha256),
+        source_name TEXT,
+        added_at TEXT,
+        PRIMARY KEY (measurement_id, kind)
+    );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_raw_blob_refs_sha ON raw_blob_refs(sha256)")
+    # Files seen on disk: (size, mtime) unchanged -> content hash is reused
+    # without reading the file again.
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS raw_files (
+        path TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        sha256 TEXT NOT NULL
+    );
+    """)
 
-        FOREIGN KEY (measurement_id)
-            REFERENCES measurements(id)
-            ON DELETE CASCADE
+    # ---------------- Pending server uploads (watch-folder ingest) ----------------
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS upload_queue (
+        measurement_id TEXT PRIMARY KEY,
+        queued_at TEXT NOT NULL,
+        attempts INTEGER DEFAULT 0,
+        last_error TEXT
+    );
+    """)
+
+    # ---------------- Folders created under root/devices ----------------
+    # rel_path is relative to root/devices. Lets sync_db_to_filesystem touch
+    # only folders whose device/measurement changed since the last run.
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS fs_materialized (
+        entity_id TEXT PRIMARY KEY,
+        rel_path TEXT NOT NULL,
+        is_device INTEGER NOT NULL,
+        orphaned_at TEXT
+    );
+    """)
+
+    # ---------------- Ingest validation results ----------------
+    # mask: zlib-compressed uint8 flags, one per row in insert order (NULL = clean).
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS dataset_quality (
+        measurement_id TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        n_rows INTEGER NOT NULL,
+        n_flagged INTEGER NOT NULL,
+        flags INTEGER NOT NULL,
+        mask BLOB,
+        summary TEXT,
+        checked_at TEXT,
+        PRIMARY KEY (measurement_id, kind)
     );
     """)
-    _add_column_if_missing(cur, "standard_plot", "is_delete", "INTEGER DEFAULT 0")
 
     conn.commit()
     conn.close()
 
+
+def migrate_server(p_cur) -> None:
+    """
+    Server-side objects owned by this app (the core tables are managed elsewhere).
+    Run once by an administrator (`python -m thermal_local.cli migrate-server`);
+    stations then only need read/write access to the tables.
+    """
+    # Per-device num_order counter: allocation is one row-locked UPDATE instead
+    # of MAX(num_order) + 1, so concurrent stations never collide.
+    p_cur.execute("""
+    CREATE TABLE IF NOT EXISTS device_counters (
+        device_id TEXT PRIMARY KEY,
+        last_order INTEGER NOT NULL
+    );
+    """)
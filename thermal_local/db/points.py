@@ -0,0 +1,30 @@
+"""
+Point tables (cole_cole, standard_plot, nanothickness) are clustered on
+(measurement_id, seq) as WITHOUT ROWID tables: one measurement's rows are
+stored together in insertion order, so reading a trace is one range scan of
+the primary key. `seq` is assigned on insert; readers ORDER BY seq.
+"""
+
+from __future__ import annotations
+
+# Point-data tables and their value columns (same names locally and on the server).
+DATASET_COLUMNS: dict[str, tuple[str, ...]] = {
+    "cole_cole": ("frequency", "resistance", "reactance", "capacitance"),
+    "standard_plot": ("time", "voltage"),
+    "nanothickness": ("pos1", "pos2", "pos3", "pos4", "pos5"),
+}
+
+
+def append_points_sql(table: str, columns: tuple[str, ...] | list[str]) -> str:
+    """
+    INSERT for `table` rows with the given columns (must include measurement_id).
+    Each row gets the next seq of its measurement, so executemany batches keep
+    their order even when several measurements are interleaved.
+    """
+    columns = list(columns)
+    m = columns.index("measurement_id") + 1
+    params = ", ".join(f"?{i}" for i in range(1, len(columns) + 1))
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}, seq) VALUES ({params}, "
+        f"(SELECT IFNULL(MAX(seq) + 1, 0) FROM {table} WHERE measurement_id = ?{m}))"
+    )
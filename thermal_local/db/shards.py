@@ -0,0 +1,224 @@
+"""
+Per-device sharded storage (STORAGE_LAYOUT = "sharded").
+
+The catalog (db/app.db) keeps users, devices, measurements and the small
+per-measurement tables (metrics, fits, quality, versions); each device's point
+rows (cole_cole, standard_plot, nanothickness) live in db/shards/<device_id>.db
+with the same clustered tables as the single layout. A catalog connection
+ATTACHes one shard as "shard": the catalog has no point tables of its own, so
+the usual unqualified table names resolve to the shard and the existing
+queries run unchanged.
+
+Each shard has its own WAL and writer lock, so syncs, imports, VACUUMs and
+exports of different devices do not wait for each other, and a device's point
+data is removed by deleting its file. A transaction that spans the catalog and
+a shard is atomic per file only. Shard point tables have no foreign key to
+measurements (SQLite cannot reference another file).
+
+The single layout goes through the same helpers: `device_id` is None and the
+catalog connection is used as is.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from thermal_local.db.connection import _write_lock, connect, enable_wal, writer
+from thermal_local.db.migrations import _point_table_sql, create_point_tables
+from thermal_local.db.points import DATASET_COLUMNS
+
+SHARD = "shard"
+SHARDS_DIR = "shards"
+
+_migrated: set[str] = set()
+_migrated_guard = threading.Lock()
+
+
+def shard_path(db_path: Path, device_id: str) -> Path:
+    return Path(db_path).parent / SHARDS_DIR / f"{device_id}.db"
+
+
+def shard_files(db_path: Path) -> dict[str, Path]:
+    """Existing shard files by device id."""
+    folder = Path(db_path).parent / SHARDS_DIR
+    return {p.stem: p for p in sorted(folder.glob("*.db"))} if folder.is_dir() else {}
+
+
+def stale_shards(db_path: Path) -> dict[str, Path]:
+    """Shard files whose device is no longer in the catalog."""
+    conn = connect(db_path)
+    try:
+        known = {r[0] for r in conn.execute("SELECT id FROM devices")}
+    finally:
+        conn.close()
+    return {d: p for d, p in shard_files(db_path).items() if d not in known}
+
+
+def is_sharded(conn: sqlite3.Connection) -> bool:
+    """True if `conn` is a catalog database (no point tables of its own)."""
+    return conn.execute(
+        "SELECT 1 FROM main.sqlite_master WHERE type = 'table' AND name = 'standard_plot'"
+    ).fetchone() is None
+
+
+def migrate_shard(path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    enable_wal(path)
+    conn = connect(path)
+    try:
+        create_point_tables(conn, foreign_key=False)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def ensure_shard(db_path: Path, device_id: str) -> Path:
+    """The device's shard file, created and migrated on first use in this process."""
+    path = shard_path(db_path, device_id)
+    key = str(path.resolve())
+    with _migrated_guard:
+        if key in _migrated and path.exists():
+            return path
+    migrate_shard(path)
+    with _migrated_guard:
+        _migrated.add(key)
+    return path
+
+
+def drop_shard_file(path: Path) -> None:
+    """
+    Delete a shard and its WAL files under its writer lock; the next use
+    recreates it empty. Connections still open on it (other processes) keep
+    reading the unlinked file until they close.
+    """
+    path = Path(path)
+    with _write_lock(path):
+        for p in (path, path.with_name(path.name + "-wal"), path.with_name(path.name + "-shm")):
+            p.unlink(missing_ok=True)
+        with _migrated_guard:
+            _migrated.discard(str(path.resolve()))
+
+
+def shard_device(conn: sqlite3.Connection, measurement_id: str) -> str | None:
+    """Device whose shard holds the measurement's points; None in the single layout."""
+    if not is_sharded(conn):
+        return None
+    row = conn.execute("SELECT device_id FROM measurements WHERE id = ?", (measurement_id,)).fetchone()
+    if row is None:
+        raise RuntimeError("Measurement not found")
+    return row[0]
+
+
+def shard_of(db_path: Path, measurement_id: str) -> str | None:
+    conn = connect(db_path)
+    try:
+        return shard_device(conn, measurement_id)
+    finally:
+        conn.close()
+
+
+def shard_groups(
+    db_path: Path, measurement_ids: list[str] | None = None
+) -> dict[str | None, list[str] | None]:
+    """
+    Measurements grouped by the shard holding their points: {None: measurement_ids}
+    in the single layout, else {device_id: ids} (all measurements if None).
+    """
+    conn = connect(db_path)
+    try:
+        if not is_sharded(conn):
+            return {None: measurement_ids}
+        sql = "SELECT device_id, id FROM measurements"
+        params: list[str] = []
+        if measurement_ids is not None:
+            sql += f" WHERE id IN ({','.join('?' * len(measurement_ids))})"
+            params = list(measurement_ids)
+        groups: dict[str | None, list[str] | None] = {}
+        for device_id, measurement_id in conn.execute(sql + " ORDER BY device_id", params):
+            groups.setdefault(device_id, []).append(measurement_id)
+        return groups
+    finally:
+        conn.close()
+
+
+def attach_shard(conn: sqlite3.Connection, db_path: Path, device_id: str) -> None:
+    # On a read-only connection the shard is attached read-only as well.
+    conn.execute(f"ATTACH DATABASE ? AS {SHARD}", (str(ensure_shard(db_path, device_id)),))
+
+
+def connect_points(db_path: Path, device_id: str | None = None, *, readonly: bool = False) -> sqlite3.Connection:
+    """Catalog connection with the device's shard attached (plain connection for None)."""
+    conn = connect(db_path, readonly=readonly)
+    if device_id is not None:
+        try:
+            attach_shard(conn, db_path, device_id)
+        except BaseException:
+            conn.close()
+            raise
+    return conn
+
+
+def open_points(db_path: Path, measurement_id: str) -> sqlite3.Connection:
+    """Connection on which the measurement's point tables can be queried."""
+    conn = connect(db_path)
+    try:
+        device_id = shard_device(conn, measurement_id)
+        if device_id is not None:
+            attach_shard(conn, db_path, device_id)
+    except BaseException:
+        conn.close()
+        raise
+    return conn
+
+
+@contextmanager
+def points_attached(conn: sqlite3.Connection, db_path: Path, measurement_id: str) -> Iterator[sqlite3.Connection]:
+    """
+    Attach the measurement's shard to an existing (e.g. pooled) connection for
+    the duration of the block. No-op in the single layout or for an unknown
+    measurement. Must be entered outside a transaction.
+
+    Never creates or migrates anything, so it is safe for read-only callers: a
+    device without a shard file yet gets empty in-memory point tables.
+    """
+    device_id = None
+    if is_sharded(conn):
+        row = conn.execute("SELECT device_id FROM measurements WHERE id = ?", (measurement_id,)).fetchone()
+        device_id = row[0] if row else None
+    if device_id is None:
+        yield conn
+        return
+    path = shard_path(db_path, device_id)
+    if path.exists():
+        conn.execute(f"ATTACH DATABASE ? AS {SHARD}", (str(path),))
+    else:
+        conn.execute(f"ATTACH DATABASE ':memory:' AS {SHARD}")
+        for table, value_columns in DATASET_COLUMNS.items():
+            conn.execute(_point_table_sql(table, value_columns, name=f"{SHARD}.{table}", foreign_key=False))
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.execute(f"DETACH DATABASE {SHARD}")
+
+
+@contextmanager
+def points_writer(db_path: Path, device_id: str | None = None) -> Iterator[sqlite3.Connection]:
+    """`writer()` on the catalog with the device's shard attached (plain writer for None)."""
+    if device_id is None:
+        with writer(db_path) as conn:
+            yield conn
+        return
+    path = shard_path(db_path, device_id)
+    with ExitStack() as locks:
+        # Held (in writer()'s path order) from before the shard is created until
+        # the transaction ends, so drop_shard_file cannot remove it in between.
+        for p in sorted({str(Path(db_path).resolve()), str(path.resolve())}):
+            locks.enter_context(_write_lock(Path(p)))
+        with writer(db_path, attach={SHARD: ensure_shard(db_path, device_id)}) as conn:
+            yield conn
@@ -10,6 +10,9 @@ class AppPaths:
     data_root: Path
     db_dir: Path
     db_path: Path
+    archive_path: Path
+    blobs_dir: Path
+    shards_dir: Path
 
 
 def get_paths(project_dir: Path | None = None) -> AppPaths:
@@ -17,10 +20,16 @@ def get_paths(project_dir: Path | None = None) -> AppPaths:
     data_root = base / "root"
     db_dir = data_root / "db"
     db_path = db_dir / "app.db"
+    archive_path = db_dir / "archive.db"
+    blobs_dir = db_dir / "blobs"
+    shards_dir = db_dir / "shards"
     return AppPaths(
         project_dir=base,
         data_root=data_root,
         db_dir=db_dir,
         db_path=db_path,
+        archive_path=archive_path,
+        blobs_dir=blobs_dir,
+        shards_dir=shards_dir,
     )
 
@@ -0,0 +1,403 @@
+from __future__ import annotations
+
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from thermal_local.config import SENTINEL_MIN_ABS
+from thermal_local.db.arrays import read_grouped
+from thermal_local.db.connection import writer
+from thermal_local.db.shards import connect_points, shard_groups
+from thermal_local.services.measurements import open_sqlite
+from thermal_local.services.point_cache import points_version
+
+# Below this many pending measurements a process pool costs more than it saves.
+POOL_MIN_MEASUREMENTS = 64
+FIT_BATCH_SIZE = 256
+FIT_MAX_ITER = 200
+FIT_TOL = 1e-10
+
+
+@dataclass(frozen=True)
+class ColeFit:
+    measurement_id: str
+    data_hash: str
+    r0: float
+    r_inf: float
+    tau: float
+    alpha: float
+    rmse: float
+    n_points: int
+    converged: bool
+    residuals: np.ndarray
+
+
+# =========================
+# DERIVED QUANTITIES
+# =========================
+def impedance_derived(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add |Z|, phase and tan δ columns to a Cole-Cole frame.
+
+    Reactance is stored as the positive capacitive part, i.e. Z = R - jX.
+    """
+    r = df["resistance"].to_numpy(dtype=float)
+    x = df["reactance"].to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tan_delta = np.where(x != 0, r / np.abs(x), np.nan)
+    return df.assign(
+        impedance=np.hypot(r, x),
+        phase_deg=np.degrees(np.arctan2(-x, r)),
+        tan_delta=tan_delta,
+    )
+
+
+# =========================
+# MODEL
+# =========================
+def cole_impedance(freq: np.ndarray, r0, r_inf, tau, alpha) -> np.ndarray:
+    """Cole model Z(ω) = R∞ + (R0 - R∞) / (1 + (jωτ)^(1-α)); broadcasts over batches."""
+    omega = 2.0 * np.pi * freq
+    beta = 1.0 - alpha
+    s = (omega * tau) ** beta * np.exp(0.5j * np.pi * beta)
+    return r_inf + (r0 - r_inf) / (1.0 + s)
+
+
+def _residuals(params: np.ndarray, freq, r, x, weight) -> np.ndarray:
+    # params: (M, 4) = [R0, R∞, ln τ, α]; returns (M, 2N) weighted residuals.
+    z = cole_impedance(
+        freq,
+        params[:, 0:1],
+        params[:, 1:2],
+        np.exp(params[:, 2:3]),
+        params[:, 3:4],
+    )
+    res_r = (z.real - r) * weight
+    res_x = (-z.imag - x) * weight
+    return np.concatenate([res_r, res_x], axis=1)
+
+
+def _clip_params(params: np.ndarray, log_tau_bounds: np.ndarray) -> np.ndarray:
+    # Keep R∞ >= 0, R0 >= R∞, τ within two decades of the measured band and 0 <= α < 1.
+    params[:, 1] = np.maximum(params[:, 1], 0.0)
+    params[:, 0] = np.maximum(params[:, 0], params[:, 1])
+    params[:, 2] = np.clip(params[:, 2], log_tau_bounds[:, 0], log_tau_bounds[:, 1])
+    params[:, 3] = np.clip(params[:, 3], 0.0, 0.99)
+    return params
+
+
+def _initial_guess(freq, r, x, mask) -> np.ndarray:
+    m = freq.shape[0]
+    big = np.where(mask, freq, np.inf)
+    small = np.where(mask, freq, -np.inf)
+    rows = np.arange(m)
+    lo = np.argmin(big, axis=1)
+    hi = np.argmax(small, axis=1)
+    peak = np.argmax(np.where(mask, x, -np.inf), axis=1)
+    tau = 1.0 / (2.0 * np.pi * np.maximum(freq[rows, peak], 1e-12))
+    return np.column_stack([
+        r[rows, lo],
+        np.maximum(r[rows, hi], 0.0),
+        np.log(tau),
+        np.full(m, 0.2),
+    ])
+
+
+def fit_cole_batch(
+    freq: np.ndarray,
+    r: np.ndarray,
+    x: np.ndarray,
+    mask: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Levenberg-Marquardt fit of the Cole model for M measurements at once.
+
+    Inputs are (M, N) arrays padded to a common length; `mask` marks valid points.
+    Residuals are weighted by 1/|Z| so both ends of the spectrum count equally.
+    Returns (params (M, 4) as [R0, R∞, τ, α], residuals (M, 2N), converged (M,)).
+    """
+    freq = np.where(mask, freq, 1.0)
+    r = np.where(mask, r, 0.0)
+    x = np.where(mask, x, 0.0)
+    with np.errstate(divide="ignore"):
+        weight = np.where(mask, 1.0 / np.maximum(np.hypot(r, x), 1e-30), 0.0)
+
+    f_lo = np.min(np.where(mask, freq, np.inf), axis=1)
+    f_hi = np.max(np.where(mask, freq, -np.inf), axis=1)
+    log_tau_bounds = np.column_stack([
+        -np.log(2.0 * np.pi * f_hi * 100.0),
+        -np.log(2.0 * np.pi * f_lo / 100.0),
+    ])
+
+    params = _clip_params(_initial_guess(freq, r, x, mask), log_tau_bounds)
+    res = _residuals(params, freq, r, x, weight)
+    cost = np.einsum("ij,ij->i", res, res)
+    lam = np.full(params.shape[0], 1e-3)
+    converged = np.zeros(params.shape[0], dtype=bool)
+    eye = np.eye(4)
+
+    for _ in range(FIT_MAX_ITER):
+        if converged.all():
+            break
+
+        # Forward-difference Jacobian, one model evaluation per parameter for the whole batch.
+        step = 1e-6 * np.maximum(np.abs(params), 1e-3)
+        jac = np.empty(res.shape + (4,))
+        for k in range(4):
+            shifted = params.copy()
+            shifted[:, k] += step[:, k]
+            jac[:, :, k] = (_residuals(shifted, freq, r, x, weight) - res) / step[:, k:k + 1]
+
+        jtj = np.einsum("mnk,mnl->mkl", jac, jac)
+        jtr = np.einsum("mnk,mn->mk", jac, res)
+        damped = jtj + lam[:, None, None] * (jtj * eye + 1e-12 * eye)
+        delta = np.linalg.solve(damped, -jtr[:, :, None])[:, :, 0]
+        delta[converged] = 0.0
+
+        trial = _clip_params(params + delta, log_tau_bounds)
+        trial_res = _residuals(trial, freq, r, x, weight)
+        trial_cost = np.einsum("ij,ij->i", trial_res, trial_res)
+
+        better = np.isfinite(trial_cost) & (trial_cost < cost) & ~converged
+        rel_change = np.where(better, (cost - trial_cost) / np.maximum(cost, 1e-300), 0.0)
+
+        params[better] = trial[better]
+        res[better] = trial_res[better]
+        cost[better] = trial_cost[better]
+        lam = np.where(better, lam * 0.3, lam * 10.0)
+
+        converged |= (better & (rel_change < FIT_TOL)) | (lam > 1e12)
+
+    out = params.copy()
+    out[:, 2] = np.exp(params[:, 2])
+    return out, res, converged
+
+
+# =========================
+# BATCH ENGINE
+# =========================
+def _data_hash(freq: np.ndarray, r: np.ndarray, x: np.ndarray) -> str:
+    h = hashlib.sha1()
+    for arr in (freq, r, x):
+        h.update(np.ascontiguousarray(arr, dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+
+def _valid_points(freq: np.ndarray, r: np.ndarray, x: np.ndarray) -> np.ndarray:
+    return (
+        np.isfinite(freq) & np.isfinite(r) & np.isfinite(x)
+        & (freq > 0)
+        # Overflow markers; ingest stores them as NULL, but older rows may have them.
+        & (np.abs(r) < SENTINEL_MIN_ABS) & (np.abs(x) < SENTINEL_MIN_ABS)
+    )
+
+
+def _read_all_cole_cole(
+    db_path: Path, measurement_ids: list[str] | None
+) -> tuple[list[str], np.ndarray, np.ndarray]:
+    parts = []
+    for device_id, ids in shard_groups(db_path, measurement_ids).items():
+        conn = connect_points(db_path, device_id)
+        try:
+            parts.append(read_grouped(
+                conn,
+                "cole_cole",
+                ("frequency", "resistance", "reactance"),
+                measurement_ids=ids,
+                order_by="frequency",
+            ))
+        finally:
+            conn.close()
+    if len(parts) == 1:
+        return parts[0]
+    # Sharded layout: one group per device, concatenated.
+    ids = [mid for part in parts for mid in part[0]]
+    offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+    if parts:
+        np.cumsum(np.concatenate([np.diff(part[1]) for part in parts]), out=offsets[1:])
+    points = np.concatenate([part[2] for part in parts]) if parts else np.empty((0, 3))
+    return ids, offsets, points
+
+
+def _version_key(bulk: int, own: int) -> str:
+    return f"{bulk}.{own}"
+
+
+def _points_versions(db_path: Path, measurement_ids: list[str] | None) -> tuple[int, dict[str, int]]:
+    """(bulk, {measurement_id: own}) points data versions, see thermal_local.services.point_cache."""
+    conn = open_sqlite(db_path)
+    try:
+        if measurement_ids is None:
+            rows = conn.execute(
+                "SELECT scope, version FROM data_versions "
+                "WHERE scope = 'points' OR (scope >= 'points:' AND scope < 'points;')"
+            )
+        else:
+            scopes = ["points", *(f"points:{mid}" for mid in measurement_ids)]
+            rows = conn.execute(
+                f"SELECT scope, version FROM data_versions WHERE scope IN ({','.join('?' * len(scopes))})",
+                scopes,
+            )
+        versions = dict(rows.fetchall())
+    finally:
+        conn.close()
+    bulk = versions.pop("points", 0)
+    return bulk, {scope.removeprefix("points:"): v for scope, v in versions.items()}
+
+
+def _stored_hashes(db_path: Path) -> dict[str, str]:
+    conn = open_sqlite(db_path)
+    cur = conn.cursor()
+    cur.execute("SELECT measurement_id, data_hash FROM cole_cole_fits")
+    out = dict(cur.fetchall())
+    conn.close()
+    return out
+
+
+def _pad(groups: list[tuple[str, str, np.ndarray, np.ndarray, np.ndarray]]):
+    n = max(len(g[2]) for g in groups)
+    shape = (len(groups), n)
+    freq = np.zeros(shape)
+    r = np.zeros(shape)
+    x = np.zeros(shape)
+    mask = np.zeros(shape, dtype=bool)
+    for i, (_, _, f, rr, xx) in enumerate(groups):
+        k = len(f)
+        freq[i, :k], r[i, :k], x[i, :k], mask[i, :k] = f, rr, xx, True
+    return freq, r, x, mask
+
+
+def _fit_groups(groups: list[tuple[str, str, np.ndarray, np.ndarray, np.ndarray]]) -> list[ColeFit]:
+    freq, r, x, mask = _pad(groups)
+    params, res, converged = fit_cole_batch(freq, r, x, mask)
+    n = freq.shape[1]
+    fits = []
+    for i, (measurement_id, data_hash, f, _, _) in enumerate(groups):
+        k = len(f)
+        residuals = np.concatenate([res[i, :k], res[i, n:n + k]])
+        fits.append(ColeFit(
+            measurement_id=measurement_id,
+            data_hash=data_hash,
+            r0=float(params[i, 0]),
+            r_inf=float(params[i, 1]),
+            tau=float(params[i, 2]),
+            alpha=float(params[i, 3]),
+            rmse=float(np.sqrt(np.mean(residuals ** 2))),
+            n_points=k,
+            converged=bool(converged[i]),
+            residuals=residuals,
+        ))
+    return fits
+
+
+def _store_fits(db_path: Path, fits: list[ColeFit], versions: dict[str, str], unchanged: list[str]) -> None:
+    """Store new fits, and the current data version of fits whose data hash did not change."""
+    now = datetime.utcnow().isoformat()
+    with writer(db_path) as conn:
+        conn.executemany(
+            """
+            INSERT OR REPLACE INTO cole_cole_fits (
+                measurement_id, data_hash, r0, r_inf, tau, alpha,
+                rmse, n_points, converged, residuals, fitted_at, data_version
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (
+                    f.measurement_id, f.data_hash, f.r0, f.r_inf, f.tau, f.alpha,
+                    f.rmse, f.n_points, int(f.converged),
+                    f.residuals.astype(np.float64).tobytes(), now, versions[f.measurement_id],
+                )
+                for f in fits
+            ],
+        )
+        conn.executemany(
+            "UPDATE cole_cole_fits SET data_version = ? WHERE measurement_id = ?",
+            [(versions[mid], mid) for mid in unchanged],
+        )
+
+
+def fit_cole_cole(
+    db_path: Path,
+    measurement_ids: list[str] | None = None,
+    *,
+    workers: int | None = None,
+    force: bool = False,
+) -> int:
+    """
+    Fit every (or the given) measurement whose Cole-Cole data changed since the last fit.
+
+    Fits are cached in `cole_cole_fits` keyed by a hash of the fitted points,
+    along with the points' data version they were checked at;
+    replacing or deleting a measurement's data drops its cached fit.
+    Large backlogs are split into batches and spread over a process pool.
+    Returns the number of measurements that were (re)fitted.
+    """
+    # Read before the points: a change in between leaves an older version behind.
+    bulk, own = _points_versions(db_path, measurement_ids)
+    ids, offsets, points = _read_all_cole_cole(db_path, measurement_ids)
+    if not ids:
+        return 0
+    versions = {mid: _version_key(bulk, own.get(mid, 0)) for mid in ids}
+    stored = {} if force else _stored_hashes(db_path)
+
+    pending = []
+    unchanged = []
+    for i, measurement_id in enumerate(ids):
+        block = points[offsets[i]:offsets[i + 1]]
+        f, r, x = block[:, 0], block[:, 1], block[:, 2]
+        ok = _valid_points(f, r, x)
+        f, r, x = f[ok], r[ok], x[ok]
+        if len(f) < 4:
+            continue
+        data_hash = _data_hash(f, r, x)
+        if stored.get(measurement_id) == data_hash:
+            unchanged.append(measurement_id)
+            continue
+        pending.append((measurement_id, data_hash, f, r, x))
+
+    if not pending:
+        if unchanged:
+            _store_fits(db_path, [], versions, unchanged)
+        return 0
+
+    batches = [pending[i:i + FIT_BATCH_SIZE] for i in range(0, len(pending), FIT_BATCH_SIZE)]
+    if workers == 1 or len(pending) < POOL_MIN_MEASUREMENTS or len(batches) == 1:
+        results = [_fit_groups(b) for b in batches]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_fit_groups, batches))
+
+    fits = [f for batch in results for f in batch]
+    _store_fits(db_path, fits, versions, unchanged)
+    return len(fits)
+
+
+def get_cole_cole_fit(db_path: Path, measurement_id: str) -> dict | None:
+    """
+    Return the cached fit for a measurement. While its points' data version is
+    unchanged no point is read; otherwise it is refitted first if its data changed.
+    """
+    keys = ("r0", "r_inf", "tau", "alpha", "rmse", "n_points", "converged", "fitted_at")
+    sql = f"SELECT {', '.join(keys)}, data_version FROM cole_cole_fits WHERE measurement_id = ?"
+    conn = open_sqlite(db_path)
+    try:
+        version = _version_key(*points_version(conn, measurement_id))
+        row = conn.execute(sql, (measurement_id,)).fetchone()
+    finally:
+        conn.close()
+    if row is None or row[-1] != version:
+        fit_cole_cole(db_path, [measurement_id], workers=1)
+        conn = open_sqlite(db_path)
+        try:
+            row = conn.execute(sql, (measurement_id,)).fetchone()
+        finally:
+            conn.close()
+    if not row:
+        return None
+    return dict(zip(keys, row[:-1]))
@@ -0,0 +1,364 @@
+"""
+Local read-only HTTP API for other lab tools and notebooks, so they stop
+opening root/db/app.db themselves (`python -m thermal_local.cli serve`).
+
+    GET /devices                              devices with their structure
+    GET /devices/<name>/measurements          live measurements of a device
+    GET /measurements/<id>                    one measurement and its datasets
+    GET /measurements/<id>/<kind>             point data (cole_cole, standard_plot,
+                                              nanothickness) as JSON, CSV or Arrow
+
+Point data format comes from `?format=json|csv|arrow` or the Accept header
+(default JSON, columnar). Responses are streamed in API_CHUNK_ROWS chunks.
+JSON and CSV print every float as text (seconds per million points); Arrow
+sends the arrays as they are and is the format to use for large traces.
+
+Every response carries an ETag built from `data_versions`, so a poll with
+If-None-Match is answered 304 after one small query. Requests run on a pool of
+read-only connections and never take the app's writer lock; point reads go
+through the shared point cache.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+import logging
+import sqlite3
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Iterator
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import numpy as np
+
+from thermal_local.config import API_CHUNK_ROWS, API_HOST, API_POOL_SIZE, API_PORT
+from thermal_local.db.arrays import read_snapshot
+from thermal_local.db.connection import ReadPool
+from thermal_local.db.points import DATASET_COLUMNS
+from thermal_local.db.shards import points_attached
+from thermal_local.services.measurements import read_dataset_arrays
+from thermal_local.services.point_cache import points_version
+
+log = logging.getLogger(__name__)
+
+FORMATS = {
+    "json": "application/json",
+    "csv": "text/csv; charset=utf-8",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+class ApiError(Exception):
+    def __init__(self, status: HTTPStatus, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+def _scope_version(conn: sqlite3.Connection, scope: str) -> int:
+    row = conn.execute("SELECT version FROM data_versions WHERE scope = ?", (scope,)).fetchone()
+    return row[0] if row else 0
+
+
+def _measurement_row(conn: sqlite3.Connection, measurement_id: str) -> dict:
+    row = conn.execute(
+        """
+        SELECT m.id, d.name, m.name, m.num_order, m.created_by, m.created_at
+        FROM measurements m
+        JOIN devices d ON m.device_id = d.id
+        WHERE m.id = ? AND m.is_delete = 0 AND d.is_delete = 0
+        """,
+        (measurement_id,),
+    ).fetchone()
+    if row is None:
+        raise ApiError(HTTPStatus.NOT_FOUND, f"Measurement not found: {measurement_id}")
+    keys = ("id", "device", "name", "num_order", "created_by", "created_at")
+    return dict(zip(keys, row))
+
+
+# ===== RESPONSE BODIES =====
+def _finite_lists(values: np.ndarray) -> str:
+    """JSON array items (without brackets); NaN and inf become null."""
+    items = values.astype(object)
+    items[~np.isfinite(values)] = None
+    return json.dumps(items.tolist())[1:-1]
+
+
+def json_chunks(measurement_id: str, kind: str, arrays: dict[str, np.ndarray]) -> Iterator[bytes]:
+    """{"measurement_id", "kind", "n_rows", "columns": {name: [values]}}, column by column."""
+    n = len(next(iter(arrays.values())))
+    head = json.dumps({"measurement_id": measurement_id, "kind": kind, "n_rows": n})
+    yield (head[:-1] + ', "columns": {').encode()
+    for i, (name, values) in enumerate(arrays.items()):
+        yield f'{", " if i else ""}{json.dumps(name)}: ['.encode()
+        for start in range(0, n, API_CHUNK_ROWS):
+            items = _finite_lists(values[start:start + API_CHUNK_ROWS])
+            yield ((", " if start else "") + items).encode()
+        yield b"]"
+    yield b"}}"
+
+
+def csv_chunks(arrays: dict[str, np.ndarray]) -> Iterator[bytes]:
+    """Header plus one row per point; NaN is an empty field."""
+    n = len(next(iter(arrays.values())))
+    yield (",".join(arrays) + "\r\n").encode()
+    for start in range(0, n, API_CHUNK_ROWS):
+        rows = np.column_stack([v[start:start + API_CHUNK_ROWS] for v in arrays.values()]).tolist()
+        buf = io.StringIO()
+        csv.writer(buf).writerows([["" if x != x else repr(x) for x in row] for row in rows])
+        yield buf.getvalue().encode()
+
+
+class _ChunkSink:
+    """File-like object handing each write to `send` (for the Arrow IPC writer)."""
+
+    def __init__(self, send) -> None:
+        self._send = send
+        self.closed = False
+
+    def write(self, data) -> int:
+        self._send(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def write_arrow(arrays: dict[str, np.ndarray], send) -> None:
+    """Arrow IPC stream, one record batch per API_CHUNK_ROWS rows; NaN is null."""
+    import pyarrow as pa
+
+    schema = pa.schema([(name, pa.float64()) for name in arrays])
+    n = len(next(iter(arrays.values())))
+    with pa.ipc.new_stream(_ChunkSink(send), schema) as out:
+        for start in range(0, n, API_CHUNK_ROWS):
+            out.write_batch(pa.record_batch(
+                [pa.array(v[start:start + API_CHUNK_ROWS], from_pandas=True) for v in arrays.values()],
+                schema=schema,
+            ))
+
+
+# ===== HTTP =====
+class ApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, db_path: Path, address: tuple[str, int], *, pool_size: int = API_POOL_SIZE) -> None:
+        super().__init__(address, ApiHandler)
+        self.db_path = Path(db_path)
+        self.pool = ReadPool(self.db_path, pool_size)
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.pool.close()
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    server: ApiServer
+    protocol_version = "HTTP/1.1"  # keep-alive and chunked responses
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        parts = [unquote(p) for p in url.path.split("/") if p]
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        self._streaming = False
+        try:
+            if parts == ["devices"]:
+                self._devices()
+            elif len(parts) == 3 and parts[0] == "devices" and parts[2] == "measurements":
+                self._device_measurements(parts[1])
+            elif len(parts) == 2 and parts[0] == "measurements":
+                self._measurement(parts[1])
+            elif len(parts) == 3 and parts[0] == "measurements":
+                self._points(parts[1], parts[2], query.get("format"))
+            else:
+                raise ApiError(HTTPStatus.NOT_FOUND, f"No such resource: {url.path}")
+        except ApiError as e:
+            self._fail(e.status, str(e))
+        except BrokenPipeError:
+            pass  # client went away mid-stream
+        except Exception as e:
+            log.exception("API request failed: %s", self.path)
+            self._fail(HTTPStatus.INTERNAL_SERVER_ERROR, str(e))
+
+    def log_message(self, format: str, *args) -> None:
+        log.info("%s %s", self.address_string(), format % args)
+
+    # ----- conditional requests -----
+    def _not_modified(self, etag: str) -> bool:
+        header = self.headers.get("If-None-Match")
+        if header is None:
+            return False
+        tags = {t.strip().removeprefix("W/") for t in header.split(",")}
+        if "*" not in tags and etag not in tags:
+            return False
+        self.send_response(HTTPStatus.NOT_MODIFIED)
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        return True
+
+    def _start(self, content_type: str, etag: str, *, length: int | None = None) -> None:
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", content_type)
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")  # always revalidate, cheaply
+        if length is None:
+            self.send_header("Transfer-Encoding", "chunked")
+            self._streaming = True
+        else:
+            self.send_header("Content-Length", str(length))
+        self.end_headers()
+
+    def _chunk(self, data: bytes) -> None:
+        if data:
+            self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+
+    def _send_json(self, body, etag: str) -> None:
+        data = json.dumps(body).encode()
+        self._start(FORMATS["json"], etag, length=len(data))
+        self.wfile.write(data)
+
+    def _send_error(self, status: HTTPStatus, message: str) -> None:
+        data = json.dumps({"error": message}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", FORMATS["json"])
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _fail(self, status: HTTPStatus, message: str) -> None:
+        if not self._streaming:
+            self._send_error(status, message)
+            return
+        # Headers and part of the body are out: drop the connection without the
+        # final chunk, so the client sees a truncated response, not a bad body.
+        log.error("API response aborted mid-stream: %s: %s", self.path, message)
+        self.close_connection = True
+
+    def _format(self, requested: str | None) -> str:
+        if requested is not None:
+            if requested not in FORMATS:
+                raise ApiError(HTTPStatus.BAD_REQUEST, f"Unknown format: {requested}")
+            return requested
+        accept = self.headers.get("Accept", "")
+        for fmt, content_type in FORMATS.items():
+            if content_type.split(";")[0] in accept:
+                return fmt
+        return "json"
+
+    # ----- resources -----
+    def _devices(self) -> None:
+        with self.server.pool.connection() as conn:
+            etag = f'"devices-{_scope_version(conn, "devices")}"'
+            if self._not_modified(etag):
+                return
+            rows = conn.execute(
+                """
+                SELECT id, name, structure_json, created_by, created_at
+                FROM devices
+                WHERE is_delete = 0
+                ORDER BY name
+                """
+            ).fetchall()
+        devices = []
+        for device_id, name, structure_json, created_by, created_at in rows:
+            try:
+                structure = json.loads(structure_json) if structure_json else None
+            except json.JSONDecodeError:
+                structure = None
+            devices.append({
+                "id": device_id,
+                "name": name,
+                "structure": structure,
+                "created_by": created_by,
+                "created_at": created_at,
+            })
+        self._send_json(devices, etag)
+
+    def _device_measurements(self, device_name: str) -> None:
+        with self.server.pool.connection() as conn:
+            etag = f'"measurements-{_scope_version(conn, "devices")}.{_scope_version(conn, "measurements")}"'
+            if self._not_modified(etag):
+                return
+            exists = conn.execute(
+                "SELECT 1 FROM devices WHERE name = ? AND is_delete = 0", (device_name,)
+            ).fetchone()
+            if exists is None:
+                raise ApiError(HTTPStatus.NOT_FOUND, f"Device not found: {device_name}")
+            rows = conn.execute(
+                """
+                SELECT m.id, m.name, m.num_order, m.created_by, m.created_at
+                FROM measurements m
+                JOIN devices d ON m.device_id = d.id
+                WHERE d.name = ? AND d.is_delete = 0 AND m.is_delete = 0
+                ORDER BY m.num_order
+                """,
+                (device_name,),
+            ).fetchall()
+        keys = ("id", "name", "num_order", "created_by", "created_at")
+        self._send_json([dict(zip(keys, r)) for r in rows], etag)
+
+    def _measurement(self, measurement_id: str) -> None:
+        db_path = self.server.db_path
+        with self.server.pool.connection() as conn, points_attached(conn, db_path, measurement_id), \
+                read_snapshot(conn):
+            bulk, own = points_version(conn, measurement_id)
+            meta = f'{_scope_version(conn, "devices")}.{_scope_version(conn, "measurements")}'
+            etag = f'"measurement-{meta}.{bulk}.{own}"'
+            if self._not_modified(etag):
+                return
+            body = _measurement_row(conn, measurement_id)
+            body["datasets"] = {
+                kind: conn.execute(
+                    f"SELECT COUNT(*) FROM {kind} WHERE measurement_id = ? AND is_delete = 0",
+                    (measurement_id,),
+                ).fetchone()[0]
+                for kind in DATASET_COLUMNS
+            }
+        self._send_json(body, etag)
+
+    def _points(self, measurement_id: str, kind: str, requested_format: str | None) -> None:
+        if kind not in DATASET_COLUMNS:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"Unknown dataset: {kind}")
+        fmt = self._format(requested_format)
+        # Version, existence and data on one snapshot, so the ETag matches the body.
+        # The connection goes back to the pool before the (possibly slow) send.
+        db_path = self.server.db_path
+        with self.server.pool.connection() as conn, points_attached(conn, db_path, measurement_id), \
+                read_snapshot(conn):
+            bulk, own = points_version(conn, measurement_id)
+            etag = f'"{kind}-{bulk}.{own}-{fmt}"'
+            if self._not_modified(etag):
+                return
+            _measurement_row(conn, measurement_id)
+            arrays = read_dataset_arrays(db_path, measurement_id, kind, conn=conn)
+
+        if fmt == "arrow":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise ApiError(HTTPStatus.NOT_ACCEPTABLE, "Arrow output requires pyarrow") from None
+        self._start(FORMATS[fmt], etag)
+        if fmt == "json":
+            for chunk in json_chunks(measurement_id, kind, arrays):
+                self._chunk(chunk)
+        elif fmt == "csv":
+            for chunk in csv_chunks(arrays):
+                self._chunk(chunk)
+        else:
+            write_arrow(arrays, self._chunk)
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def serve(db_path: Path, host: str = API_HOST, port: int = API_PORT) -> None:
+    """Run the API until interrupted."""
+    server = ApiServer(db_path, (host, port))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
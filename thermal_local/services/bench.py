@@ -0,0 +1,109 @@
+"""
+Micro-benchmarks for the point-data read paths.
+
+`python -m thermal_local.cli bench-readers` compares the DataFrame readers with
+the NumPy array readers on the largest stored dataset, both reading SQLite
+(point cache bypassed), plus the array reader served from the point cache.
+"""
+
+from __future__ import annotations
+
+import time
+import tracemalloc
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import Callable
+
+from thermal_local.db.shards import connect_points, shard_groups
+from thermal_local.services.measurements import (
+    read_cole_cole_arrays,
+    read_cole_cole_from_db,
+    read_nanothickness_arrays,
+    read_nanothickness_from_db,
+    read_standard_plot_arrays,
+    read_standard_plot_from_db,
+)
+
+READERS: dict[str, tuple[Callable, Callable]] = {
+    "cole_cole": (read_cole_cole_from_db, read_cole_cole_arrays),
+    "standard_plot": (read_standard_plot_from_db, read_standard_plot_arrays),
+    "nanothickness": (read_nanothickness_from_db, read_nanothickness_arrays),
+}
+
+
+@dataclass(frozen=True)
+class ReaderBench:
+    reader: str
+    rows: int
+    best_seconds: float
+    peak_bytes: int
+
+
+def _largest_measurement(
+    db_path: Path, table: str, measurement_id: str | None = None
+) -> tuple[str, int] | None:
+    """(measurement_id, live row count) for the given or the largest dataset."""
+    where, params = "is_delete = 0", ()
+    if measurement_id is not None:
+        where, params = "is_delete = 0 AND measurement_id = ?", (measurement_id,)
+    best = None
+    for device_id, _ in shard_groups(db_path, None if measurement_id is None else [measurement_id]).items():
+        conn = connect_points(db_path, device_id)
+        cur = conn.cursor()
+        cur.execute(
+            f"""
+            SELECT measurement_id, COUNT(*) AS n FROM {table}
+            WHERE {where}
+            GROUP BY measurement_id
+            ORDER BY n DESC
+            LIMIT 1
+            """,
+            params,
+        )
+        row = cur.fetchone()
+        conn.close()
+        if row and (best is None or row[1] > best[1]):
+            best = (row[0], row[1])
+    return best
+
+
+def _measure(fn: Callable, db_path: Path, measurement_id: str, repeats: int) -> tuple[float, int]:
+    fn(db_path, measurement_id)  # warm the page cache
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn(db_path, measurement_id)
+        best = min(best, time.perf_counter() - t0)
+
+    tracemalloc.start()
+    try:
+        result = fn(db_path, measurement_id)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return best, peak
+
+
+def bench_readers(
+    db_path: Path,
+    table: str = "standard_plot",
+    *,
+    measurement_id: str | None = None,
+    repeats: int = 5,
+) -> list[ReaderBench]:
+    """Best-of-`repeats` latency and peak Python allocation for both readers of `table`."""
+    largest = _largest_measurement(db_path, table, measurement_id)
+    if largest is None:
+        return []
+    measurement_id, rows = largest
+
+    df_reader, array_reader = READERS[table]
+    results = []
+    for fn in (df_reader, array_reader):
+        best, peak = _measure(partial(fn, cache=False), db_path, measurement_id, repeats)
+        results.append(ReaderBench(fn.__name__, rows, best, peak))
+    best, peak = _measure(array_reader, db_path, measurement_id, repeats)
+    results.append(ReaderBench(f"{array_reader.__name__} (cached)", rows, best, peak))
+    return results
@@ -0,0 +1,228 @@
+"""
+Content-addressed store for raw measurement files (Cole-Cole, standard plot,
+nanothickness CSVs).
+
+Each distinct file content is stored once under `db/blobs/<sha[:2]>/<sha>`
+(gzip-compressed by default) and parsed once; the parsed matrix is kept in
+`raw_blobs.parsed` and reused for every measurement that references the same
+content. `raw_blob_refs` records which measurement's dataset came from which
+file.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import io
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from thermal_local.config import BLOB_COMPRESSION
+from thermal_local.db.connection import writer
+from thermal_local.services.measurements import DATASET_COLUMNS, open_sqlite
+from thermal_local.services.sync import (
+    read_cole_cole_csv,
+    read_nanothickness_csv,
+    read_standard_plot_csv,
+)
+
+CSV_READERS = {
+    "cole_cole": read_cole_cole_csv,
+    "standard_plot": read_standard_plot_csv,
+    "nanothickness": read_nanothickness_csv,
+}
+
+# File-name prefixes used in measurement folders.
+FILE_PATTERNS = {
+    "cole_cole": "CC_*.csv",
+    "standard_plot": "_*.csv",
+    "nanothickness": "nn_*.csv",
+}
+
+
+@dataclass
+class ScanReport:
+    files: int = 0
+    unique_blobs: int = 0
+    bytes_seen: int = 0
+    bytes_stored: int = 0
+    errors: list[tuple[str, str]] = field(default_factory=list)
+
+
+def blob_path(blobs_dir: Path, sha256: str) -> Path:
+    return blobs_dir / sha256[:2] / sha256
+
+
+def _write_blob(blobs_dir: Path, sha256: str, data: bytes) -> tuple[int, str | None]:
+    """Write the blob if it is not stored yet; returns (stored size, compression)."""
+    target = blob_path(blobs_dir, sha256)
+    payload, compression = data, None
+    if BLOB_COMPRESSION == "gzip":
+        packed = gzip.compress(data, mtime=0)
+        if len(packed) < len(data):  # tiny files can grow when compressed
+            payload, compression = packed, "gzip"
+    if not target.exists():
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(payload)
+        os.replace(tmp, target)  # atomic: readers never see a partial blob
+    return len(payload), compression
+
+
+def read_blob(db_path: Path, blobs_dir: Path, sha256: str) -> bytes:
+    conn = open_sqlite(db_path)
+    row = conn.execute("SELECT compression FROM raw_blobs WHERE sha256 = ?", (sha256,)).fetchone()
+    conn.close()
+    if row is None:
+        raise KeyError(sha256)
+    data = blob_path(blobs_dir, sha256).read_bytes()
+    return gzip.decompress(data) if row[0] == "gzip" else data
+
+
+def _parsed_frame(kind: str, n_rows: int, parsed: bytes) -> pd.DataFrame:
+    cols = DATASET_COLUMNS[kind]
+    matrix = np.frombuffer(parsed, dtype=np.float64).reshape(n_rows, len(cols))
+    return pd.DataFrame(matrix.copy(), columns=list(cols))
+
+
+def _cached_sha(db_path: Path, path: Path, st: os.stat_result) -> str | None:
+    conn = open_sqlite(db_path)
+    row = conn.execute(
+        "SELECT sha256 FROM raw_files WHERE path = ? AND size = ? AND mtime_ns = ?",
+        (str(path), st.st_size, st.st_mtime_ns),
+    ).fetchone()
+    conn.close()
+    return row[0] if row else None
+
+
+def _load_parsed(db_path: Path, sha256: str, kind: str) -> pd.DataFrame | None:
+    conn = open_sqlite(db_path)
+    row = conn.execute(
+        "SELECT n_rows, parsed FROM raw_blobs WHERE sha256 = ? AND kind = ? AND parsed IS NOT NULL",
+        (sha256, kind),
+    ).fetchone()
+    conn.close()
+    return _parsed_frame(kind, row[0], row[1]) if row else None
+
+
+def store_raw(
+    db_path: Path,
+    blobs_dir: Path,
+    data: bytes,
+    kind: str,
+    *,
+    path: Path | None = None,
+    st: os.stat_result | None = None,
+) -> tuple[str, pd.DataFrame]:
+    """
+    Store `data` (if new), parse it (if never parsed) and return
+    (sha256, parsed frame). Parse errors raise ValueError like the CSV readers.
+    """
+    sha256 = hashlib.sha256(data).hexdigest()
+    df = _load_parsed(db_path, sha256, kind)
+    if df is None:
+        df = CSV_READERS[kind](io.BytesIO(data))
+        try:
+            matrix = np.ascontiguousarray(df.to_numpy(dtype=np.float64))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Non-numeric values in {kind} CSV: {e}") from e
+        df = pd.DataFrame(matrix, columns=list(DATASET_COLUMNS[kind]))
+        stored_size, compression = _write_blob(blobs_dir, sha256, data)
+        with writer(db_path) as conn:
+            conn.execute(
+                """
+                INSERT OR IGNORE INTO raw_blobs (
+                    sha256, kind, size, stored_size, compression, n_rows, parsed, created_at
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    sha256, kind, len(data), stored_size, compression,
+                    len(matrix), matrix.tobytes(), datetime.utcnow().isoformat(),
+                ),
+            )
+    if path is not None and st is not None:
+        with writer(db_path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO raw_files (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+                (str(path), st.st_size, st.st_mtime_ns, sha256),
+            )
+    return sha256, df
+
+
+def load_raw_csv(db_path: Path, blobs_dir: Path, source, kind: str) -> tuple[pd.DataFrame, str]:
+    """
+    Parse a raw CSV (a path or an uploaded file) through the blob store.
+
+    A file on disk whose size and mtime are unchanged is not even read again;
+    identical content anywhere is parsed only once.
+    """
+    if isinstance(source, (str, Path)):
+        path = Path(source).resolve()
+        st = path.stat()
+        sha256 = _cached_sha(db_path, path, st)
+        if sha256 is not None:
+            df = _load_parsed(db_path, sha256, kind)
+            if df is not None:
+                return df, sha256
+        sha256, df = store_raw(db_path, blobs_dir, path.read_bytes(), kind, path=path, st=st)
+        return df, sha256
+    sha256, df = store_raw(db_path, blobs_dir, source.getvalue(), kind)
+    return df, sha256
+
+
+def add_reference(
+    db_path: Path,
+    measurement_id: str,
+    kind: str,
+    sha256: str,
+    source_name: str | None = None,
+) -> None:
+    """Record that `measurement_id`'s `kind` dataset was imported from blob `sha256`."""
+    with writer(db_path) as conn:
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO raw_blob_refs (measurement_id, kind, sha256, source_name, added_at)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (measurement_id, kind, sha256, source_name, datetime.utcnow().isoformat()),
+        )
+
+
+def blob_references(db_path: Path, sha256: str) -> list[tuple[str, str, str | None]]:
+    """(measurement_id, kind, source_name) for every dataset imported from this blob."""
+    conn = open_sqlite(db_path)
+    rows = conn.execute(
+        "SELECT measurement_id, kind, source_name FROM raw_blob_refs WHERE sha256 = ? ORDER BY added_at",
+        (sha256,),
+    ).fetchall()
+    conn.close()
+    return rows
+
+
+def scan_raw_files(db_path: Path, blobs_dir: Path, devices_root: Path) -> ScanReport:
+    """
+    Register every raw CSV under `devices_root/<device>/<measurement>/` in the
+    store. Each distinct content is stored and parsed once.
+    """
+    report = ScanReport()
+    seen: set[str] = set()
+    for kind, pattern in FILE_PATTERNS.items():
+        for path in sorted(devices_root.glob(f"*/*/{pattern}")):
+            report.files += 1
+            report.bytes_seen += path.stat().st_size
+            try:
+                _, sha256 = load_raw_csv(db_path, blobs_dir, path, kind)
+            except Exception as e:
+                report.errors.append((str(path), str(e)))
+                continue
+            if sha256 not in seen:
+                seen.add(sha256)
+                report.bytes_stored += blob_path(blobs_dir, sha256).stat().st_size
+    report.unique_blobs = len(seen)
+    return report
@@ -0,0 +1,532 @@
+"""
+Concurrent-session load test.
+
+`python -m thermal_local.cli loadtest` runs virtual users against a scratch
+copy of the station database while an import (and, if the server is
+reachable, a sync) writes to it. Each user walks a scripted click path; a
+click calls the same service functions, in the same order, as the UI part it
+reruns (full app, sidebar fragment, main panel or measurement view fragment).
+Users run as threads of one process, like Streamlit sessions on one server,
+and share the point cache.
+
+Reported: p50/p95/p99 latency per click, how long writers waited for the
+SQLite write lock, and the data each session held (peak per session).
+"""
+
+from __future__ import annotations
+
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from thermal_local.config import CHART_MAX_POINTS, TABLE_PAGE_ROWS
+from thermal_local.db.connection import connect, record_lock_waits
+from thermal_local.db.shards import SHARDS_DIR, is_sharded, points_writer, shard_files
+from thermal_local.services.analysis import get_cole_cole_fit, impedance_derived
+from thermal_local.services.measurements import (
+    column_extent,
+    get_all_device_structures,
+    get_data_version,
+    get_device_structure,
+    get_measurement_id,
+    get_measurements_for_devices,
+    get_trace_metrics,
+    has_cole_cole,
+    has_nanothickness,
+    has_standard_plot,
+    is_measurement_owner,
+    list_measurements,
+    read_frequency_band,
+    read_nanothickness_arrays,
+    read_page,
+    read_time_window,
+    replace_dataset,
+    search_devices,
+    seq_span,
+)
+from thermal_local.services.point_cache import POINT_CACHE
+from thermal_local.services.sync import ensure_points_local, sync_server_to_sqlite
+from thermal_local.services.validation import describe_quality, get_dataset_quality
+
+SIDEBAR_PAGE_SIZE = 20
+
+# Scripted click paths; users are assigned paths round-robin and repeat theirs.
+CLICK_PATHS: dict[str, tuple[str, ...]] = {
+    "browse": ("app", "structures", "device", "sidebar_next", "device", "sidebar_prev"),
+    "inspect": ("app", "device", "standard_plot", "zoom", "page", "cole_cole", "zoom", "page", "nanothickness"),
+    "revisit": ("app", "standard_plot", "refresh", "cole_cole", "refresh", "device"),
+}
+
+
+@dataclass
+class _Session:
+    db_path: Path
+    username: str
+    rng: random.Random
+    sidebar_page: int = 0
+    devices: list[tuple[str, str]] = field(default_factory=list)
+    device_names: dict[str, list[str]] = field(default_factory=dict)
+    device: str | None = None
+    measurement: str | None = None
+    view: str | None = None
+    window: tuple[float, float] | None = None
+    page: int = 1
+    # What the session's current page shows, by UI part.
+    shown: dict[str, object] = field(default_factory=dict)
+    peak_bytes: int = 0
+
+
+@dataclass(frozen=True)
+class Percentiles:
+    count: int
+    p50: float
+    p95: float
+    p99: float
+    max: float
+
+
+@dataclass(frozen=True)
+class ClickStats:
+    click: str
+    latency: Percentiles
+    errors: int
+
+
+@dataclass(frozen=True)
+class BackgroundJob:
+    name: str
+    runs: int
+    error: str | None
+
+
+@dataclass
+class LoadTestReport:
+    users: int
+    seconds: float
+    clicks: list[ClickStats]
+    overall: Percentiles
+    lock_waits: Percentiles
+    session_peak_bytes: list[int]
+    point_cache_bytes: int
+    jobs: list[BackgroundJob]
+    errors: list[str]
+
+
+def _percentiles(samples: list[float]) -> Percentiles:
+    if not samples:
+        return Percentiles(0, 0.0, 0.0, 0.0, 0.0)
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return Percentiles(len(samples), float(p50), float(p95), float(p99), max(samples))
+
+
+def _nbytes(value) -> int:
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(_nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_nbytes(v) for v in value)
+    return 0
+
+
+# ===== UI PARTS =====
+# Each mirrors the service calls of one part of thermal_local.ui.app.
+_structures_cache: dict[tuple[str, int], pd.DataFrame] = {}
+_structures_guard = threading.Lock()
+
+
+def _sidebar(s: _Session) -> None:
+    devices, total = search_devices(
+        s.db_path, "", offset=s.sidebar_page * SIDEBAR_PAGE_SIZE, limit=SIDEBAR_PAGE_SIZE
+    )
+    n_pages = max(1, -(-total // SIDEBAR_PAGE_SIZE))
+    if s.sidebar_page >= n_pages:
+        s.sidebar_page = n_pages - 1
+        devices, total = search_devices(
+            s.db_path, "", offset=s.sidebar_page * SIDEBAR_PAGE_SIZE, limit=SIDEBAR_PAGE_SIZE
+        )
+    names = get_measurements_for_devices(s.db_path, [d_id for d_id, _ in devices])
+    s.devices = devices
+    s.device_names = {name: names[d_id] for d_id, name in devices}
+    s.shown["sidebar"] = get_trace_metrics(s.db_path, [name for _, name in devices])
+
+
+def _structures_panel(s: _Session) -> None:
+    # Shared across sessions like the UI's st.cache_data entry.
+    key = (str(s.db_path), get_data_version(s.db_path, "devices"))
+    with _structures_guard:
+        df = _structures_cache.get(key)
+    if df is None:
+        df = get_all_device_structures(s.db_path)
+        with _structures_guard:
+            _structures_cache.clear()
+            _structures_cache[key] = df
+    s.shown["main"] = df.iloc[:50]
+
+
+def _device_panel(s: _Session) -> None:
+    get_device_structure(s.db_path, s.device)
+    s.shown["main"] = [
+        get_trace_metrics(s.db_path, [s.device]),
+        list_measurements(s.db_path, s.device),
+    ]
+
+
+def _quality(s: _Session, measurement_id: str, kind: str) -> None:
+    stored = get_dataset_quality(s.db_path, measurement_id, kind)
+    if stored:
+        describe_quality(stored[0])
+
+
+def _table_page(s: _Session, measurement_id: str, table: str) -> pd.DataFrame:
+    first, last = seq_span(s.db_path, measurement_id, table)
+    n_pages = max(1, -(-(last - first + 1) // TABLE_PAGE_ROWS))
+    s.page = min(s.page, n_pages)
+    offset = (s.page - 1) * TABLE_PAGE_ROWS
+    return pd.DataFrame(read_page(s.db_path, measurement_id, table, offset, TABLE_PAGE_ROWS))
+
+
+def _range(s: _Session, extent: tuple[float, float] | None) -> tuple[float, float]:
+    if extent is None:
+        return -np.inf, np.inf
+    if s.window is None:
+        return extent
+    return s.window
+
+
+def _measurement_view(s: _Session) -> None:
+    measurement_id = get_measurement_id(s.db_path, s.device, s.measurement)
+    try:
+        ensure_points_local(s.db_path, measurement_id)
+    except Exception:
+        pass  # the UI shows a warning and renders what is local
+    is_measurement_owner(s.db_path, measurement_id, s.username)
+    shown: list = []
+    if s.view == "standard_plot" and has_standard_plot(s.db_path, measurement_id):
+        _quality(s, measurement_id, "standard_plot")
+        extent = column_extent(s.db_path, measurement_id, "standard_plot", "time")
+        t0, t1 = _range(s, extent)
+        shown.append(pd.DataFrame(read_time_window(
+            s.db_path, measurement_id, t0, t1, max_points=CHART_MAX_POINTS
+        )))
+        shown.append(_table_page(s, measurement_id, "standard_plot"))
+        s.shown["extent"] = extent
+    elif s.view == "cole_cole" and has_cole_cole(s.db_path, measurement_id):
+        _quality(s, measurement_id, "cole_cole")
+        extent = column_extent(s.db_path, measurement_id, "cole_cole", "frequency")
+        f_lo, f_hi = _range(s, extent)
+        shown.append(pd.DataFrame(read_frequency_band(
+            s.db_path, measurement_id, f_lo, f_hi, max_points=CHART_MAX_POINTS
+        )))
+        shown.append(impedance_derived(_table_page(s, measurement_id, "cole_cole")))
+        get_cole_cole_fit(s.db_path, measurement_id)
+        s.shown["extent"] = extent
+    elif s.view == "nanothickness":
+        shown.append(pd.DataFrame(read_nanothickness_arrays(s.db_path, measurement_id)))
+        has_nanothickness(s.db_path, measurement_id)
+    s.shown["measurement"] = shown
+
+
+def _main_panel(s: _Session) -> None:
+    if s.device is None:
+        _structures_panel(s)
+        return
+    s.shown.pop("measurement", None)
+    _device_panel(s)
+    if s.measurement is not None and s.view is not None:
+        _measurement_view(s)
+
+
+# ===== CLICKS =====
+def _pick_device(s: _Session) -> bool:
+    if not s.devices:
+        _sidebar(s)
+    if not s.devices:
+        return False
+    s.device = s.rng.choice(s.devices)[1]
+    s.measurement = s.view = None
+    return True
+
+
+def _open_view(s: _Session, view: str) -> None:
+    if s.device is None and not _pick_device(s):
+        return
+    names = s.device_names.get(s.device) or []
+    if not names:
+        _main_panel(s)
+        return
+    s.measurement = s.rng.choice(names)
+    s.view = view
+    s.window = None
+    s.page = 1
+    _main_panel(s)
+
+
+def _click_app(s: _Session) -> None:
+    _main_panel(s)
+    _sidebar(s)
+
+
+def _click_structures(s: _Session) -> None:
+    s.device = s.measurement = s.view = None
+    _main_panel(s)
+
+
+def _click_device(s: _Session) -> None:
+    if _pick_device(s):
+        _main_panel(s)
+
+
+def _turn_page(s: _Session, delta: int) -> None:
+    s.sidebar_page = max(0, s.sidebar_page + delta)
+    _sidebar(s)
+
+
+def _click_zoom(s: _Session) -> None:
+    # Narrow the current range slider to a random half of the full extent.
+    if s.view is None:
+        return
+    extent = s.shown.get("extent")
+    if extent is not None and extent[1] > extent[0]:
+        lo, hi = extent
+        if s.view == "cole_cole" and lo > 0:
+            a, b = np.log10(lo), np.log10(hi)
+            start = s.rng.uniform(a, (a + b) / 2)
+            s.window = (10 ** start, 10 ** (start + (b - a) / 2))
+        else:
+            start = s.rng.uniform(lo, (lo + hi) / 2)
+            s.window = (start, start + (hi - lo) / 2)
+    _measurement_view(s)
+
+
+def _click_page(s: _Session) -> None:
+    if s.view is None:
+        return
+    s.page = s.rng.randint(1, 20)
+    _measurement_view(s)
+
+
+def _click_refresh(s: _Session) -> None:
+    if s.view is not None:
+        _measurement_view(s)
+
+
+CLICKS: dict[str, Callable[[_Session], None]] = {
+    "app": _click_app,
+    "structures": _click_structures,
+    "device": _click_device,
+    "sidebar_next": lambda s: _turn_page(s, 1),
+    "sidebar_prev": lambda s: _turn_page(s, -1),
+    "standard_plot": lambda s: _open_view(s, "standard_plot"),
+    "cole_cole": lambda s: _open_view(s, "cole_cole"),
+    "nanothickness": lambda s: _open_view(s, "nanothickness"),
+    "zoom": _click_zoom,
+    "page": _click_page,
+    "refresh": _click_refresh,
+}
+
+
+def _run_user(
+    s: _Session,
+    path: tuple[str, ...],
+    iterations: int,
+    think_s: float,
+    samples: list[tuple[str, float, str | None]],
+) -> None:
+    for _ in range(iterations):
+        for click in path:
+            if think_s:
+                time.sleep(s.rng.uniform(0, think_s))
+            error = None
+            t0 = time.perf_counter()
+            try:
+                CLICKS[click](s)
+            except Exception as e:
+                error = f"{click}: {e!r}"
+            samples.append((click, time.perf_counter() - t0, error))
+            s.peak_bytes = max(s.peak_bytes, _nbytes(list(s.shown.values())))
+
+
+# ===== BACKGROUND WRITERS =====
+def _create_scratch(conn: sqlite3.Connection, device_id: str, measurement_id: str) -> None:
+    now = datetime.now(timezone.utc).isoformat()
+    conn.execute(
+        "INSERT OR IGNORE INTO devices (id, name, created_at) VALUES (?, ?, ?)",
+        (device_id, f"loadtest-{device_id[:8]}", now),
+    )
+    conn.execute(
+        """
+        INSERT OR IGNORE INTO measurements (id, device_id, name, num_order, created_by, created_at)
+        VALUES (?, ?, 'import', 1, 'loadtest', ?)
+        """,
+        (measurement_id, device_id, now),
+    )
+
+
+def _import_loop(db_path: Path, rows: int, interval_s: float, stop: threading.Event) -> int:
+    """
+    Replace a scratch measurement's Standard Plot over and over, like repeated imports.
+
+    The scratch device and measurement exist only locally, so a server sync
+    removes them (and drops the device's shard); every run re-creates them in
+    its own transaction.
+    """
+    device_id, measurement_id = str(uuid.uuid4()), str(uuid.uuid4())
+    conn = connect(db_path)
+    device = device_id if is_sharded(conn) else None
+    conn.close()
+    t = np.linspace(0.0, 100.0, rows)
+    runs = 0
+    while not stop.is_set():
+        noise = np.random.default_rng(runs).normal(0.0, 1e-3, rows)
+        values = np.column_stack([t, 1 - np.exp(-t / 10) + noise])
+        # Soft-deletes the previous run's rows, so live points stay at `rows`.
+        with points_writer(db_path, device) as conn:
+            _create_scratch(conn, device_id, measurement_id)
+            replace_dataset(conn.cursor(), measurement_id, "standard_plot", values)
+        runs += 1
+        stop.wait(interval_s)
+    return runs
+
+
+def _sync_loop(db_path: Path, interval_s: float, stop: threading.Event) -> int:
+    runs = 0
+    while not stop.is_set():
+        sync_server_to_sqlite(db_path)
+        runs += 1
+        stop.wait(interval_s)
+    return runs
+
+
+def _job(name: str, fn: Callable[[], int], results: list[BackgroundJob]) -> threading.Thread:
+    def target() -> None:
+        runs, error = 0, None
+        try:
+            runs = fn()
+        except Exception as e:
+            error = repr(e)
+        results.append(BackgroundJob(name, runs, error))
+
+    thread = threading.Thread(target=target, name=f"loadtest-{name}", daemon=True)
+    thread.start()
+    return thread
+
+
+# ===== RUN =====
+def _backup(src: Path, dst: Path) -> None:
+    source = connect(src, readonly=True)
+    target = sqlite3.connect(dst)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+def copy_database(db_path: Path, dest_dir: Path) -> Path:
+    """Consistent copy of the database (and its shards) into `dest_dir`; returns the new db path."""
+    dest = Path(dest_dir) / Path(db_path).name
+    _backup(db_path, dest)
+    shards = shard_files(db_path)
+    if shards:
+        (dest.parent / SHARDS_DIR).mkdir(exist_ok=True)
+    for path in shards.values():
+        _backup(path, dest.parent / SHARDS_DIR / path.name)
+    return dest
+
+
+def run_load_test(
+    db_path: Path,
+    *,
+    users: int = 20,
+    iterations: int = 3,
+    paths: list[str] | None = None,
+    think_s: float = 0.5,
+    import_rows: int | None = 20_000,
+    import_interval_s: float = 1.0,
+    sync: bool = True,
+    sync_interval_s: float = 5.0,
+    seed: int = 0,
+) -> LoadTestReport:
+    """
+    Run `users` virtual users, each walking one of `paths` (CLICK_PATHS names,
+    assigned round-robin) `iterations` times with up to `think_s` seconds
+    between clicks. The import (None to skip) and the sync run until the last
+    user finishes. Works on a scratch copy; the station database is only read.
+    """
+    paths = paths or list(CLICK_PATHS)
+    unknown = [p for p in paths if p not in CLICK_PATHS]
+    if unknown:
+        raise ValueError(f"Unknown click path(s): {', '.join(unknown)}")
+
+    scratch = Path(tempfile.mkdtemp(prefix="thermal-loadtest-"))
+    try:
+        scratch_db = copy_database(db_path, scratch)
+        POINT_CACHE.invalidate()  # start cold, as after a server restart
+
+        stop = threading.Event()
+        jobs: list[BackgroundJob] = []
+        threads = []
+        samples: list[tuple[str, float, str | None]] = []
+        sessions = [
+            _Session(scratch_db, f"user{i}", random.Random(seed + i)) for i in range(users)
+        ]
+        with record_lock_waits() as lock_waits:
+            if import_rows:
+                threads.append(_job(
+                    "import", lambda: _import_loop(scratch_db, import_rows, import_interval_s, stop), jobs
+                ))
+            if sync:
+                threads.append(_job("sync", lambda: _sync_loop(scratch_db, sync_interval_s, stop), jobs))
+            t0 = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=users, thread_name_prefix="vuser") as pool:
+                futures = [
+                    pool.submit(_run_user, s, CLICK_PATHS[paths[i % len(paths)]], iterations, think_s, samples)
+                    for i, s in enumerate(sessions)
+                ]
+                for f in futures:
+                    f.result()
+            seconds = time.perf_counter() - t0
+            stop.set()
+            for thread in threads:
+                thread.join()
+            waits = list(lock_waits)
+        cache_bytes = POINT_CACHE.stats().bytes
+        POINT_CACHE.invalidate()
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    by_click: dict[str, list[float]] = {}
+    errors_by_click: dict[str, int] = {}
+    for click, elapsed, error in samples:
+        by_click.setdefault(click, []).append(elapsed)
+        if error:
+            errors_by_click[click] = errors_by_click.get(click, 0) + 1
+    return LoadTestReport(
+        users=users,
+        seconds=seconds,
+        clicks=[
+            ClickStats(click, _percentiles(values), errors_by_click.get(click, 0))
+            for click, values in sorted(by_click.items())
+        ],
+        overall=_percentiles([elapsed for _, elapsed, _ in samples]),
+        lock_waits=_percentiles(waits),
+        session_peak_bytes=[s.peak_bytes for s in sessions],
+        point_cache_bytes=cache_bytes,
+        jobs=sorted(jobs, key=lambda j: j.name),
+        errors=[error for _, _, error in samples if error],
+    )
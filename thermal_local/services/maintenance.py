@@ -0,0 +1,245 @@
+"""
+Maintenance job: archive and purge soft-deleted data, then compact the database.
+
+Measurements soft-deleted longer ago than the retention window, their point
+rows, and soft-deleted point rows of live measurements are copied into an
+archive SQLite file and hard-deleted locally. Purged measurements leave a
+tombstone in `purged_measurements`, and server pulls skip them and archived
+point rows (see thermal_local.services.sync), so they stay gone. Afterwards the file is compacted with an
+incremental VACUUM and statistics are refreshed with ANALYZE. In the sharded
+layout (thermal_local.db.shards) every shard is archived and compacted too.
+
+Run from cron (`python -m thermal_local.cli maintenance`) or let the app start it
+in the background when the last run is older than MAINTENANCE_INTERVAL_HOURS.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from thermal_local.config import MAINTENANCE_INTERVAL_HOURS, MAINTENANCE_RETENTION_DAYS, SHARD_WORKERS
+from thermal_local.db.connection import exclusive, writer
+from thermal_local.db.shards import is_sharded, shard_files
+from thermal_local.services.measurements import DATASET_COLUMNS, open_sqlite
+from thermal_local.services.sync import stamp_deleted_at
+
+# Derived per-measurement tables that are simply dropped with the measurement.
+_DERIVED_TABLES = ("cole_cole_fits", "standard_plot_metrics", "local_points", "dataset_quality")
+
+_AUTO_VACUUM_INCREMENTAL = 2
+
+_scheduled_lock = threading.Lock()
+
+
+@dataclass
+class MaintenanceReport:
+    measurements_purged: int = 0
+    rows_archived: dict[str, int] = field(default_factory=dict)
+    bytes_before: int = 0
+    bytes_after: int = 0
+    converted_to_incremental: bool = False
+
+    @property
+    def bytes_reclaimed(self) -> int:
+        return self.bytes_before - self.bytes_after
+
+
+def _file_bytes(db_path: Path) -> int:
+    """Size of the database with its WAL, plus its shards in the sharded layout."""
+    return sum(
+        p.stat().st_size
+        for f in (db_path, *shard_files(db_path).values())
+        for p in (f, f.with_name(f.name + "-wal"))
+        if p.exists()
+    )
+
+
+def _ensure_archive_table(cur: sqlite3.Cursor, table: str) -> list[str]:
+    """Create/extend archive.<table> to mirror main.<table>; returns the shared columns."""
+    cur.execute(f"PRAGMA main.table_info({table})")
+    columns = [(r[1], r[2]) for r in cur.fetchall()]
+    cur.execute(
+        f"CREATE TABLE IF NOT EXISTS archive.{table} "
+        f"({', '.join(f'{name} {ctype}' for name, ctype in columns)}, archived_at TEXT)"
+    )
+    cur.execute(f"PRAGMA archive.table_info({table})")
+    existing = {r[1] for r in cur.fetchall()}
+    for name, ctype in columns:
+        if name not in existing:
+            cur.execute(f"ALTER TABLE archive.{table} ADD COLUMN {name} {ctype}")
+    return [name for name, _ in columns]
+
+
+def _archive_points(cur: sqlite3.Cursor, archived_at: str, report: MaintenanceReport) -> None:
+    """
+    Move the points of temp.purge_ids, and soft-deleted point rows of live
+    measurements, from main.* to archive.*. Points of measurements in
+    temp.deleted_ids that are still within retention stay, so they can be restored.
+    """
+    where = (
+        "(is_delete = 1 AND measurement_id NOT IN (SELECT id FROM deleted_ids)) "
+        "OR measurement_id IN (SELECT id FROM purge_ids)"
+    )
+    for table in DATASET_COLUMNS:
+        columns = ", ".join(_ensure_archive_table(cur, table))
+        cur.execute(
+            f"INSERT INTO archive.{table} ({columns}, archived_at) "
+            f"SELECT {columns}, ? FROM main.{table} WHERE {where}",
+            (archived_at,),
+        )
+        report.rows_archived[table] = report.rows_archived.get(table, 0) + cur.rowcount
+        cur.execute(f"DELETE FROM main.{table} WHERE {where}")
+
+
+def archive_soft_deleted(
+    db_path: Path,
+    archive_path: Path,
+    *,
+    retention_days: int = MAINTENANCE_RETENTION_DAYS,
+) -> MaintenanceReport:
+    report = MaintenanceReport()
+    cutoff = (datetime.utcnow() - timedelta(days=retention_days)).isoformat()
+    archived_at = datetime.utcnow().isoformat()
+
+    purge_sql = "SELECT id FROM measurements WHERE is_delete = 1 AND deleted_at < ?"
+    # Deletions without a time get one now: retention never counts from created_at.
+    with writer(db_path) as conn:
+        stamp_deleted_at(conn.cursor())
+    conn = open_sqlite(db_path)
+    sharded = is_sharded(conn)
+    purge_ids = [r[0] for r in conn.execute(purge_sql, (cutoff,))] if sharded else []
+    deleted_ids = [r[0] for r in conn.execute("SELECT id FROM measurements WHERE is_delete = 1")] if sharded else []
+    conn.close()
+
+    # Points first (children), then the measurements themselves. In the sharded
+    # layout each shard is archived in its own transaction before the catalog.
+    if sharded:
+        for path in shard_files(db_path).values():
+            with writer(path, attach={"archive": archive_path}) as conn:
+                cur = conn.cursor()
+                cur.execute("CREATE TEMP TABLE purge_ids (id TEXT PRIMARY KEY)")
+                cur.executemany("INSERT INTO purge_ids (id) VALUES (?)", [(mid,) for mid in purge_ids])
+                cur.execute("CREATE TEMP TABLE deleted_ids (id TEXT PRIMARY KEY)")
+                cur.executemany("INSERT INTO deleted_ids (id) VALUES (?)", [(mid,) for mid in deleted_ids])
+                _archive_points(cur, archived_at, report)
+                cur.execute("DROP TABLE purge_ids")
+                cur.execute("DROP TABLE deleted_ids")
+
+    with writer(db_path, attach={"archive": archive_path}) as conn:
+        cur = conn.cursor()
+        if sharded:
+            cur.execute("CREATE TEMP TABLE purge_ids (id TEXT PRIMARY KEY)")
+            cur.executemany("INSERT INTO purge_ids (id) VALUES (?)", [(mid,) for mid in purge_ids])
+        else:
+            cur.execute(f"CREATE TEMP TABLE purge_ids AS {purge_sql}", (cutoff,))
+        cur.execute("SELECT COUNT(*) FROM purge_ids")
+        report.measurements_purged = cur.fetchone()[0]
+        if not sharded:
+            cur.execute("CREATE TEMP TABLE deleted_ids AS SELECT id FROM measurements WHERE is_delete = 1")
+            _archive_points(cur, archived_at, report)
+            cur.execute("DROP TABLE deleted_ids")
+
+        columns = ", ".join(_ensure_archive_table(cur, "measurements"))
+        cur.execute(
+            f"INSERT INTO archive.measurements ({columns}, archived_at) "
+            f"SELECT {columns}, ? FROM main.measurements WHERE id IN (SELECT id FROM purge_ids)",
+            (archived_at,),
+        )
+        report.rows_archived["measurements"] = cur.rowcount
+        cur.execute("DELETE FROM main.measurements WHERE id IN (SELECT id FROM purge_ids)")
+        cur.execute(
+            "INSERT OR IGNORE INTO main.purged_measurements (measurement_id, purged_at) SELECT id, ? FROM purge_ids",
+            (archived_at,),
+        )
+
+        for table in _DERIVED_TABLES:
+            cur.execute(f"DELETE FROM main.{table} WHERE measurement_id IN (SELECT id FROM purge_ids)")
+        cur.execute("DROP TABLE purge_ids")
+    return report
+
+
+def compact(db_path: Path) -> bool:
+    """
+    Incremental VACUUM + ANALYZE. The first run on a file created without
+    auto_vacuum converts it with one full VACUUM; returns True in that case.
+    """
+    converted = False
+    with exclusive(db_path) as conn:
+        mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        if mode != _AUTO_VACUUM_INCREMENTAL:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            converted = True
+        else:
+            # Frees one page per step; executescript steps it to completion
+            # (execute() stops after the first page).
+            conn.executescript("PRAGMA incremental_vacuum;")
+        conn.execute("ANALYZE")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return converted
+
+
+def run_maintenance(
+    db_path: Path,
+    archive_path: Path,
+    *,
+    retention_days: int = MAINTENANCE_RETENTION_DAYS,
+    vacuum: bool = True,
+) -> MaintenanceReport:
+    started_at = datetime.utcnow().isoformat()
+    bytes_before = _file_bytes(db_path)
+
+    report = archive_soft_deleted(db_path, archive_path, retention_days=retention_days)
+    if vacuum:
+        # Shards are independent files with their own locks: compacted in parallel.
+        files = [db_path, *shard_files(db_path).values()]
+        with ThreadPoolExecutor(max_workers=SHARD_WORKERS, thread_name_prefix="compact") as pool:
+            report.converted_to_incremental = any(pool.map(compact, files))
+    report.bytes_before = bytes_before
+    report.bytes_after = _file_bytes(db_path)
+
+    with writer(db_path) as conn:
+        conn.execute(
+            "INSERT INTO maintenance_runs (started_at, finished_at, report_json) VALUES (?, ?, ?)",
+            (started_at, datetime.utcnow().isoformat(), json.dumps(asdict(report))),
+        )
+    return report
+
+
+def last_run_at(db_path: Path) -> datetime | None:
+    conn = open_sqlite(db_path)
+    row = conn.execute("SELECT MAX(finished_at) FROM maintenance_runs").fetchone()
+    conn.close()
+    return datetime.fromisoformat(row[0]) if row and row[0] else None
+
+
+def start_scheduled_maintenance(db_path: Path, archive_path: Path) -> bool:
+    """
+    Start maintenance in a background thread if the last run is older than
+    MAINTENANCE_INTERVAL_HOURS. Returns True if a run was started.
+    """
+    if not _scheduled_lock.acquire(blocking=False):
+        return False  # already running in this process
+    try:
+        last = last_run_at(db_path)
+        if last and datetime.utcnow() - last < timedelta(hours=MAINTENANCE_INTERVAL_HOURS):
+            _scheduled_lock.release()
+            return False
+    except Exception:
+        _scheduled_lock.release()
+        raise
+
+    def _run() -> None:
+        try:
+            run_maintenance(db_path, archive_path)
+        finally:
+            _scheduled_lock.release()
+
+    threading.Thread(target=_run, name="maintenance", daemon=True).start()
+    return True
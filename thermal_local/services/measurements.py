@@ -1,15 +1,25 @@
 from __future__ import annotations
 
 import json
+import os
+import re
 import sqlite3
 import uuid
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 
 from thermal_local.config import SERVER_DB_CONFIG
+from thermal_local.db.arrays import fetch_float_matrix, float_columns_sql, read_snapshot, split_columns
+from thermal_local.db.connection import connect, writer
+from thermal_local.db.points import DATASET_COLUMNS, append_points_sql
+from thermal_local.db.shards import is_sharded, open_points, points_writer, shard_groups, shard_of
+from thermal_local.services.point_cache import POINT_CACHE, invalidate_points, points_version
+from thermal_local.services.trace_metrics import METRIC_COLUMNS, store_trace_metrics
+from thermal_local.services.validation import store_quality, validate_dataset
 
 
 @dataclass(frozen=True)
@@ -19,9 +29,7 @@ class LocalContext:
 
 
 def open_sqlite(db_path: Path) -> sqlite3.Connection:
-    conn = sqlite3.connect(db_path)
-    conn.execute("PRAGMA foreign_keys = ON")
-    return conn
+    return connect(db_path)
 
 
 def get_devices_and_measurements(db_path: Path) -> dict[str, list[str]]:
@@ -45,6 +53,100 @@ def get_devices_and_measurements(db_path: Path) -> dict[str, list[str]]:
     return data
 
 
+def _fts_prefix_query(text: str) -> str | None:
+    # Type-ahead: every typed token must prefix-match a device or measurement name token.
+    tokens = re.findall(r"\w+", text)
+    if not tokens:
+        return None
+    return " AND ".join(f'"{t}"*' for t in tokens)
+
+
+def search_devices(
+    db_path: Path,
+    query: str = "",
+    *,
+    offset: int = 0,
+    limit: int = 20,
+) -> tuple[list[tuple[str, str]], int]:
+    """
+    One page of (device_id, device_name), ordered by name, plus the total match count.
+
+    A non-empty query is matched against device and measurement names through
+    the `catalog_fts` index; only the requested slice is read.
+    """
+    match = _fts_prefix_query(query)
+    conn = open_sqlite(db_path)
+    cur = conn.cursor()
+    if match is None:
+        cur.execute("SELECT COUNT(*) FROM devices WHERE is_delete = 0")
+        total = cur.fetchone()[0]
+        cur.execute(
+            """
+            SELECT id, name FROM devices
+            WHERE is_delete = 0
+            ORDER BY name
+            LIMIT ? OFFSET ?
+            """,
+            (limit, offset),
+        )
+    else:
+        matched = """
+            FROM catalog_fts f
+            JOIN devices d ON d.rowid = f.rowid
+            WHERE catalog_fts MATCH ? AND d.is_delete = 0
+        """
+        cur.execute(f"SELECT COUNT(*) {matched}", (match,))
+        total = cur.fetchone()[0]
+        cur.execute(
+            f"SELECT d.id, d.name {matched} ORDER BY d.name LIMIT ? OFFSET ?",
+            (match, limit, offset),
+        )
+    rows = cur.fetchall()
+    conn.close()
+    return rows, total
+
+
+def get_measurements_for_devices(db_path: Path, device_ids: list[str]) -> dict[str, list[str]]:
+    """Live measurement names per device, for the given devices only."""
+    data: dict[str, list[str]] = {d: [] for d in device_ids}
+    if not device_ids:
+        return data
+    conn = open_sqlite(db_path)
+    cur = conn.cursor()
+    cur.execute(
+        f"""
+        SELECT device_id, name
+        FROM measurements
+        WHERE device_id IN ({','.join('?' * len(device_ids))}) AND is_delete = 0
+        ORDER BY created_at
+        """,
+        device_ids,
+    )
+    for device_id, name in cur.fetchall():
+        if name:
+            data[device_id].append(name)
+    conn.close()
+    return data
+
+
+def list_measurements(db_path: Path, device_name: str) -> pd.DataFrame:
+    """Live measurements of one device (id, name, created_by, created_at), oldest first."""
+    conn = open_sqlite(db_path)
+    df = pd.read_sql_query(
+        """
+        SELECT m.id, m.name, m.created_by, m.created_at
+        FROM measurements m
+        JOIN devices d ON d.id = m.device_id
+        WHERE d.name = ? AND m.is_delete = 0
+        ORDER BY m.created_at
+        """,
+        conn,
+        params=(device_name,),
+    )
+    conn.close()
+    return df
+
+
 def get_device_id(db_path: Path, device_name: str) -> str:
     conn = open_sqlite(db_path)
     cur = conn.cursor()
@@ -96,6 +198,91 @@ def get_device_structure(db_path: Path, device_name: str):
         return {"_error": "Invalid JSON in structure_json"}
 
 
+def get_data_version(db_path: Path, scope: str) -> int:
+    conn = open_sqlite(db_path)
+    cur = conn.cursor()
+    cur.execute("SELECT version FROM data_versions WHERE scope = ?", (scope,))
+    row = cur.fetchone()
+    conn.close()
+    return row[0] if row else 0
+
+
+def get_all_device_structures(db_path: Path) -> pd.DataFrame:
+    """
+    All device structures as one flat DataFrame (one row per device), built in a
+    single pass with `pd.json_normalize`. Nested keys become dotted columns.
+    Devices whose JSON is invalid or not an object get an `_error` value.
+    """
+    conn = open_sqlite(db_path)
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT name, structure_json
+        FROM devices
+        WHERE structure_json IS NOT NULL AND is_delete = 0
+        ORDER BY name
+        """
+    )
+    rows = cur.fetchall()
+    conn.close()
+
+    records = []
+    for _, structure_json in rows:
+        try:
+            structure = json.loads(structure_json)
+        except json.JSONDecodeError:
+            structure = {"_error": "Invalid JSON in structure_json"}
+        if not isinstance(structure, dict):
+            structure = {"_error": "Structure must be a JSON object"}
+        records.append(structure)
+
+    df = pd.json_normalize(records)
+    df.insert(0, "device", [name for name, _ in rows])
+    return df
+
+
+def find_devices_by_structure(db_path: Path, criteria: dict[str, object]) -> list[str]:
+    """
+    Names of live devices whose structure matches every criterion, via the
+    indexed `device_structure_fields` table (no JSON is parsed).
+
+    Keys are JSON paths such as "material" or "layers[0].thickness". Values match
+    as: str -> case-insensitive text, int/float -> numeric (so "20nm" matches 20),
+    (lo, hi) tuple -> inclusive numeric range (either bound may be None).
+    """
+    clauses = []
+    params: list = []
+    for key, value in criteria.items():
+        if isinstance(value, tuple):
+            lo, hi = value
+            cond = "value_num BETWEEN ? AND ?"
+            params += [key, float("-inf") if lo is None else lo, float("inf") if hi is None else hi]
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            cond = "value_num = ?"
+            params += [key, value]
+        else:
+            cond = "value_text = ?"
+            params += [key, str(value)]
+        clauses.append(f"SELECT device_id FROM device_structure_fields WHERE key = ? AND {cond}")
+
+    conn = open_sqlite(db_path)
+    cur = conn.cursor()
+    if clauses:
+        cur.execute(
+            f"""
+            SELECT name FROM devices
+            WHERE is_delete = 0 AND id IN ({' INTERSECT '.join(clauses)})
+            ORDER BY name
+            """,
+            params,
+        )
+    else:
+        cur.execute("SELECT name FROM devices WHERE is_delete = 0 ORDER BY name")
+    names = [r[0] for r in cur.fetchall()]
+    conn.close()
+    return names
+
+
 def create_measurement(
     ctx: LocalContext,
     *,
@@ -105,66 +292,134 @@ def create_measurement(
     created_by: str,
 ) -> None:
     measurement_name = measurement_name.strip()
-    conn = open_sqlite(ctx.db_path)
-    cur = conn.cursor()
-
-    cur.execute(
-        """
-        SELECT 1 FROM measurements
-        WHERE device_id = ? AND name = ? AND is_delete = 0
-        """,
-        (device_id, measurement_name),
-    )
-    if cur.fetchone():
-        conn.close()
-        raise ValueError("Measurement name already exists for this device")
+    with writer(ctx.db_path) as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT 1 FROM measurements
+            WHERE device_id = ? AND name = ? AND is_delete = 0
+            """,
+            (device_id, measurement_name),
+        )
+        if cur.fetchone():
+            raise ValueError("Measurement name already exists for this device")
 
-    m_id = str(uuid.uuid4())
-    cur.execute(
-        """
-        INSERT INTO measurements (id, device_id, name, created_by, created_at)
-        VALUES (?, ?, ?, ?, ?)
-        """,
-        (m_id, device_id, measurement_name, created_by, datetime.utcnow().isoformat()),
-    )
-    conn.commit()
-    conn.close()
+        m_id = str(uuid.uuid4())
+        cur.execute(
+            """
+            INSERT INTO measurements (id, device_id, name, created_by, created_at)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (m_id, device_id, measurement_name, created_by, datetime.utcnow().isoformat()),
+        )
+        # Created here, so its (still empty) point data is local by definition.
+        cur.execute(
+            "INSERT OR REPLACE INTO local_points (measurement_id, fetched_at) VALUES (?, ?)",
+            (m_id, datetime.utcnow().isoformat()),
+        )
 
     # create folder on filesystem
     path = ctx.data_root / "devices" / device_name / measurement_name
     path.mkdir(parents=True, exist_ok=True)
 
 
-def sync_db_to_filesystem(ctx: LocalContext) -> None:
+@dataclass
+class FsSyncReport:
+    created: list[str] = field(default_factory=list)
+    renamed: list[tuple[str, str]] = field(default_factory=list)
+    orphaned: list[str] = field(default_factory=list)
+
+
+def sync_db_to_filesystem(ctx: LocalContext) -> FsSyncReport:
+    """
+    Bring root/devices in line with the DB, touching only folders that changed.
+
+    Folders already created are recorded in `fs_materialized`, so unchanged
+    devices/measurements cost no filesystem calls. New ones are created,
+    renamed ones are moved, and folders whose device/measurement was deleted
+    are reported as orphaned (never removed).
+    """
     base = ctx.data_root / "devices"
-    base.mkdir(exist_ok=True)
+    report = FsSyncReport()
 
     conn = open_sqlite(ctx.db_path)
     cur = conn.cursor()
     cur.execute("""
-        SELECT d.name, m.name
-        FROM devices d
-        LEFT JOIN measurements m
-            ON d.id = m.device_id
-            AND m.is_delete = 0
-        WHERE d.is_delete = 0
+        SELECT id, name, 1 FROM devices WHERE is_delete = 0
+        UNION ALL
+        SELECT m.id, d.name || '/' || m.name, 0
+        FROM measurements m
+        JOIN devices d ON d.id = m.device_id
+        WHERE m.is_delete = 0 AND d.is_delete = 0 AND m.name IS NOT NULL
     """)
-    for device_name, measurement_name in cur.fetchall():
-        device_dir = base / device_name
-        device_dir.mkdir(exist_ok=True)
-        if measurement_name:
-            meas_dir = device_dir / measurement_name
-            meas_dir.mkdir(exist_ok=True)
+    desired = {entity_id: (rel_path, is_device) for entity_id, rel_path, is_device in cur.fetchall()}
+    cur.execute("SELECT entity_id, rel_path, orphaned_at FROM fs_materialized")
+    recorded = {entity_id: (rel_path, orphaned_at) for entity_id, rel_path, orphaned_at in cur.fetchall()}
     conn.close()
 
+    changed: list[tuple[str, str, int]] = []
+    moved_devices: dict[str, str] = {}
+    base.mkdir(exist_ok=True)
 
-def read_cole_cole_from_db(db_path: Path, measurement_id: str) -> pd.DataFrame:
-    conn = open_sqlite(db_path)
+    # Devices first, so measurement folders that moved with a renamed device
+    # are recognized below and not touched again.
+    for is_device_pass in (1, 0):
+        for entity_id, (rel_path, is_device) in desired.items():
+            if is_device != is_device_pass:
+                continue
+            old_rel, orphaned_at = recorded.get(entity_id, (None, None))
+            if old_rel == rel_path and orphaned_at is None:
+                continue
+            if old_rel is not None and not is_device:
+                old_device, _, old_name = old_rel.partition("/")
+                old_rel = f"{moved_devices.get(old_device, old_device)}/{old_name}"
+            if old_rel is not None and old_rel != rel_path and (base / old_rel).is_dir() \
+                    and not (base / rel_path).exists():
+                (base / rel_path).parent.mkdir(parents=True, exist_ok=True)
+                os.rename(base / old_rel, base / rel_path)
+                report.renamed.append((old_rel, rel_path))
+                if is_device:
+                    moved_devices[old_rel] = rel_path
+            elif not (base / rel_path).is_dir():
+                (base / rel_path).mkdir(parents=True, exist_ok=True)
+                report.created.append(rel_path)
+            changed.append((entity_id, rel_path, is_device))
+
+    now = datetime.utcnow().isoformat()
+    newly_orphaned = [
+        entity_id for entity_id, (_, orphaned_at) in recorded.items()
+        if entity_id not in desired and orphaned_at is None
+    ]
+    if changed or newly_orphaned:
+        with writer(ctx.db_path) as w:
+            w.executemany(
+                """
+                INSERT OR REPLACE INTO fs_materialized (entity_id, rel_path, is_device, orphaned_at)
+                VALUES (?, ?, ?, NULL)
+                """,
+                changed,
+            )
+            w.executemany(
+                "UPDATE fs_materialized SET orphaned_at = ? WHERE entity_id = ?",
+                [(now, entity_id) for entity_id in newly_orphaned],
+            )
+
+    report.orphaned = sorted(
+        rel_path for entity_id, (rel_path, _) in recorded.items() if entity_id not in desired
+    )
+    return report
+
+
+def read_cole_cole_from_db(db_path: Path, measurement_id: str, *, cache: bool = True) -> pd.DataFrame:
+    if cache:
+        return pd.DataFrame(read_dataset_arrays(db_path, measurement_id, "cole_cole"))
+    conn = open_points(db_path, measurement_id)
     df = pd.read_sql_query(
         """
         SELECT frequency, resistance, reactance, capacitance
         FROM cole_cole
         WHERE measurement_id = ? AND is_delete = 0
+        ORDER BY seq
         """,
         conn,
         params=(measurement_id,),
@@ -173,13 +428,16 @@ def read_cole_cole_from_db(db_path: Path, measurement_id: str) -> pd.DataFrame:
     return df
 
 
-def read_standard_plot_from_db(db_path: Path, measurement_id: str) -> pd.DataFrame:
-    conn = open_sqlite(db_path)
+def read_standard_plot_from_db(db_path: Path, measurement_id: str, *, cache: bool = True) -> pd.DataFrame:
+    if cache:
+        return pd.DataFrame(read_dataset_arrays(db_path, measurement_id, "standard_plot"))
+    conn = open_points(db_path, measurement_id)
     df = pd.read_sql_query(
         """
         SELECT time, voltage
         FROM standard_plot
         WHERE measurement_id = ? AND is_delete = 0
+        ORDER BY seq
         """,
         conn,
         params=(measurement_id,),
@@ -188,13 +446,16 @@ def read_standard_plot_from_db(db_path: Path, measurement_id: str) -> pd.DataFra
     return df
 
 
-def read_nanothickness_from_db(db_path: Path, measurement_id: str) -> pd.DataFrame:
-    conn = open_sqlite(db_path)
+def read_nanothickness_from_db(db_path: Path, measurement_id: str, *, cache: bool = True) -> pd.DataFrame:
+    if cache:
+        return pd.DataFrame(read_dataset_arrays(db_path, measurement_id, "nanothickness"))
+    conn = open_points(db_path, measurement_id)
     df = pd.read_sql_query(
         """
         SELECT pos1, pos2, pos3, pos4, pos5
         FROM nanothickness
         WHERE measurement_id = ? AND is_delete = 0
+        ORDER BY seq
         """,
         conn,
         params=(measurement_id,),
@@ -203,8 +464,194 @@ def read_nanothickness_from_db(db_path: Path, measurement_id: str) -> pd.DataFra
     return df
 
 
-def has_cole_cole(db_path: Path, measurement_id: str) -> bool:
+def read_dataset_arrays(
+    db_path: Path,
+    measurement_id: str,
+    table: str,
+    *,
+    cache: bool = True,
+    conn: sqlite3.Connection | None = None,
+) -> dict[str, np.ndarray]:
+    """
+    Live points of one dataset as contiguous float64 arrays keyed by column,
+    in insertion (seq) order like the DataFrame readers. NULLs become NaN.
+
+    With `cache`, served from the shared point cache while the dataset's data
+    version is unchanged; cached arrays are read-only. Runs on `conn` if given
+    (e.g. a pooled read-only connection, left open) instead of opening one;
+    in the sharded layout it must have the measurement's shard attached.
+    """
+    cols = DATASET_COLUMNS[table]
+    own_conn = conn is None
+    if own_conn:
+        conn = open_points(db_path, measurement_id)
+    cur = conn.cursor()
+
+    def load() -> dict[str, np.ndarray]:
+        cur.execute(
+            f"SELECT COUNT(*) FROM {table} WHERE measurement_id = ? AND is_delete = 0",
+            (measurement_id,),
+        )
+        n = cur.fetchone()[0]
+        matrix = fetch_float_matrix(
+            cur,
+            f"SELECT {float_columns_sql(cols)} FROM {table} "
+            "WHERE measurement_id = ? AND is_delete = 0 ORDER BY seq",
+            (measurement_id,),
+            n,
+            len(cols),
+        )
+        return split_columns(matrix, cols)
+
+    with read_snapshot(conn):
+        if cache:
+            key = (str(db_path), measurement_id, table)
+            arrays = POINT_CACHE.get_or_load(key, points_version(conn, measurement_id), load)
+        else:
+            arrays = load()
+    if own_conn:
+        conn.close()
+    return arrays
+
+
+# ===== RANGE READS (windowed views) =====
+def seq_span(db_path: Path, measurement_id: str, table: str) -> tuple[int, int] | None:
+    """(first, last) seq of a dataset's live points, or None if it has none."""
+    return column_extent(db_path, measurement_id, table, "seq")
+
+
+def column_extent(db_path: Path, measurement_id: str, table: str, column: str) -> tuple[float, float] | None:
+    """(min, max) of a range column for one dataset, or None if it has no values."""
+    where = f"FROM {table} WHERE measurement_id = ? AND is_delete = 0"
+    conn = open_points(db_path, measurement_id)
+    # Two single-aggregate subqueries: each is one seek at an end of the index.
+    lo, hi = conn.execute(
+        f"SELECT (SELECT MIN({column}) {where}), (SELECT MAX({column}) {where})",
+        (measurement_id, measurement_id),
+    ).fetchone()
+    conn.close()
+    return None if lo is None else (lo, hi)
+
+
+def read_range(
+    db_path: Path,
+    measurement_id: str,
+    table: str,
+    column: str,
+    lo: float,
+    hi: float,
+    *,
+    max_points: int | None = None,
+) -> dict[str, np.ndarray]:
+    """
+    Live points with lo <= `column` <= hi, ordered by `column`, as float arrays.
+
+    Uses the (measurement_id, column) index, so cost follows the window size, not
+    the dataset size. With `max_points`, a larger window is thinned to every k-th
+    point inside SQLite, keeping the returned arrays bounded. Results go through
+    the shared point cache (read-only arrays), like `read_dataset_arrays`.
+    """
+    cols = DATASET_COLUMNS[table]
+    where = f"measurement_id = ? AND is_delete = 0 AND {column} BETWEEN ? AND ?"
+    params = (measurement_id, lo, hi)
+    conn = open_points(db_path, measurement_id)
+    cur = conn.cursor()
+
+    def load() -> dict[str, np.ndarray]:
+        n = cur.execute(f"SELECT COUNT(*) FROM {table} WHERE {where}", params).fetchone()[0]
+        step = 1 if not max_points or n <= max_points else -(-n // max_points)
+        if step == 1:
+            sql = f"SELECT {float_columns_sql(cols)} FROM {table} WHERE {where} ORDER BY {column}"
+        else:
+            sql = f"""
+                SELECT {float_columns_sql(cols)} FROM (
+                    SELECT {', '.join(cols)}, ROW_NUMBER() OVER (ORDER BY {column}) - 1 AS rn
+                    FROM {table} WHERE {where}
+                )
+                WHERE rn % {step} = 0
+            """
+        matrix = fetch_float_matrix(cur, sql, params, -(-n // step), len(cols))
+        return split_columns(matrix, cols)
+
+    with read_snapshot(conn):
+        key = (str(db_path), measurement_id, table, column, lo, hi, max_points)
+        arrays = POINT_CACHE.get_or_load(key, points_version(conn, measurement_id), load)
+    conn.close()
+    return arrays
+
+
+def read_time_window(
+    db_path: Path, measurement_id: str, t0: float, t1: float, *, max_points: int | None = None
+) -> dict[str, np.ndarray]:
+    return read_range(db_path, measurement_id, "standard_plot", "time", t0, t1, max_points=max_points)
+
+
+def read_frequency_band(
+    db_path: Path, measurement_id: str, f_lo: float, f_hi: float, *, max_points: int | None = None
+) -> dict[str, np.ndarray]:
+    return read_range(db_path, measurement_id, "cole_cole", "frequency", f_lo, f_hi, max_points=max_points)
+
+
+def read_page(db_path: Path, measurement_id: str, table: str, offset: int, limit: int) -> dict[str, np.ndarray]:
+    """
+    Live points `offset` .. `offset + limit - 1` counted in seq from the first live
+    point. A primary-key seek, so cost does not depend on `offset`. Live points
+    are contiguous in seq unless soft-deleted rows sit between them; such a page
+    then comes back short instead of shifting later pages.
+    """
+    cols = DATASET_COLUMNS[table]
+    conn = open_points(db_path, measurement_id)
+    cur = conn.cursor()
+    cur.execute(
+        f"""
+        SELECT {float_columns_sql(cols)} FROM {table}
+        WHERE measurement_id = ?1 AND is_delete = 0
+          AND seq >= ?2 + (SELECT MIN(seq) FROM {table} WHERE measurement_id = ?1 AND is_delete = 0)
+          AND seq < ?3 + (SELECT MIN(seq) FROM {table} WHERE measurement_id = ?1 AND is_delete = 0)
+        ORDER BY seq
+        """,
+        (measurement_id, offset, offset + limit),
+    )
+    rows = cur.fetchall()
+    conn.close()
+    matrix = np.array(rows, dtype=np.float64).reshape(len(rows), len(cols))
+    return split_columns(matrix, cols)
+
+
+def read_cole_cole_arrays(db_path: Path, measurement_id: str, *, cache: bool = True) -> dict[str, np.ndarray]:
+    return read_dataset_arrays(db_path, measurement_id, "cole_cole", cache=cache)
+
+
+def read_standard_plot_arrays(db_path: Path, measurement_id: str, *, cache: bool = True) -> dict[str, np.ndarray]:
+    return read_dataset_arrays(db_path, measurement_id, "standard_plot", cache=cache)
+
+
+def read_nanothickness_arrays(db_path: Path, measurement_id: str, *, cache: bool = True) -> dict[str, np.ndarray]:
+    return read_dataset_arrays(db_path, measurement_id, "nanothickness", cache=cache)
+
+
+def get_trace_metrics(db_path: Path, device_names: list[str] | None = None) -> pd.DataFrame:
+    """Stored standard-plot metrics per measurement (no raw points are read)."""
     conn = open_sqlite(db_path)
+    sql = f"""
+        SELECT d.name AS device, m.name AS measurement,
+               {', '.join('t.' + c for c in METRIC_COLUMNS)}
+        FROM standard_plot_metrics t
+        JOIN measurements m ON m.id = t.measurement_id AND m.is_delete = 0
+        JOIN devices d ON d.id = m.device_id AND d.is_delete = 0
+    """
+    params: tuple = ()
+    if device_names is not None:
+        sql += f" WHERE d.name IN ({','.join('?' * len(device_names))})"
+        params = tuple(device_names)
+    sql += " ORDER BY d.name, m.created_at"
+    df = pd.read_sql_query(sql, conn, params=params)
+    conn.close()
+    return df
+
+
+def has_cole_cole(db_path: Path, measurement_id: str) -> bool:
+    conn = open_points(db_path, measurement_id)
     cur = conn.cursor()
     cur.execute(
         "SELECT 1 FROM cole_cole WHERE measurement_id = ? AND is_delete = 0 LIMIT 1",
@@ -216,7 +663,7 @@ def has_cole_cole(db_path: Path, measurement_id: str) -> bool:
 
 
 def has_standard_plot(db_path: Path, measurement_id: str) -> bool:
-    conn = open_sqlite(db_path)
+    conn = open_points(db_path, measurement_id)
     cur = conn.cursor()
     cur.execute(
         "SELECT 1 FROM standard_plot WHERE measurement_id = ? AND is_delete = 0 LIMIT 1",
@@ -228,7 +675,7 @@ def has_standard_plot(db_path: Path, measurement_id: str) -> bool:
 
 
 def has_nanothickness(db_path: Path, measurement_id: str) -> bool:
-    conn = open_sqlite(db_path)
+    conn = open_points(db_path, measurement_id)
     cur = conn.cursor()
     cur.execute(
         "SELECT 1 FROM nanothickness WHERE measurement_id = ? AND is_delete = 0 LIMIT 1",
@@ -256,211 +703,294 @@ def is_measurement_owner(db_path: Path, measurement_id: str, username: str) -> b
         return False
     return row[0] == username
 
+
+def _drop_fits(cur: sqlite3.Cursor, measurement_ids: list[str]) -> None:
+    """Forget cached Cole-Cole fits (catalog table, see thermal_local.services.analysis)."""
+    marks = ",".join("?" * len(measurement_ids))
+    cur.execute(f"DELETE FROM cole_cole_fits WHERE measurement_id IN ({marks})", measurement_ids)
+
+
+def _insert_points(cur: sqlite3.Cursor, measurement_id: str, table: str, values) -> np.ndarray:
+    """
+    Validate and insert point rows, recording the dataset's quality mask/summary.
+    Inf and sentinel values are stored as NULL; returns the cleaned values.
+    """
+    cols = DATASET_COLUMNS[table]
+    quality = validate_dataset(values, cols)
+    cur.executemany(
+        append_points_sql(table, ("id", "measurement_id", *cols)),
+        ((str(uuid.uuid4()), measurement_id, *map(float, row)) for row in quality.values),
+    )
+    store_quality(cur, measurement_id, table, quality)
+    invalidate_points(cur, [measurement_id])
+    return quality.values
+
+
+def replace_dataset(cur: sqlite3.Cursor, measurement_id: str, table: str, values: np.ndarray) -> None:
+    """
+    Replace a measurement's live `table` rows with `values` (n x len(DATASET_COLUMNS[table])).
+    Old rows are soft-deleted; runs on the caller's transaction, which needs the
+    measurement's shard attached in the sharded layout (`points_writer`).
+    """
+    cur.execute(
+        f"UPDATE {table} SET is_delete = 1 WHERE measurement_id = ? AND is_delete = 0",
+        (measurement_id,),
+    )
+    values = _insert_points(cur, measurement_id, table, values)
+    if table == "standard_plot":
+        store_trace_metrics(cur, measurement_id, values[:, 0], values[:, 1])
+    elif table == "cole_cole":
+        _drop_fits(cur, [measurement_id])
+    # Points now live here; a lazy server fetch must not overwrite them.
+    cur.execute(
+        "INSERT OR IGNORE INTO local_points (measurement_id, fetched_at) VALUES (?, ?)",
+        (measurement_id, datetime.utcnow().isoformat()),
+    )
+
+
 def insert_cole_cole(db_path: Path, measurement_id: str, df: pd.DataFrame) -> None:
-    conn = open_sqlite(db_path)
-    cur = conn.cursor()
-    for _, r in df.iterrows():
-        cur.execute(
-            """
-            INSERT INTO cole_cole (
-                id, measurement_id, frequency, resistance, reactance, capacitance
-            )
-            VALUES (?, ?, ?, ?, ?, ?)
-            """,
-            (
-                str(uuid.uuid4()),
-                measurement_id,
-                float(r["frequency"]),
-                float(r["resistance"]),
-                float(r["reactance"]),
-                float(r["capacitance"]),
-            ),
-        )
-    conn.commit()
-    conn.close()
+    """Store `df` as the measurement's Cole-Cole data, replacing any live rows."""
+    values = df[list(DATASET_COLUMNS["cole_cole"])].to_numpy(dtype=float)
+    with points_writer(db_path, shard_of(db_path, measurement_id)) as conn:
+        replace_dataset(conn.cursor(), measurement_id, "cole_cole", values)
 
 
 def insert_standard_plot(db_path: Path, measurement_id: str, df: pd.DataFrame) -> None:
-    conn = open_sqlite(db_path)
-    cur = conn.cursor()
-    for _, r in df.iterrows():
-        cur.execute(
-            """
-            INSERT INTO standard_plot (id, measurement_id, time, voltage)
-            VALUES (?, ?, ?, ?)
-            """,
-            (str(uuid.uuid4()), measurement_id, float(r["time"]), float(r["voltage"])),
-        )
-    conn.commit()
-    conn.close()
+    """
+    Store `df` as the measurement's Standard Plot, replacing any live rows, so
+    the stored trace metrics always describe the whole stored trace.
+    """
+    values = df[list(DATASET_COLUMNS["standard_plot"])].to_numpy(dtype=float)
+    with points_writer(db_path, shard_of(db_path, measurement_id)) as conn:
+        replace_dataset(conn.cursor(), measurement_id, "standard_plot", values)
 
 
 def insert_nanothickness(db_path: Path, measurement_id: str, df: pd.DataFrame) -> None:
-    conn = open_sqlite(db_path)
-    cur = conn.cursor()
-    for _, r in df.iterrows():
-        cur.execute(
+    """
+    Store `df` as the measurement's Nanothickness data, replacing any live rows
+    (the recorded quality mask covers exactly the stored rows).
+    """
+    values = df[list(DATASET_COLUMNS["nanothickness"])].to_numpy(dtype=float)
+    with points_writer(db_path, shard_of(db_path, measurement_id)) as conn:
+        replace_dataset(conn.cursor(), measurement_id, "nanothickness", values)
+
+
+def _allocate_num_orders(p_cur, counts: dict[str, int]) -> dict[str, int]:
+    """
+    Reserve `counts[device_id]` consecutive num_order values per device on the
+    server; returns the first reserved value per device.
+
+    Counter rows are locked in device_id order (no deadlocks between bulk
+    uploads) and held until the caller's transaction ends, so concurrent
+    stations get disjoint blocks. A device's counter is seeded once from
+    MAX(num_order); after that allocation never scans measurements. The
+    device_counters table is created by `migrate_server`, not here.
+    """
+    import psycopg2.errors
+    from psycopg2.extras import execute_values
+
+    device_ids = sorted(counts)
+    # Seed counters for devices seen for the first time (no-op if another
+    # station seeds concurrently).
+    try:
+        p_cur.execute("SELECT device_id FROM device_counters WHERE device_id = ANY(%s)", (device_ids,))
+    except psycopg2.errors.UndefinedTable as e:
+        raise RuntimeError(
+            "Server has no device_counters table; run `python -m thermal_local.cli migrate-server` once"
+        ) from e
+    seeded = {r[0] for r in p_cur.fetchall()}
+    for device_id in device_ids:
+        if device_id in seeded:
+            continue
+        p_cur.execute(
             """
-            INSERT INTO nanothickness (id, measurement_id, pos1, pos2, pos3, pos4, pos5)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO device_counters (device_id, last_order)
+            SELECT %s, COALESCE(MAX(num_order), 0) FROM measurements WHERE device_id = %s
+            ON CONFLICT (device_id) DO NOTHING
             """,
-            (str(uuid.uuid4()), measurement_id, float(r["pos1"]), float(r["pos2"]), float(r["pos3"]), float(r["pos4"]), float(r["pos5"])),
+            (device_id, device_id),
         )
-    conn.commit()
-    conn.close()
+    p_cur.execute(
+        "SELECT device_id FROM device_counters WHERE device_id = ANY(%s) ORDER BY device_id FOR UPDATE",
+        (device_ids,),
+    )
+    reserved = execute_values(
+        p_cur,
+        """
+        UPDATE device_counters AS c
+        SET last_order = c.last_order + v.n
+        FROM (VALUES %s) AS v(device_id, n)
+        WHERE c.device_id = v.device_id
+        RETURNING c.device_id, c.last_order
+        """,
+        [(d, counts[d]) for d in device_ids],
+        fetch=True,
+    )
+    return {device_id: last - counts[device_id] + 1 for device_id, last in reserved}
 
 
-def sync_measurement_to_server(db_path: Path, measurement_id: str) -> None:
-    # Lazy import to avoid hard dependency at import-time (helps dev/test environments).
-    import psycopg2
+def create_measurements_on_server(s_cur, p_cur, measurement_ids: list[str]) -> list[str]:
+    """
+    Insert the local measurement rows that are missing on the server, allocating
+    num_order per device from the server-side counters. Runs on the caller's
+    cursors (and transaction); returns the ids that were created.
+    """
+    from psycopg2.extras import execute_values
 
-    # ---------- local ----------
-    s_conn = open_sqlite(db_path)
-    s_cur = s_conn.cursor()
+    if not measurement_ids:
+        return []
     s_cur.execute(
-        """
+        f"""
         SELECT id, device_id, name, created_by, created_at
         FROM measurements
-        WHERE id = ? AND is_delete = 0
+        WHERE id IN ({','.join('?' * len(measurement_ids))}) AND is_delete = 0
+        ORDER BY created_at
         """,
-        (measurement_id,),
+        measurement_ids,
     )
-    row = s_cur.fetchone()
-    s_conn.close()
-    if not row:
-        raise RuntimeError("Measurement not found")
-    m_id, device_id, name, created_by, created_at = row
-
-    # ---------- server ----------
-    pg_conn = psycopg2.connect(**SERVER_DB_CONFIG)
-    pg_cur = pg_conn.cursor()
-    pg_cur.execute(
-        """
-        SELECT COALESCE(MAX(num_order), 0) + 1
-        FROM measurements
-        WHERE device_id = %s
-        """,
-        (device_id,),
-    )
-    num_order = pg_cur.fetchone()[0]
-    pg_cur.execute(
+    rows = s_cur.fetchall()
+    if not rows:
+        return []
+
+    p_cur.execute("SELECT id FROM measurements WHERE id = ANY(%s)", ([r[0] for r in rows],))
+    on_server = {r[0] for r in p_cur.fetchall()}
+    rows = [r for r in rows if r[0] not in on_server]
+    if not rows:
+        return []
+
+    per_device: dict[str, int] = {}
+    for r in rows:
+        per_device[r[1]] = per_device.get(r[1], 0) + 1
+    next_order = _allocate_num_orders(p_cur, per_device)
+    values = []
+    for m_id, device_id, name, created_by, created_at in rows:
+        num_order = next_order[device_id]
+        next_order[device_id] = num_order + 1
+        values.append((m_id, device_id, num_order, name, created_by, created_at))
+
+    created = execute_values(
+        p_cur,
         """
         INSERT INTO measurements (
             id, device_id, num_order, name, created_by, created_at
         )
-        VALUES (%s, %s, %s, %s, %s, %s)
+        VALUES %s
         ON CONFLICT (id) DO NOTHING
+        RETURNING id
         """,
-        (m_id, device_id, num_order, name, created_by, created_at),
+        values,
+        fetch=True,
     )
-    pg_conn.commit()
-    pg_conn.close()
+    return [r[0] for r in created]
 
 
-def sync_sqlite_to_server(db_path: Path, measurement_id: str) -> None:
+def sync_measurement_to_server(db_path: Path, measurement_id: str) -> None:
     # Lazy import to avoid hard dependency at import-time (helps dev/test environments).
     import psycopg2
 
-    sync_measurement_to_server(db_path, measurement_id)
-
-    sqlite_conn = open_sqlite(db_path)
-    s_cur = sqlite_conn.cursor()
-
-    pg_conn = psycopg2.connect(**SERVER_DB_CONFIG)
-    p_cur = pg_conn.cursor()
-
-    # ---------- Cole-Cole ----------
-    s_cur.execute(
-        """
-        SELECT frequency, resistance, reactance, capacitance
-        FROM cole_cole
-        WHERE measurement_id = ? AND is_delete = 0
-        """,
-        (measurement_id,),
-    )
-    for r in s_cur.fetchall():
-        p_cur.execute(
-            """
-            INSERT INTO cole_cole (
-                id, measurement_id, frequency, resistance, reactance, capacitance
-            )
-            VALUES (%s, %s, %s, %s, %s, %s)
-            ON CONFLICT DO NOTHING
-            """,
-            (str(uuid.uuid4()), measurement_id, r[0], r[1], r[2], r[3]),
-        )
-
-    # ---------- Standard Plot ----------
-    s_cur.execute(
-        """
-        SELECT time, voltage
-        FROM standard_plot
-        WHERE measurement_id = ? AND is_delete = 0
-        """,
-        (measurement_id,),
-    )
-    for r in s_cur.fetchall():
-        p_cur.execute(
-            """
-            INSERT INTO standard_plot (id, measurement_id, time, voltage)
-            VALUES (%s, %s, %s, %s)
-            ON CONFLICT DO NOTHING
-            """,
-            (str(uuid.uuid4()), measurement_id, r[0], r[1]),
-        )
-    # ---------- Nanothickness ----------
+    s_conn = open_sqlite(db_path)
+    s_cur = s_conn.cursor()
     s_cur.execute(
-        """
-        SELECT pos1, pos2, pos3, pos4, pos5
-        FROM nanothickness
-        WHERE measurement_id = ? AND is_delete = 0
-        """,
+        "SELECT 1 FROM measurements WHERE id = ? AND is_delete = 0",
         (measurement_id,),
     )
-    for r in s_cur.fetchall():
-        p_cur.execute(
-            """
-            INSERT INTO nanothickness (id, measurement_id, pos1, pos2, pos3, pos4, pos5)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT DO NOTHING
-            """,
-            (str(uuid.uuid4()), measurement_id, r[0], r[1], r[2], r[3], r[4]),
-        )
+    if s_cur.fetchone() is None:
+        s_conn.close()
+        raise RuntimeError("Measurement not found")
 
-    pg_conn.commit()
-    sqlite_conn.close()
-    pg_conn.close()
+    pg_conn = psycopg2.connect(**SERVER_DB_CONFIG)
+    try:
+        create_measurements_on_server(s_cur, pg_conn.cursor(), [measurement_id])
+        pg_conn.commit()
+    finally:
+        s_conn.close()
+        pg_conn.close()
 
 
-def _sync_soft_delete_to_server(db_path: Path, measurement_id: str) -> None:
-    """Sync soft-delete (is_delete=1) to server DB for measurement and related tables."""
+def _sync_soft_delete_to_server(measurement_ids: list[str]) -> None:
+    """Sync soft-delete (is_delete=1) to server DB for measurements and related tables."""
     import psycopg2
 
     pg_conn = psycopg2.connect(**SERVER_DB_CONFIG)
     pg_cur = pg_conn.cursor()
     try:
         pg_cur.execute(
-            "UPDATE measurements SET is_delete = TRUE WHERE id = %s",
-            (measurement_id,),
-        )
-        pg_cur.execute(
-            "UPDATE cole_cole SET is_delete = TRUE WHERE measurement_id = %s",
-            (measurement_id,),
-        )
-        pg_cur.execute(
-            "UPDATE standard_plot SET is_delete = TRUE WHERE measurement_id = %s",
-            (measurement_id,),
-        )
-        pg_cur.execute(
-            "UPDATE nanothickness SET is_delete = TRUE WHERE measurement_id = %s",
-            (measurement_id,),
+            "UPDATE measurements SET is_delete = TRUE WHERE id = ANY(%s)",
+            (measurement_ids,),
         )
+        for table in DATASET_COLUMNS:
+            pg_cur.execute(
+                f"UPDATE {table} SET is_delete = TRUE WHERE measurement_id = ANY(%s)",
+                (measurement_ids,),
+            )
         pg_conn.commit()
     finally:
         pg_cur.close()
         pg_conn.close()
 
 
+def _soft_delete_points(cur: sqlite3.Cursor, measurement_ids: list[str]) -> None:
+    marks = ",".join("?" * len(measurement_ids))
+    for table in DATASET_COLUMNS:
+        cur.execute(
+            f"UPDATE {table} SET is_delete = 1 WHERE measurement_id IN ({marks})",
+            measurement_ids,
+        )
+    invalidate_points(cur, measurement_ids)
+
+
+def soft_delete_measurements(
+    db_path: Path,
+    measurement_ids: list[str],
+    *,
+    username: str,
+) -> None:
+    """
+    Soft delete a set of measurements and their related data in one local
+    transaction (plus one per shard in the sharded layout), then one server
+    transaction. All-or-nothing: if any measurement is missing or was created by
+    someone else, nothing is deleted.
+    """
+    ids = list(dict.fromkeys(measurement_ids))
+    if not ids:
+        return
+    marks = ",".join("?" * len(ids))
+
+    with writer(db_path) as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"SELECT id, created_by FROM measurements WHERE id IN ({marks}) AND is_delete = 0",
+            ids,
+        )
+        created_by = dict(cur.fetchall())
+        if len(created_by) != len(ids):
+            raise RuntimeError("Measurement not found")
+        if any(owner != username for owner in created_by.values()):
+            raise PermissionError("You can only delete measurements you created")
+
+        cur.execute(
+            f"UPDATE measurements SET is_delete = 1, deleted_at = ? WHERE id IN ({marks})",
+            [datetime.utcnow().isoformat(), *ids],
+        )
+        _drop_fits(cur, ids)
+        sharded = is_sharded(conn)
+        if not sharded:
+            _soft_delete_points(cur, ids)
+    if sharded:
+        # One transaction per shard, after the catalog; the maintenance job
+        # purges the points of deleted measurements even if one of these fails.
+        for device_id, device_ids in shard_groups(db_path, ids).items():
+            with points_writer(db_path, device_id) as conn:
+                _soft_delete_points(conn.cursor(), device_ids)
+
+    # Sync soft-delete to server DB (requires is_delete column on server)
+    try:
+        _sync_soft_delete_to_server(ids)
+    except Exception as e:
+        # Re-raise so UI can show error (e.g. if server lacks is_delete column)
+        raise RuntimeError(f"Local delete succeeded, but server sync failed: {e}") from e
+
+
 def soft_delete_measurement(
     db_path: Path,
     *,
@@ -475,11 +1005,9 @@ def soft_delete_measurement(
     """
     conn = open_sqlite(db_path)
     cur = conn.cursor()
-
-    # Find measurement id and creator
     cur.execute(
         """
-        SELECT m.id, m.created_by
+        SELECT m.id
         FROM measurements m
         JOIN devices d ON m.device_id = d.id
         WHERE m.name = ? AND d.name = ? AND m.is_delete = 0
@@ -487,40 +1015,8 @@ def soft_delete_measurement(
         (measurement_name, device_name),
     )
     row = cur.fetchone()
+    conn.close()
     if not row:
-        conn.close()
         raise RuntimeError("Measurement not found")
-
-    measurement_id, created_by = row
-    if created_by != username:
-        conn.close()
-        raise PermissionError("You can only delete measurements you created")
-
-    # Soft delete measurement and related records (local)
-    cur.execute(
-        "UPDATE measurements SET is_delete = 1 WHERE id = ?",
-        (measurement_id,),
-    )
-    cur.execute(
-        "UPDATE cole_cole SET is_delete = 1 WHERE measurement_id = ?",
-        (measurement_id,),
-    )
-    cur.execute(
-        "UPDATE standard_plot SET is_delete = 1 WHERE measurement_id = ?",
-        (measurement_id,),
-    )
-    cur.execute(
-        "UPDATE nanothickness SET is_delete = 1 WHERE measurement_id = ?",
-        (measurement_id,),
-    )
-
-    conn.commit()
-    conn.close()
-
-    # Sync soft-delete to server DB (requires is_delete column on server)
-    try:
-        _sync_soft_delete_to_server(db_path, measurement_id)
-    except Exception as e:
-        # Re-raise so UI can show error (e.g. if server lacks is_delete column)
-        raise RuntimeError(f"Local delete succeeded, but server sync failed: {e}") from e
+    soft_delete_measurements(db_path, [row[0]], username=username)
 
@@ -0,0 +1,152 @@
+"""
+In-process cache of point-data reads, shared by every Streamlit session (and
+the folder watcher) in the server process.
+
+Entries are keyed by (database, measurement, table, read arguments) and tagged
+with the dataset's data version; an entry is only returned while the version
+stored in SQLite still matches, so writes from other processes (CLI, cron) are
+picked up too. Versions live in `data_versions` under the scopes "points"
+(bumped by bulk operations such as a full sync) and "points:<measurement_id>",
+and are bumped by `invalidate_points` inside the writing transaction.
+
+The cache holds NumPy arrays (marked read-only) up to POINT_CACHE_BYTES and
+evicts least-recently-used entries beyond that.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Hashable
+
+import numpy as np
+
+from thermal_local.config import POINT_CACHE_BYTES
+
+_BUMP_SQL = """
+    INSERT INTO data_versions (scope, version) VALUES (?, 1)
+    ON CONFLICT (scope) DO UPDATE SET version = version + 1
+"""
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    entries: int = 0
+    bytes: int = 0
+    budget: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def _nbytes(value: dict[str, np.ndarray]) -> int:
+    return sum(a.nbytes for a in value.values())
+
+
+class PointCache:
+    """Byte-budgeted LRU of {column: array} reads. Thread-safe."""
+
+    def __init__(self, budget_bytes: int) -> None:
+        self.budget = budget_bytes
+        self._entries: OrderedDict[Hashable, tuple[tuple, dict[str, np.ndarray], int]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get_or_load(
+        self,
+        key: tuple,
+        version: tuple,
+        load: Callable[[], dict[str, np.ndarray]],
+    ) -> dict[str, np.ndarray]:
+        """
+        Cached value for `key` at `version`, else `load()` (run outside the lock,
+        so concurrent misses on the same key may both read; the last one wins).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[1]
+            self._misses += 1
+            if entry is not None:
+                self._drop(key)
+
+        value = load()
+        for a in value.values():
+            a.setflags(write=False)  # shared between sessions
+        size = _nbytes(value)
+        if size > self.budget:
+            return value
+
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (version, value, size)
+            self._bytes += size
+            while self._bytes > self.budget:
+                self._drop(next(iter(self._entries)))
+                self._evictions += 1
+        return value
+
+    def _drop(self, key: Hashable) -> None:
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def invalidate(self, measurement_ids: list[str] | None = None) -> None:
+        """Drop the entries of these measurements (all entries if None)."""
+        with self._lock:
+            if measurement_ids is None:
+                self._entries.clear()
+                self._bytes = 0
+                return
+            ids = set(measurement_ids)
+            for key in [k for k in self._entries if k[1] in ids]:
+                self._drop(key)
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                entries=len(self._entries),
+                bytes=self._bytes,
+                budget=self.budget,
+            )
+
+
+POINT_CACHE = PointCache(POINT_CACHE_BYTES)
+
+
+def points_version(conn: sqlite3.Connection, measurement_id: str) -> tuple[int, int]:
+    """(bulk, per-measurement) data version of a measurement's points."""
+    return conn.execute(
+        """
+        SELECT IFNULL((SELECT version FROM data_versions WHERE scope = 'points'), 0),
+               IFNULL((SELECT version FROM data_versions WHERE scope = 'points:' || ?), 0)
+        """,
+        (measurement_id,),
+    ).fetchone()
+
+
+def invalidate_points(cur: sqlite3.Cursor, measurement_ids: list[str] | None = None) -> None:
+    """
+    Bump the data version of these measurements' points (of all points if None)
+    on the caller's write transaction, and drop their cached reads.
+    """
+    if measurement_ids is None:
+        cur.execute(_BUMP_SQL, ("points",))
+    else:
+        cur.executemany(_BUMP_SQL, [(f"points:{mid}",) for mid in measurement_ids])
+    POINT_CACHE.invalidate(measurement_ids)
@@ -0,0 +1,304 @@
+"""
+Checksum-based reconciliation: local SQLite -> PostgreSQL server.
+
+Each side computes one fingerprint per (measurement, data type) with a single
+GROUP BY query per point table: the row count plus the sums of each live row's
+MD5 (of the exact IEEE-754 bytes of its values, split into two signed 64-bit
+halves). Any changed, added, removed or re-paired value changes it, and it does
+not depend on row order, which the server does not keep. Fingerprints roll up into a Merkle-style
+hierarchy (device -> measurement -> dataset), and only datasets whose
+fingerprints differ are re-uploaded.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import struct
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from thermal_local.config import SERVER_DB_CONFIG
+from thermal_local.db.shards import connect_points, shard_groups
+from thermal_local.services.measurements import (
+    DATASET_COLUMNS,
+    create_measurements_on_server,
+    open_sqlite,
+)
+
+_MISSING = "-"
+
+
+@dataclass
+class ReconcileReport:
+    devices_checked: int = 0
+    devices_differing: int = 0
+    measurements_differing: int = 0
+    uploaded: list[tuple[str, str]] = field(default_factory=list)
+    remote_only: list[tuple[str, str]] = field(default_factory=list)
+
+
+def _row_bytes(values) -> bytes:
+    # Same bytes as the server's float8send(); + 0.0 folds -0.0 into 0.0 (SQLite
+    # stores -0.0 as 0).
+    return b"".join(b"\x00" if v is None else b"\x01" + struct.pack(">d", float(v) + 0.0) for v in values)
+
+
+class _RowDigest:
+    """SQLite aggregate: "<sum of MD5 high halves>:<sum of low halves>" of its rows."""
+
+    def __init__(self) -> None:
+        self.hi = self.lo = 0
+
+    def step(self, *values) -> None:
+        digest = hashlib.md5(_row_bytes(values)).digest()
+        self.hi += int.from_bytes(digest[:8], "big", signed=True)
+        self.lo += int.from_bytes(digest[8:], "big", signed=True)
+
+    def finalize(self) -> str:
+        return f"{self.hi}:{self.lo}"
+
+
+def _server_digest_sql(cols: tuple[str, ...]) -> str:
+    row = " || ".join(
+        f"COALESCE('\\x01'::bytea || float8send({c}::float8 + 0.0), '\\x00'::bytea)" for c in cols
+    )
+    half = "SUM(('x' || substr(md5({row}), {start}, 16))::bit(64)::bigint)::text"
+    return f"{half.format(row=row, start=1)} || ':' || {half.format(row=row, start=17)}"
+
+
+def _aggregate_sql(table: str, digest: str, placeholder: str, is_delete_false: str, id_filter: str) -> str:
+    return f"""
+        SELECT measurement_id, COUNT(*), {digest}
+        FROM {table}
+        WHERE is_delete = {is_delete_false} AND measurement_id {id_filter.format(p=placeholder)}
+        GROUP BY measurement_id
+    """
+
+
+def _dataset_hashes(rows) -> dict[str, str]:
+    return {r[0]: hashlib.sha1(f"{r[1]}|{r[2]}".encode()).hexdigest() for r in rows}
+
+
+def _measurement_hash(datasets: dict[str, str]) -> str:
+    parts = [datasets.get(t, _MISSING) for t in DATASET_COLUMNS]
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+
+def _device_hash(measurements: dict[str, str]) -> str:
+    parts = [f"{mid}:{h}" for mid, h in sorted(measurements.items())]
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+
+def _build_tree(
+    measurement_devices: dict[str, str],
+    datasets: dict[str, dict[str, str]],
+) -> dict[str, tuple[str, dict[str, str]]]:
+    """device_id -> (device hash, {measurement_id: measurement hash})."""
+    per_device: dict[str, dict[str, str]] = {}
+    for mid, device_id in measurement_devices.items():
+        per_device.setdefault(device_id, {})[mid] = _measurement_hash(
+            {t: datasets[t][mid] for t in DATASET_COLUMNS if mid in datasets[t]}
+        )
+    return {d: (_device_hash(ms), ms) for d, ms in per_device.items()}
+
+
+def local_fingerprints(db_path: Path, measurement_ids: list[str]) -> dict[str, dict[str, str]]:
+    out: dict[str, dict[str, str]] = {table: {} for table in DATASET_COLUMNS}
+    for device_id, ids in shard_groups(db_path, measurement_ids).items():
+        conn = connect_points(db_path, device_id)
+        conn.create_aggregate("row_digest", -1, _RowDigest)
+        cur = conn.cursor()
+        placeholders = ",".join("?" * len(ids))
+        for table in DATASET_COLUMNS:
+            digest = f"row_digest({', '.join(DATASET_COLUMNS[table])})"
+            cur.execute(_aggregate_sql(table, digest, placeholders, "0", "IN ({p})"), ids)
+            out[table].update(_dataset_hashes(cur.fetchall()))
+        conn.close()
+    return out
+
+
+def server_fingerprints(p_cur, measurement_ids: list[str]) -> dict[str, dict[str, str]]:
+    out = {}
+    for table in DATASET_COLUMNS:
+        digest = _server_digest_sql(DATASET_COLUMNS[table])
+        p_cur.execute(_aggregate_sql(table, digest, "%s", "FALSE", "= ANY({p})"), (measurement_ids,))
+        out[table] = _dataset_hashes(p_cur.fetchall())
+    return out
+
+
+def upload_datasets(s_cur, p_cur, measurement_ids: list[str], table: str) -> None:
+    """
+    Replace the server copy of one dataset type for a set of measurements with
+    the local rows (old rows are soft-deleted). One local SELECT and one server
+    UPDATE/INSERT pair regardless of how many measurements are in the set.
+    """
+    from psycopg2.extras import execute_values
+
+    if not measurement_ids:
+        return
+    cols = DATASET_COLUMNS[table]
+    s_cur.execute(
+        f"""
+        SELECT measurement_id, {', '.join(cols)} FROM {table}
+        WHERE measurement_id IN ({','.join('?' * len(measurement_ids))}) AND is_delete = 0
+        ORDER BY measurement_id, seq
+        """,
+        measurement_ids,
+    )
+    rows = [(str(uuid.uuid4()), *r) for r in s_cur.fetchall()]
+    p_cur.execute(
+        f"UPDATE {table} SET is_delete = TRUE WHERE measurement_id = ANY(%s) AND is_delete = FALSE",
+        (measurement_ids,),
+    )
+    execute_values(
+        p_cur,
+        f"INSERT INTO {table} (id, measurement_id, {', '.join(cols)}) VALUES %s",
+        rows,
+        page_size=1000,
+    )
+
+
+def _push(
+    db_path: Path,
+    p_cur,
+    measurement_ids: list[str],
+    to_upload: list[tuple[str, str]],
+) -> None:
+    """Create missing server measurements, then upload datasets grouped by table (and shard)."""
+    sqlite_conn = open_sqlite(db_path)
+    try:
+        create_measurements_on_server(sqlite_conn.cursor(), p_cur, measurement_ids)
+    finally:
+        sqlite_conn.close()
+    uploading = list(dict.fromkeys(mid for mid, _ in to_upload))
+    for device_id, shard_ids in shard_groups(db_path, uploading).items():
+        in_shard = set(shard_ids)
+        sqlite_conn = connect_points(db_path, device_id)
+        s_cur = sqlite_conn.cursor()
+        try:
+            for table in DATASET_COLUMNS:
+                ids = [mid for mid, t in to_upload if t == table and mid in in_shard]
+                upload_datasets(s_cur, p_cur, ids, table)
+        finally:
+            sqlite_conn.close()
+
+
+def upload_measurements(db_path: Path, measurement_ids: list[str]) -> list[tuple[str, str]]:
+    """
+    Force-upload a set of measurements: create the missing server rows and replace
+    every dataset that has local rows, all in one server transaction. Returns the
+    (measurement_id, table) pairs that were uploaded.
+    """
+    import psycopg2
+
+    ids = list(dict.fromkeys(measurement_ids))
+    if not ids:
+        return []
+    to_upload: list[tuple[str, str]] = []
+    for device_id, shard_ids in shard_groups(db_path, ids).items():
+        conn = connect_points(db_path, device_id)
+        for table in DATASET_COLUMNS:
+            cur = conn.execute(
+                f"""
+                SELECT DISTINCT measurement_id FROM {table}
+                WHERE measurement_id IN ({','.join('?' * len(shard_ids))}) AND is_delete = 0
+                """,
+                shard_ids,
+            )
+            to_upload += [(r[0], table) for r in cur.fetchall()]
+        conn.close()
+
+    pg_conn = psycopg2.connect(**SERVER_DB_CONFIG)
+    try:
+        _push(db_path, pg_conn.cursor(), ids, to_upload)
+        pg_conn.commit()
+    finally:
+        pg_conn.close()
+    return to_upload
+
+
+def reconcile_to_server(
+    db_path: Path,
+    *,
+    device_ids: list[str] | None = None,
+    measurement_ids: list[str] | None = None,
+    dry_run: bool = False,
+) -> ReconcileReport:
+    """
+    Compare local and server fingerprints and upload only the datasets that differ.
+
+    Datasets that are empty locally are never pushed (the server copy is kept and
+    reported as `remote_only`), so a station with partial point data cannot wipe it.
+    """
+    import psycopg2
+
+    conn = open_sqlite(db_path)
+    cur = conn.cursor()
+    sql = "SELECT id, device_id FROM measurements WHERE is_delete = 0"
+    params: list[str] = []
+    if device_ids is not None:
+        sql += f" AND device_id IN ({','.join('?' * len(device_ids))})"
+        params += device_ids
+    if measurement_ids is not None:
+        sql += f" AND id IN ({','.join('?' * len(measurement_ids))})"
+        params += measurement_ids
+    cur.execute(sql, params)
+    measurement_devices = dict(cur.fetchall())
+    conn.close()
+
+    report = ReconcileReport()
+    if not measurement_devices:
+        return report
+    ids = list(measurement_devices)
+
+    local = local_fingerprints(db_path, ids)
+    local_tree = _build_tree(measurement_devices, local)
+
+    pg_conn = psycopg2.connect(**SERVER_DB_CONFIG)
+    p_cur = pg_conn.cursor()
+    try:
+        p_cur.execute(
+            "SELECT id FROM measurements WHERE id = ANY(%s) AND is_delete = FALSE",
+            (ids,),
+        )
+        on_server = {r[0] for r in p_cur.fetchall()}
+        remote = server_fingerprints(p_cur, ids)
+        remote_tree = _build_tree(
+            {mid: d for mid, d in measurement_devices.items() if mid in on_server},
+            remote,
+        )
+
+        to_upload: list[tuple[str, str]] = []
+        report.devices_checked = len(local_tree)
+        for device_id, (device_hash, local_ms) in local_tree.items():
+            remote_hash, remote_ms = remote_tree.get(device_id, (None, {}))
+            if device_hash == remote_hash:
+                continue
+            report.devices_differing += 1
+            for mid, m_hash in local_ms.items():
+                if remote_ms.get(mid) == m_hash:
+                    continue
+                report.measurements_differing += 1
+                for table in DATASET_COLUMNS:
+                    lh, rh = local[table].get(mid), remote[table].get(mid)
+                    if lh == rh:
+                        continue
+                    if lh is None:
+                        report.remote_only.append((mid, table))
+                    else:
+                        to_upload.append((mid, table))
+
+        if dry_run or not to_upload:
+            # In dry-run mode `uploaded` lists what would be transferred.
+            report.uploaded = to_upload if dry_run else []
+            return report
+
+        # Measurements missing on the server are created in the same transaction.
+        _push(db_path, p_cur, sorted({mid for mid, _ in to_upload}), to_upload)
+        pg_conn.commit()
+        report.uploaded = to_upload
+    finally:
+        p_cur.close()
+        pg_conn.close()
+    return report
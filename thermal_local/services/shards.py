@@ -0,0 +1,185 @@
+"""
+Shard management for the sharded storage layout (see thermal_local.db.shards):
+converting a single-file database, dropping a device's local point data, and
+exporting devices to standalone files. Work on different shards runs in
+parallel, SHARD_WORKERS at a time.
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from thermal_local.config import SHARD_WORKERS
+from thermal_local.db.connection import connect, writer
+from thermal_local.db.migrations import create_point_tables
+from thermal_local.db.points import DATASET_COLUMNS
+from thermal_local.db.shards import (
+    drop_shard_file,
+    ensure_shard,
+    is_sharded,
+    shard_path,
+)
+from thermal_local.services.point_cache import invalidate_points
+
+# Per-measurement catalog rows that only describe local point data.
+_LOCAL_POINT_TABLES = ("local_points", "standard_plot_metrics", "dataset_quality", "cole_cole_fits")
+
+
+@dataclass(frozen=True)
+class ShardExport:
+    device_id: str
+    device_name: str
+    path: Path
+    rows: int
+
+
+def _run_parallel(fn, items: list, workers: int) -> list:
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="shard") as pool:
+        return list(pool.map(fn, items))
+
+
+def _point_columns(table: str) -> str:
+    return ", ".join(("measurement_id", "seq", "id", *DATASET_COLUMNS[table], "is_delete"))
+
+
+# ===== CONVERT =====
+def _copy_device(db_path: Path, device_id: str) -> int:
+    path = shard_path(db_path, device_id)
+    drop_shard_file(path)  # leftover from an interrupted conversion
+    path = ensure_shard(db_path, device_id)
+    conn = connect(path)
+    try:
+        conn.execute("ATTACH DATABASE ? AS catalog", (str(db_path),))
+        rows = 0
+        with conn:
+            for table in DATASET_COLUMNS:
+                cols = _point_columns(table)
+                cur = conn.execute(
+                    f"""
+                    INSERT INTO main.{table} ({cols})
+                    SELECT {cols} FROM catalog.{table}
+                    WHERE measurement_id IN (SELECT id FROM catalog.measurements WHERE device_id = ?)
+                    ORDER BY measurement_id, seq
+                    """,
+                    (device_id,),
+                )
+                rows += cur.rowcount
+        return rows
+    finally:
+        conn.close()
+
+
+def convert_to_shards(db_path: Path, *, workers: int = SHARD_WORKERS) -> dict[str, int]:
+    """
+    Move a single-file database's point data into per-device shards and drop
+    the point tables from it, which makes it the catalog. Returns rows copied
+    per device. Other writers wait until the conversion has finished; run
+    `maintenance` afterwards to give the freed pages back to the file system.
+    """
+    with writer(db_path) as conn:
+        if is_sharded(conn):
+            raise RuntimeError("Database is already sharded")
+        device_ids = [r[0] for r in conn.execute("SELECT id FROM devices ORDER BY id")]
+        # The copies read the last committed state on their own connections;
+        # this transaction keeps other writers out until the tables are dropped.
+        copied = dict(zip(device_ids, _run_parallel(lambda d: _copy_device(db_path, d), device_ids, workers)))
+        for table in DATASET_COLUMNS:
+            conn.execute(f"DROP TABLE {table}")
+        invalidate_points(conn.cursor())
+    return copied
+
+
+# ===== DROP =====
+def drop_device_points(db_path: Path, device_id: str) -> int:
+    """
+    Remove a device's local point data by deleting its shard file. The device
+    and its measurements stay in the catalog; their points are fetched from the
+    server again when next viewed. Returns the number of measurements affected.
+    """
+    with writer(db_path) as conn:
+        if not is_sharded(conn):
+            raise RuntimeError("Dropping a device's point file needs the sharded layout")
+        ids = [r[0] for r in conn.execute("SELECT id FROM measurements WHERE device_id = ?", (device_id,))]
+        marks = ",".join("?" * len(ids))
+        for table in _LOCAL_POINT_TABLES:
+            conn.execute(f"DELETE FROM {table} WHERE measurement_id IN ({marks})", ids)
+        invalidate_points(conn.cursor(), ids)
+        drop_shard_file(shard_path(db_path, device_id))
+    return len(ids)
+
+
+# ===== EXPORT =====
+def _export_device(db_path: Path, out_dir: Path, device_id: str, device_name: str, sharded: bool) -> ShardExport:
+    out = out_dir / f"{device_id}.db"
+    tmp = out_dir / f"{device_id}.db.{os.getpid()}.tmp"
+    tmp.unlink(missing_ok=True)
+    conn = sqlite3.connect(tmp)
+    try:
+        conn.execute("PRAGMA journal_mode = DELETE")  # a single self-contained file
+        create_point_tables(conn, foreign_key=False)
+        conn.execute("ATTACH DATABASE ? AS catalog", (str(db_path),))
+        source = "catalog"
+        if sharded:
+            conn.execute("ATTACH DATABASE ? AS source", (str(shard_path(db_path, device_id)),))
+            source = "source"
+        rows = 0
+        with conn:
+            conn.execute("CREATE TABLE devices AS SELECT * FROM catalog.devices WHERE id = ?", (device_id,))
+            conn.execute(
+                "CREATE TABLE measurements AS SELECT * FROM catalog.measurements WHERE device_id = ?",
+                (device_id,),
+            )
+            for table in DATASET_COLUMNS:
+                cols = _point_columns(table)
+                rows += conn.execute(
+                    f"""
+                    INSERT INTO main.{table} ({cols})
+                    SELECT {cols} FROM {source}.{table}
+                    WHERE measurement_id IN (SELECT id FROM main.measurements)
+                    ORDER BY measurement_id, seq
+                    """
+                ).rowcount
+    finally:
+        conn.close()
+    os.replace(tmp, out)
+    return ShardExport(device_id=device_id, device_name=device_name, path=out, rows=rows)
+
+
+def export_devices(
+    db_path: Path,
+    out_dir: Path,
+    *,
+    device_names: list[str] | None = None,
+    workers: int = SHARD_WORKERS,
+) -> list[ShardExport]:
+    """
+    Write one standalone SQLite file per device (its devices/measurements rows
+    and point tables) to `out_dir/<device_id>.db`, several devices at a time.
+    Works in both layouts; in the sharded one each export reads only its shard.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    conn = connect(db_path)
+    try:
+        sharded = is_sharded(conn)
+        sql = "SELECT id, name FROM devices WHERE is_delete = 0"
+        params: list[str] = []
+        if device_names is not None:
+            sql += f" AND name IN ({','.join('?' * len(device_names))})"
+            params = list(device_names)
+        devices = conn.execute(sql + " ORDER BY name", params).fetchall()
+    finally:
+        conn.close()
+    if sharded:
+        for device_id, _ in devices:
+            ensure_shard(db_path, device_id)  # devices without data get an empty shard
+    return _run_parallel(
+        lambda d: _export_device(db_path, out_dir, d[0], d[1], sharded), devices, workers
+    )
+
@@ -0,0 +1,365 @@
+"""
+Snapshot bootstrap: a new station installs a prebuilt SQLite file instead of
+replaying the whole server as INSERTs on its first sync.
+
+`build_snapshot` (cron job near the server) pulls the server into a scratch
+database, or takes an existing synced one, and copies it with the sqlite3
+backup API into a compacted, indexed, ANALYZEd `snapshot.db` described by
+`snapshot.json` (checksum, row counts, build time).
+
+`install_snapshot` copies that file from a local path or share, verifies the
+checksum and backs it up into the station's database in one step: readers see
+either the old or the new contents, never a mix. `catch_up` then brings the
+station level with the server, pulling only metadata and the datasets whose
+fingerprints changed since the snapshot was built.
+"""
+
+from __future__ import annotations
+
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from thermal_local.config import SERVER_DB_CONFIG, SYNC_MODE
+from thermal_local.db.connection import connect, exclusive, writer
+from thermal_local.db.migrations import migrate_sqlite
+from thermal_local.db.points import DATASET_COLUMNS, append_points_sql
+from thermal_local.db.shards import (
+    drop_shard_file,
+    is_sharded,
+    points_writer,
+    shard_files,
+    shard_groups,
+    stale_shards,
+)
+from thermal_local.services.point_cache import POINT_CACHE, invalidate_points
+from thermal_local.services.reconcile import local_fingerprints, server_fingerprints
+from thermal_local.services.sync import (
+    PULL_TABLES,
+    POINT_TABLES,
+    _normalize_value,
+    pull_params,
+    stamp_deleted_at,
+    sync_server_to_sqlite,
+)
+from thermal_local.services.trace_metrics import refresh_trace_metrics
+
+SNAPSHOT_FILE = "snapshot.db"
+MANIFEST_FILE = "snapshot.json"
+SNAPSHOT_FORMAT = 1
+
+# Per-station state that must not be shipped to other stations.
+_STATION_TABLES = (
+    "fs_materialized",
+    "upload_queue",
+    "raw_files",
+    "raw_blob_refs",
+    "raw_blobs",
+    "maintenance_runs",
+)
+
+_META_TABLES = [t for t in PULL_TABLES if t[0] not in POINT_TABLES]
+
+
+@dataclass
+class SnapshotManifest:
+    format: int
+    created_at: str
+    sha256: str
+    size: int
+    tables: dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class CatchUpReport:
+    metadata_rows: dict[str, int] = field(default_factory=dict)
+    removed: dict[str, int] = field(default_factory=dict)
+    datasets_pulled: list[tuple[str, str]] = field(default_factory=list)
+
+
+def _sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def read_manifest(source_dir: Path) -> SnapshotManifest:
+    return SnapshotManifest(**json.loads((Path(source_dir) / MANIFEST_FILE).read_text()))
+
+
+# ===== BUILD =====
+def build_snapshot(out_dir: Path, *, source_db: Path | None = None) -> SnapshotManifest:
+    """
+    Write `out_dir/snapshot.db` and `out_dir/snapshot.json`.
+
+    Without `source_db` the server is pulled (full mode) into a scratch database
+    first. Both files are replaced atomically, the manifest last.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    scratch = None
+    if source_db is None:
+        scratch = out_dir / "snapshot.build.db"
+        for p in (scratch, scratch.with_name(scratch.name + "-wal"), scratch.with_name(scratch.name + "-shm")):
+            p.unlink(missing_ok=True)
+        migrate_sqlite(scratch, layout="single")
+        sync_server_to_sqlite(scratch, mode="full")
+        source_db = scratch
+
+    tmp = out_dir / f"{SNAPSHOT_FILE}.{os.getpid()}.tmp"
+    tmp.unlink(missing_ok=True)
+    src = connect(source_db, readonly=True)
+    try:
+        if is_sharded(src):
+            raise RuntimeError("Snapshots are built from a single-file database (or from the server)")
+        dst = sqlite3.connect(tmp)
+        src.backup(dst)  # consistent copy even while the source is being written
+    finally:
+        src.close()
+
+    try:
+        dst.isolation_level = None
+        dst.execute("PRAGMA journal_mode = DELETE")  # a single self-contained file
+        for table in _STATION_TABLES:
+            dst.execute(f"DELETE FROM {table}")
+        # Rebuild compacted; stations keep incremental auto-vacuum after install.
+        dst.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        dst.execute("VACUUM")
+        dst.execute("ANALYZE")
+        tables = {
+            table: dst.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table, _, _ in PULL_TABLES
+        }
+    finally:
+        dst.close()
+    if scratch is not None:
+        for p in (scratch, scratch.with_name(scratch.name + "-wal"), scratch.with_name(scratch.name + "-shm")):
+            p.unlink(missing_ok=True)
+
+    manifest = SnapshotManifest(
+        format=SNAPSHOT_FORMAT,
+        created_at=datetime.datetime.utcnow().isoformat(),
+        sha256=_sha256_file(tmp),
+        size=tmp.stat().st_size,
+        tables=tables,
+    )
+    os.replace(tmp, out_dir / SNAPSHOT_FILE)
+    manifest_tmp = out_dir / f"{MANIFEST_FILE}.{os.getpid()}.tmp"
+    manifest_tmp.write_text(json.dumps(asdict(manifest), indent=2))
+    os.replace(manifest_tmp, out_dir / MANIFEST_FILE)
+    return manifest
+
+
+# ===== INSTALL =====
+def station_is_empty(db_path: Path) -> bool:
+    if not Path(db_path).exists():
+        return True
+    conn = connect(db_path)
+    try:
+        row = conn.execute("SELECT 1 FROM measurements LIMIT 1").fetchone()
+    except sqlite3.OperationalError:
+        return True  # not migrated yet
+    finally:
+        conn.close()
+    return row is None
+
+
+def install_snapshot(db_path: Path, source_dir: Path, *, force: bool = False) -> SnapshotManifest:
+    """
+    Replace the local database contents with the snapshot in `source_dir`.
+
+    The file is downloaded next to the database and checked against the manifest,
+    then copied in with the backup API under the writer lock, which swaps the
+    contents in one transaction. Refuses to overwrite a station that already
+    has measurements unless `force` is set (unsynced local work would be lost).
+    The station ends up in the single layout; `cli shard` converts it again.
+    """
+    db_path = Path(db_path)
+    source_dir = Path(source_dir)
+    manifest = read_manifest(source_dir)
+    if manifest.format != SNAPSHOT_FORMAT:
+        raise RuntimeError(f"Unsupported snapshot format {manifest.format}")
+    if not force and not station_is_empty(db_path):
+        raise RuntimeError("Local database already has measurements; use force to replace it")
+
+    download = db_path.with_name(f"{db_path.name}.snapshot.tmp")
+    shutil.copyfile(source_dir / SNAPSHOT_FILE, download)
+    try:
+        if download.stat().st_size != manifest.size or _sha256_file(download) != manifest.sha256:
+            raise RuntimeError("Snapshot checksum mismatch (snapshot may have been rebuilt; retry)")
+        src = sqlite3.connect(download)
+        try:
+            if src.execute("PRAGMA quick_check").fetchone()[0] != "ok":
+                raise RuntimeError("Snapshot failed integrity check")
+            db_path.parent.mkdir(parents=True, exist_ok=True)
+            with exclusive(db_path) as dst:
+                # Move the points version past the local one, so reads cached
+                # before the install can never match a version after it.
+                try:
+                    row = dst.execute("SELECT version FROM data_versions WHERE scope = 'points'").fetchone()
+                except sqlite3.OperationalError:
+                    row = None  # not migrated yet
+                src.backup(dst)
+                dst.execute(
+                    """
+                    INSERT INTO data_versions (scope, version) VALUES ('points', ?1)
+                    ON CONFLICT (scope) DO UPDATE SET version = version + ?1
+                    """,
+                    ((row[0] if row else 0) + 1,),
+                )
+            POINT_CACHE.invalidate()
+            # The snapshot is a single-file database; old shards are now unused.
+            for path in shard_files(db_path).values():
+                drop_shard_file(path)
+        finally:
+            src.close()
+    finally:
+        download.unlink(missing_ok=True)
+
+    # The snapshot may predate the current schema, and is in rollback-journal mode.
+    migrate_sqlite(db_path)
+    return manifest
+
+
+# ===== CATCH-UP =====
+def _upsert_sql(table: str, columns: tuple[str, ...]) -> str:
+    updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c != "id")
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+        f"ON CONFLICT (id) DO UPDATE SET {updates}"
+    )
+
+
+def catch_up(db_path: Path) -> CatchUpReport:
+    """
+    Bring a station (typically a freshly installed snapshot) level with the server.
+
+    Users, devices and measurements are small and are upserted in full; rows gone
+    from the server are removed. Point data is compared by per-dataset fingerprint
+    (see thermal_local.services.reconcile) and only changed datasets are pulled.
+    In scoped mode only measurements already cached locally are compared; the
+    rest are fetched on first view. Everything lands in one local transaction
+    (in the sharded layout: the catalog's, then one per affected shard).
+    """
+    import psycopg2
+
+    report = CatchUpReport()
+    params = pull_params(db_path)
+    pg_conn = psycopg2.connect(**SERVER_DB_CONFIG)
+    try:
+        p_cur = pg_conn.cursor()
+        meta: dict[str, tuple[tuple[str, ...], list[tuple]]] = {}
+        for table, query, columns in _META_TABLES:
+            p_cur.execute(query, params)
+            meta[table] = (columns, [tuple(_normalize_value(v) for v in r) for r in p_cur.fetchall()])
+
+        server_ids = [r[0] for r in meta["measurements"][1]]
+        if SYNC_MODE == "scoped":
+            conn = connect(db_path)
+            cached = {r[0] for r in conn.execute("SELECT measurement_id FROM local_points")}
+            conn.close()
+            compare = [mid for mid in server_ids if mid in cached]
+        else:
+            compare = server_ids
+
+        to_pull: dict[str, list[str]] = {table: [] for table in DATASET_COLUMNS}
+        if compare:
+            local = local_fingerprints(db_path, compare)
+            remote = server_fingerprints(p_cur, compare)
+            for table in DATASET_COLUMNS:
+                to_pull[table] = [mid for mid in compare if local[table].get(mid) != remote[table].get(mid)]
+
+        points: dict[str, tuple[tuple[str, ...], list[tuple]]] = {}
+        for table, query, columns in PULL_TABLES:
+            if table in POINT_TABLES and to_pull[table]:
+                p_cur.execute(query + " AND measurement_id = ANY(%(scope)s)", {**params, "scope": to_pull[table]})
+                points[table] = (columns, [tuple(_normalize_value(v) for v in r) for r in p_cur.fetchall()])
+        p_cur.close()
+    finally:
+        pg_conn.close()
+
+    conn = connect(db_path)
+    sharded = is_sharded(conn)
+    server_set = set(server_ids)
+    removed = [r[0] for r in conn.execute("SELECT id FROM measurements") if r[0] not in server_set]
+    conn.close()
+    # Sharded layout: points of removed measurements are deleted per shard (no cascade).
+    removed_groups = shard_groups(db_path, removed) if sharded else {}
+
+    with writer(db_path) as conn:
+        cur = conn.cursor()
+        for table, (columns, rows) in meta.items():
+            cur.executemany(_upsert_sql(table, columns), rows)
+            report.metadata_rows[table] = len(rows)
+
+        # Bottom-up; measurement deletes cascade to their point rows.
+        cur.execute("CREATE TEMP TABLE catch_up_ids (id TEXT PRIMARY KEY)")
+        for table, (_, rows) in reversed(list(meta.items())):
+            cur.execute("DELETE FROM catch_up_ids")
+            cur.executemany("INSERT INTO catch_up_ids (id) VALUES (?)", [(r[0],) for r in rows])
+            cur.execute(f"DELETE FROM {table} WHERE id NOT IN (SELECT id FROM catch_up_ids)")
+            report.removed[table] = cur.rowcount
+        cur.execute("DROP TABLE catch_up_ids")
+        stamp_deleted_at(cur)
+        invalidate_points(cur)
+        if not sharded:
+            _store_points(conn, points, to_pull, report)
+
+    if sharded:
+        stale = stale_shards(db_path)
+        for path in stale.values():
+            drop_shard_file(path)
+        pulled = list(dict.fromkeys(mid for ids in to_pull.values() for mid in ids))
+        groups = shard_groups(db_path, pulled)
+        for device_id in dict.fromkeys([*groups, *removed_groups]):
+            if device_id in stale:
+                continue
+            with points_writer(db_path, device_id) as conn:
+                for table in DATASET_COLUMNS:
+                    conn.executemany(
+                        f"DELETE FROM {table} WHERE measurement_id = ?",
+                        [(mid,) for mid in removed_groups.get(device_id) or ()],
+                    )
+                _store_points(conn, points, to_pull, report, keep=set(groups.get(device_id) or ()))
+    return report
+
+
+def _store_points(
+    conn: sqlite3.Connection,
+    points: dict[str, tuple[tuple[str, ...], list[tuple]]],
+    to_pull: dict[str, list[str]],
+    report: CatchUpReport,
+    *,
+    keep: set[str] | None = None,
+) -> None:
+    """Replace the pulled datasets (only those of `keep`, if given) on the caller's transaction."""
+    cur = conn.cursor()
+    fetched_at = datetime.datetime.utcnow().isoformat()
+    for table, (columns, rows) in points.items():
+        ids = [mid for mid in to_pull[table] if keep is None or mid in keep]
+        if keep is not None:
+            m = columns.index("measurement_id")
+            rows = [r for r in rows if r[m] in keep]
+        cur.executemany(f"DELETE FROM {table} WHERE measurement_id = ?", [(mid,) for mid in ids])
+        cur.executemany(append_points_sql(table, columns), rows)
+        cur.executemany(
+            "INSERT OR REPLACE INTO local_points (measurement_id, fetched_at) VALUES (?, ?)",
+            [(mid, fetched_at) for mid in ids],
+        )
+        if table == "standard_plot":
+            refresh_trace_metrics(conn, ids)
+        report.datasets_pulled += [(mid, table) for mid in ids]
+
+
+def sync_from_snapshot(db_path: Path, source_dir: Path) -> CatchUpReport:
+    """Install the snapshot on an empty station (if one is published), then catch up."""
+    if station_is_empty(db_path) and (Path(source_dir) / MANIFEST_FILE).exists():
+        install_snapshot(db_path, source_dir)
+    return catch_up(db_path)
@@ -2,14 +2,39 @@ from __future__ import annotations
 
 import datetime
 import json
+import queue
 import sqlite3
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from decimal import Decimal
 from pathlib import Path
 from typing import Any
 
 import pandas as pd
 
-from thermal_local.config import SERVER_DB_CONFIG
+from thermal_local.config import (
+    SERVER_DB_CONFIG,
+    SHARD_WORKERS,
+    SYNC_BATCH_ROWS,
+    SYNC_FETCH_WORKERS,
+    SYNC_MODE,
+    SYNC_QUEUE_BATCHES,
+    SYNC_SCOPE_LAST_DAYS,
+    SYNC_SCOPE_PINNED_DEVICES,
+)
+from thermal_local.db.connection import connect, writer
+from thermal_local.db.points import append_points_sql
+from thermal_local.db.shards import (
+    drop_shard_file,
+    ensure_shard,
+    is_sharded,
+    points_writer,
+    shard_files,
+    shard_groups,
+    shard_of,
+)
+from thermal_local.services.point_cache import invalidate_points
+from thermal_local.services.trace_metrics import refresh_trace_metrics
 
 
 def _normalize_value(v: Any) -> Any:
@@ -22,121 +47,408 @@ def _normalize_value(v: Any) -> Any:
     return v
 
 
-def sync_server_to_sqlite(sqlite_path: Path) -> None:
+# Point rows a station keeps: live ones, and those of soft-deleted measurements
+# (kept until the maintenance job purges them). Soft-deleted rows of live
+# measurements are never read locally and would only be archived again.
+_KEPT_POINTS = """
+    NOT (measurement_id = ANY(%(purged)s))
+    AND (is_delete IS NOT TRUE OR measurement_id IN (SELECT id FROM measurements WHERE is_delete = TRUE))
+"""
+
+# Pulled in foreign-key order: (local table, server query, local columns).
+# Queries take `pull_params()`; more conditions are appended with AND.
+PULL_TABLES: list[tuple[str, str, tuple[str, ...]]] = [
+    (
+        "users",
+        "SELECT id, username, role, active, hashed_password, created_at FROM users",
+        ("id", "username", "role", "active", "hashed_password", "created_at"),
+    ),
+    (
+        "devices",
+        """
+        SELECT id, name, structure_json, experiment_by, created_by, created_at
+        FROM devices
+        """,
+        ("id", "name", "structure_json", "experiment_by", "created_by", "created_at"),
+    ),
+    (
+        "measurements",
+        """
+        SELECT m.id, m.device_id, m.num_order, m.name, m.created_by, m.created_at, m.is_delete
+        FROM measurements m
+        JOIN devices d ON m.device_id = d.id
+        WHERE NOT (m.id = ANY(%(purged)s))
+        """,
+        ("id", "device_id", "num_order", "name", "created_by", "created_at", "is_delete"),
+    ),
+    (
+        "cole_cole",
+        """
+        SELECT id, measurement_id, frequency, resistance, reactance, capacitance, is_delete
+        FROM cole_cole
+        WHERE """ + _KEPT_POINTS,
+        ("id", "measurement_id", "frequency", "resistance", "reactance", "capacitance", "is_delete"),
+    ),
+    (
+        "standard_plot",
+        "SELECT id, measurement_id, time, voltage, is_delete FROM standard_plot WHERE " + _KEPT_POINTS,
+        ("id", "measurement_id", "time", "voltage", "is_delete"),
+    ),
+    (
+        "nanothickness",
+        """
+        SELECT id, measurement_id, pos1, pos2, pos3, pos4, pos5, is_delete
+        FROM nanothickness
+        WHERE """ + _KEPT_POINTS,
+        ("id", "measurement_id", "pos1", "pos2", "pos3", "pos4", "pos5", "is_delete"),
+    ),
+]
+
+POINT_TABLES = ("cole_cole", "standard_plot", "nanothickness")
+
+_DONE = object()
+
+
+def pull_params(sqlite_path: Path) -> dict[str, Any]:
+    """Parameters of the PULL_TABLES queries: the locally purged measurements."""
+    conn = connect(sqlite_path)
+    try:
+        return {"purged": [r[0] for r in conn.execute("SELECT measurement_id FROM purged_measurements")]}
+    finally:
+        conn.close()
+
+
+def stamp_deleted_at(cur: sqlite3.Cursor) -> None:
+    """
+    Give soft-deleted measurements without a deletion time (deleted on another
+    station, or before the column existed) the current time, so retention counts
+    from when this station first saw them deleted.
+    """
+    cur.execute(
+        "UPDATE measurements SET deleted_at = ? WHERE is_delete = 1 AND deleted_at IS NULL",
+        (datetime.datetime.utcnow().isoformat(),),
+    )
+
+
+def _put(q: queue.Queue, item: Any, cancel: threading.Event) -> bool:
+    while not cancel.is_set():
+        try:
+            q.put(item, timeout=0.2)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q: queue.Queue, fetcher: Future) -> Any:
+    """
+    Next item from a fetcher's queue. If the fetcher finished without sending
+    _DONE (it died before reporting), its exception is returned instead of
+    blocking forever while the caller holds the write lock.
+    """
+    while True:
+        try:
+            return q.get(timeout=0.2)
+        except queue.Empty:
+            if fetcher.done():
+                try:
+                    return q.get_nowait()  # queued just before it finished
+                except queue.Empty:
+                    return fetcher.exception() or RuntimeError("Server fetch stopped without finishing")
+
+
+def _fetch_table(
+    table: str,
+    query: str,
+    params: dict[str, Any],
+    out: queue.Queue,
+    cancel: threading.Event,
+) -> None:
+    """Stream one server table into `out` in batches (own connection, server-side cursor)."""
+    try:
+        # Inside the try: any failure must reach the writer, which holds the write lock.
+        import psycopg2
+
+        pg_conn = psycopg2.connect(**SERVER_DB_CONFIG)
+        try:
+            pg_cur = pg_conn.cursor(name=f"pull_{table}")
+            pg_cur.itersize = SYNC_BATCH_ROWS
+            pg_cur.execute(query, params)
+            while not cancel.is_set():
+                rows = pg_cur.fetchmany(SYNC_BATCH_ROWS)
+                if not rows:
+                    break
+                batch = [tuple(_normalize_value(v) for v in r) for r in rows]
+                if not _put(out, batch, cancel):
+                    return
+            pg_cur.close()
+        finally:
+            pg_conn.close()
+    except Exception as e:
+        _put(out, e, cancel)
+        return
+    _put(out, _DONE, cancel)
+
+
+def _scoped_measurement_ids(sqlite_path: Path, username: str | None) -> list[str]:
+    """
+    Measurements whose points are pulled eagerly in scoped mode: the user's own,
+    those on pinned devices, recent ones, and any already cached locally.
+    """
+    import psycopg2
+
+    conn = connect(sqlite_path)
+    cached = [r[0] for r in conn.execute("SELECT measurement_id FROM local_points")]
+    conn.close()
+
+    pg_conn = psycopg2.connect(**SERVER_DB_CONFIG)
+    try:
+        pg_cur = pg_conn.cursor()
+        pg_cur.execute(
+            """
+            SELECT m.id
+            FROM measurements m
+            JOIN devices d ON m.device_id = d.id
+            WHERE m.created_by = %s
+               OR d.name = ANY(%s)
+               OR m.created_at >= NOW() - make_interval(days => %s)
+               OR m.id = ANY(%s)
+            """,
+            (username, list(SYNC_SCOPE_PINNED_DEVICES), SYNC_SCOPE_LAST_DAYS, cached),
+        )
+        ids = [r[0] for r in pg_cur.fetchall()]
+        pg_cur.close()
+    finally:
+        pg_conn.close()
+    return ids
+
+
+def sync_server_to_sqlite(
+    sqlite_path: Path,
+    *,
+    username: str | None = None,
+    mode: str | None = None,
+) -> None:
     """
     One-way sync: PostgreSQL server -> local SQLite.
 
     Note: Clears local tables (bottom-up) before re-inserting.
+
+    Tables are fetched concurrently over several server connections, while this
+    thread is the single SQLite writer, draining bounded per-table queues in
+    foreign-key order. Wall-clock time approaches that of the largest table.
+
+    With SYNC_MODE = "scoped", point data is only pulled for the sync scope (see
+    `_scoped_measurement_ids`); other measurements are fetched on first view by
+    `ensure_points_local`. `mode` overrides SYNC_MODE (snapshot builds are always full).
+
+    In the sharded layout this transaction covers the catalog only; point data
+    is then pulled per device by `_pull_shards`.
     """
-    # Lazy import to avoid hard dependency at import-time (helps dev/test environments).
+    scope = _scoped_measurement_ids(sqlite_path, username) if (mode or SYNC_MODE) == "scoped" else None
+    params = pull_params(sqlite_path)
+    if scope is not None:
+        params["scope"] = scope
+
+    conn = connect(sqlite_path)
+    sharded = is_sharded(conn)
+    conn.close()
+    tables = [t for t in PULL_TABLES if not (sharded and t[0] in POINT_TABLES)]
+
+    queues = {table: queue.Queue(maxsize=SYNC_QUEUE_BATCHES) for table, _, _ in tables}
+    cancel = threading.Event()
+
+    with ThreadPoolExecutor(max_workers=SYNC_FETCH_WORKERS, thread_name_prefix="pull") as pool:
+        # Submitted in FK order, so the table the writer waits on is always running.
+        fetchers = {}
+        for table, query, _ in tables:
+            if scope is not None and table in POINT_TABLES:
+                query += " AND measurement_id = ANY(%(scope)s)"
+            fetchers[table] = pool.submit(_fetch_table, table, query, params, queues[table], cancel)
+
+        try:
+            # Single write transaction: in WAL mode readers keep seeing the previous
+            # snapshot until it commits instead of getting "database is locked".
+            with writer(sqlite_path) as sqlite_conn:
+                sqlite_cur = sqlite_conn.cursor()
+
+                # Deletion times are local; carried over the reload below.
+                sqlite_cur.execute(
+                    "CREATE TEMP TABLE kept_deleted_at AS "
+                    "SELECT id, deleted_at FROM measurements WHERE deleted_at IS NOT NULL"
+                )
+
+                # =========================
+                # CLEAR DATA (BOTTOM-UP)
+                # =========================
+                sqlite_cur.execute("DELETE FROM local_points")
+                for table, _, _ in reversed(tables):
+                    sqlite_cur.execute(f"DELETE FROM {table}")
+                invalidate_points(sqlite_cur)
+
+                for table, _, columns in tables:
+                    if table in POINT_TABLES:
+                        insert_sql = append_points_sql(table, columns)
+                    else:
+                        insert_sql = (
+                            f"INSERT INTO {table} ({', '.join(columns)}) "
+                            f"VALUES ({', '.join('?' * len(columns))})"
+                        )
+                    q = queues[table]
+                    while True:
+                        item = _get(q, fetchers[table])
+                        if item is _DONE:
+                            break
+                        if isinstance(item, BaseException):
+                            raise item
+                        sqlite_cur.executemany(insert_sql, item)
+                    if table == "standard_plot":
+                        refresh_trace_metrics(sqlite_conn)
+
+                sqlite_cur.execute(
+                    """
+                    UPDATE measurements
+                    SET deleted_at = (SELECT deleted_at FROM kept_deleted_at k WHERE k.id = measurements.id)
+                    WHERE is_delete = 1 AND id IN (SELECT id FROM kept_deleted_at)
+                    """
+                )
+                sqlite_cur.execute("DROP TABLE kept_deleted_at")
+                stamp_deleted_at(sqlite_cur)
+
+                # Record which measurements now have their points locally
+                # (per shard once its points are in, in the sharded layout).
+                fetched_at = datetime.datetime.utcnow().isoformat()
+                if sharded:
+                    # Metrics are refreshed per shard; drop those of vanished measurements.
+                    sqlite_cur.execute(
+                        "DELETE FROM standard_plot_metrics WHERE measurement_id NOT IN (SELECT id FROM measurements)"
+                    )
+                elif scope is None:
+                    sqlite_cur.execute(
+                        "INSERT INTO local_points (measurement_id, fetched_at) SELECT id, ? FROM measurements",
+                        (fetched_at,),
+                    )
+                else:
+                    sqlite_cur.executemany(
+                        "INSERT OR IGNORE INTO local_points (measurement_id, fetched_at) VALUES (?, ?)",
+                        [(mid, fetched_at) for mid in scope],
+                    )
+
+                sqlite_cur.close()
+        finally:
+            cancel.set()
+
+    if sharded:
+        _pull_shards(sqlite_path, scope)
+
+
+def _pull_shard(sqlite_path: Path, device_id: str, measurement_ids: list[str]) -> None:
+    """Replace one device's shard contents with its server points, then update the catalog."""
     import psycopg2
 
+    params = {**pull_params(sqlite_path), "scope": measurement_ids}
     pg_conn = psycopg2.connect(**SERVER_DB_CONFIG)
-    pg_cur = pg_conn.cursor()
-
-    sqlite_conn = sqlite3.connect(sqlite_path)
-    sqlite_cur = sqlite_conn.cursor()
-    sqlite_cur.execute("PRAGMA foreign_keys = ON")
-
-    # =========================
-    # CLEAR DATA (BOTTOM-UP)
-    # =========================
-    sqlite_cur.execute("DELETE FROM cole_cole")
-    sqlite_cur.execute("DELETE FROM standard_plot")
-    sqlite_cur.execute("DELETE FROM nanothickness")
-    sqlite_cur.execute("DELETE FROM measurements")
-    sqlite_cur.execute("DELETE FROM devices")
-    sqlite_cur.execute("DELETE FROM users")
-
-    # =========================
-    # USERS
-    # =========================
-    pg_cur.execute("SELECT id, username, role, active, hashed_password, created_at FROM users")
-    sqlite_cur.executemany(
-        "INSERT INTO users (id, username, role, active, hashed_password, created_at) VALUES (?, ?, ?, ?, ?, ?)",
-        [tuple(_normalize_value(v) for v in r) for r in pg_cur.fetchall()],
-    )
+    try:
+        # Only this device's writer lock is held while streaming from the server.
+        with writer(ensure_shard(sqlite_path, device_id)) as shard_conn:
+            for table, query, columns in PULL_TABLES:
+                if table not in POINT_TABLES:
+                    continue
+                shard_conn.execute(f"DELETE FROM {table}")
+                pg_cur = pg_conn.cursor(name=f"pull_{table}")
+                pg_cur.itersize = SYNC_BATCH_ROWS
+                pg_cur.execute(query + " AND measurement_id = ANY(%(scope)s)", params)
+                insert_sql = append_points_sql(table, columns)
+                while rows := pg_cur.fetchmany(SYNC_BATCH_ROWS):
+                    shard_conn.executemany(insert_sql, [tuple(_normalize_value(v) for v in r) for r in rows])
+                pg_cur.close()
+        pg_conn.rollback()
+    finally:
+        pg_conn.close()
 
-    # =========================
-    # DEVICES
-    # =========================
-    pg_cur.execute("""
-        SELECT id, name, structure_json, experiment_by, created_by, created_at
-        FROM devices
-    """)
-    sqlite_cur.executemany(
-        "INSERT INTO devices (id, name, structure_json, experiment_by, created_by, created_at) VALUES (?, ?, ?, ?, ?, ?)",
-        [tuple(_normalize_value(v) for v in r) for r in pg_cur.fetchall()],
-    )
+    with points_writer(sqlite_path, device_id) as conn:
+        refresh_trace_metrics(conn, measurement_ids)
+        invalidate_points(conn.cursor(), measurement_ids)
+        fetched_at = datetime.datetime.utcnow().isoformat()
+        conn.executemany(
+            "INSERT OR REPLACE INTO local_points (measurement_id, fetched_at) VALUES (?, ?)",
+            [(mid, fetched_at) for mid in measurement_ids],
+        )
 
-    # =========================
-    # MEASUREMENTS
-    # =========================
-    pg_cur.execute("""
-        SELECT
-            m.id,
-            m.device_id,
-            m.num_order,
-            m.name,
-            m.created_by,
-            m.created_at
-        FROM measurements m
-        JOIN devices d ON m.device_id = d.id
-    """)
-    rows = [tuple(_normalize_value(v) for v in r) for r in pg_cur.fetchall()]
-    sqlite_cur.executemany("""
-        INSERT INTO measurements
-        (id, device_id, num_order, name, created_by, created_at)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, rows)
-
-    # =========================
-    # COLE-COLE
-    # =========================
-    pg_cur.execute("""
-        SELECT id, measurement_id, frequency, resistance, reactance, capacitance
-        FROM cole_cole
-    """)
-    sqlite_cur.executemany(
-        "INSERT INTO cole_cole (id, measurement_id, frequency, resistance, reactance, capacitance) VALUES (?, ?, ?, ?, ?, ?)",
-        [tuple(_normalize_value(v) for v in r) for r in pg_cur.fetchall()],
-    )
 
-    # =========================
-    # STANDARD PLOT
-    # =========================
-    pg_cur.execute("""
-        SELECT id, measurement_id, time, voltage
-        FROM standard_plot
-    """)
-    sqlite_cur.executemany(
-        "INSERT INTO standard_plot (id, measurement_id, time, voltage) VALUES (?, ?, ?, ?)",
-        [tuple(_normalize_value(v) for v in r) for r in pg_cur.fetchall()],
-    )
+def _pull_shards(sqlite_path: Path, scope: list[str] | None) -> None:
+    """
+    Sharded layout: pull point data device by device, SHARD_WORKERS shards at a
+    time, each over its own server connection and into its own file. Shards of
+    devices with nothing in scope (or gone from the server) are removed.
+    """
+    groups = shard_groups(sqlite_path)
+    if scope is not None:
+        in_scope = set(scope)
+        groups = {d: [mid for mid in ids if mid in in_scope] for d, ids in groups.items()}
+    groups = {d: ids for d, ids in groups.items() if ids}
+    for device_id, path in shard_files(sqlite_path).items():
+        if device_id not in groups:
+            drop_shard_file(path)
 
-    # =========================
-    # NANOTHICKNESS
-    # =========================
-    pg_cur.execute("""
-        SELECT id, measurement_id, pos1, pos2, pos3, pos4, pos5, is_delete
-        FROM nanothickness
-    """)
-    sqlite_cur.executemany(
-        """
-        INSERT INTO nanothickness (
-            id, measurement_id, pos1, pos2, pos3, pos4, pos5, is_delete
-        )
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        [tuple(_normalize_value(v) for v in r) for r in pg_cur.fetchall()],
-    )
+    with ThreadPoolExecutor(max_workers=SHARD_WORKERS, thread_name_prefix="shard") as pool:
+        futures = [pool.submit(_pull_shard, sqlite_path, d, ids) for d, ids in groups.items()]
+        for f in futures:
+            f.result()
+
+
+def ensure_points_local(sqlite_path: Path, measurement_id: str) -> bool:
+    """
+    Fetch a measurement's point data from the server unless it is already local.
+
+    Returns True if a server fetch happened. Fetched points stay cached and are
+    kept in scope by later scoped syncs.
+    """
+    conn = connect(sqlite_path)
+    cached = conn.execute(
+        "SELECT 1 FROM local_points WHERE measurement_id = ?", (measurement_id,)
+    ).fetchone()
+    conn.close()
+    if cached:
+        return False
 
-    sqlite_conn.commit()
+    import psycopg2
 
-    sqlite_cur.close()
-    sqlite_conn.close()
-    pg_cur.close()
-    pg_conn.close()
+    params = {**pull_params(sqlite_path), "measurement_id": measurement_id}
+    batches = {}
+    pg_conn = psycopg2.connect(**SERVER_DB_CONFIG)
+    try:
+        pg_cur = pg_conn.cursor()
+        for table, query, columns in PULL_TABLES:
+            if table not in POINT_TABLES:
+                continue
+            pg_cur.execute(query + " AND measurement_id = %(measurement_id)s", params)
+            batches[table] = (columns, [tuple(_normalize_value(v) for v in r) for r in pg_cur.fetchall()])
+        pg_cur.close()
+    finally:
+        pg_conn.close()
+
+    try:
+        device_id = shard_of(sqlite_path, measurement_id)
+    except RuntimeError:
+        return False  # removed by a sync while we were fetching
+    with points_writer(sqlite_path, device_id) as sqlite_conn:
+        # The measurement may have been removed by a sync while we were fetching.
+        exists = sqlite_conn.execute(
+            "SELECT 1 FROM measurements WHERE id = ?", (measurement_id,)
+        ).fetchone()
+        if not exists:
+            return False
+        for table, (columns, rows) in batches.items():
+            sqlite_conn.execute(f"DELETE FROM {table} WHERE measurement_id = ?", (measurement_id,))
+            sqlite_conn.executemany(append_points_sql(table, columns), rows)
+        refresh_trace_metrics(sqlite_conn, [measurement_id])
+        invalidate_points(sqlite_conn.cursor(), [measurement_id])
+        sqlite_conn.execute(
+            "INSERT OR REPLACE INTO local_points (measurement_id, fetched_at) VALUES (?, ?)",
+            (measurement_id, datetime.datetime.utcnow().isoformat()),
+        )
+    return True
 
 
 def read_cole_cole_csv(path: Path) -> pd.DataFrame:
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import sqlite3
+from datetime import datetime
+
+import numpy as np
+
+from thermal_local.db.arrays import read_grouped
+
+METRIC_COLUMNS = (
+    "n_points",
+    "duration",
+    "v_initial",
+    "v_steady",
+    "rise_time",
+    "time_constant",
+    "drift",
+)
+
+# Fraction of the trace used for the initial level and for steady state / drift.
+HEAD_FRACTION = 0.05
+TAIL_FRACTION = 0.10
+# The step starts at the last sample below this fraction of the transition.
+ONSET_LEVEL = 0.02
+
+
+def _first_crossing(t: np.ndarray, progress: np.ndarray, level: float) -> float:
+    hit = progress >= level
+    if not hit.any():
+        return float("nan")
+    return float(t[np.argmax(hit)])
+
+
+def _onset(t: np.ndarray, progress: np.ndarray, t_end: float) -> float:
+    """Step onset: last sample before `t_end` below ONSET_LEVEL (trace start if none)."""
+    before = (t < t_end) & (progress < ONSET_LEVEL)
+    if not before.any():
+        return float(t[0])
+    return float(t[len(t) - 1 - np.argmax(before[::-1])])
+
+
+def compute_trace_metrics(time, voltage) -> dict[str, float]:
+    """
+    Step-response features of a time/voltage trace.
+
+    - v_initial / v_steady: mean of the first 5% / last 10% of samples
+    - rise_time: 10% -> 90% transition time (rising or falling step)
+    - time_constant: time from the step onset to 63.2% of the transition
+    - drift: least-squares slope (V/s) over the steady-state tail
+    """
+    t = np.asarray(time, dtype=float)
+    v = np.asarray(voltage, dtype=float)
+    ok = np.isfinite(t) & np.isfinite(v)
+    t, v = t[ok], v[ok]
+    order = np.argsort(t, kind="stable")
+    t, v = t[order], v[order]
+
+    n = len(t)
+    out = dict.fromkeys(METRIC_COLUMNS, float("nan"))
+    out["n_points"] = n
+    if n < 3:
+        return out
+
+    head = max(1, int(n * HEAD_FRACTION))
+    tail = max(2, int(n * TAIL_FRACTION))
+    v0 = float(v[:head].mean())
+    v_ss = float(v[-tail:].mean())
+    out["duration"] = float(t[-1] - t[0])
+    out["v_initial"] = v0
+    out["v_steady"] = v_ss
+
+    t_tail = t[-tail:]
+    if np.ptp(t_tail) > 0:
+        out["drift"] = float(np.polyfit(t_tail, v[-tail:], 1)[0])
+
+    step = v_ss - v0
+    if step == 0 or not np.isfinite(step):
+        return out
+
+    progress = (v - v0) / step
+    t10 = _first_crossing(t, progress, 0.1)
+    t90 = _first_crossing(t, progress, 0.9)
+    t63 = _first_crossing(t, progress, 1.0 - np.exp(-1.0))
+    out["rise_time"] = t90 - t10
+    out["time_constant"] = t63 - _onset(t, progress, t63)
+    return out
+
+
+def store_trace_metrics(cur: sqlite3.Cursor, measurement_id: str, time, voltage) -> None:
+    metrics = compute_trace_metrics(time, voltage)
+    cur.execute(
+        f"""
+        INSERT OR REPLACE INTO standard_plot_metrics (
+            measurement_id, {', '.join(METRIC_COLUMNS)}, computed_at
+        )
+        VALUES (?, {', '.join('?' * len(METRIC_COLUMNS))}, ?)
+        """,
+        (
+            measurement_id,
+            *(None if isinstance(metrics[c], float) and np.isnan(metrics[c]) else metrics[c]
+              for c in METRIC_COLUMNS),
+            datetime.utcnow().isoformat(),
+        ),
+    )
+
+
+def refresh_trace_metrics(conn: sqlite3.Connection, measurement_ids: list[str] | None = None) -> int:
+    """
+    Recompute metrics from the stored points (all measurements, or the given ones).
+
+    Used after a server sync lands new data; the caller owns the transaction.
+    """
+    cur = conn.cursor()
+    if measurement_ids is not None:
+        cur.execute(
+            f"DELETE FROM standard_plot_metrics WHERE measurement_id IN ({','.join('?' * len(measurement_ids))})",
+            tuple(measurement_ids),
+        )
+    else:
+        cur.execute("DELETE FROM standard_plot_metrics")
+
+    ids, offsets, points = read_grouped(
+        conn, "standard_plot", ("time", "voltage"), measurement_ids=measurement_ids
+    )
+    # Rows are ordered by measurement_id, so each trace is one contiguous slice.
+    for i, measurement_id in enumerate(ids):
+        block = points[offsets[i]:offsets[i + 1]]
+        store_trace_metrics(cur, measurement_id, block[:, 0], block[:, 1])
+    return len(ids)
@@ -0,0 +1,159 @@
+"""
+Ingest validation for point datasets, run on whole columns at once between the
+CSV readers and the inserts.
+
+Every row gets a bit mask of the problems found in it (NaN, inf, instrument
+overflow sentinel, out of plausible range, breaks the sweep/time order). Inf
+and sentinel values are replaced by NaN, so they are stored as NULL and never
+reach the server or later analyses. The mask (zlib-compressed, one byte per
+row in insert order) and a per-column summary are kept in `dataset_quality`.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import zlib
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from thermal_local.config import SENTINEL_MIN_ABS, VALIDATION_RANGES
+from thermal_local.db.connection import connect
+
+NAN = 1
+INF = 2
+SENTINEL = 4
+OUT_OF_RANGE = 8
+NON_MONOTONIC = 16
+
+FLAG_NAMES = {
+    NAN: "nan",
+    INF: "inf",
+    SENTINEL: "sentinel",
+    OUT_OF_RANGE: "out_of_range",
+    NON_MONOTONIC: "non_monotonic",
+}
+
+# Ordering column -> required direction (+1 ascending, 0 either way as long as
+# it is consistent; frequency sweeps run in both directions).
+MONOTONIC_COLUMNS = {"frequency": 0, "time": 1}
+
+
+@dataclass
+class DatasetQuality:
+    values: np.ndarray  # inf/sentinels replaced by NaN
+    mask: np.ndarray  # uint8 flags per row
+    summary: dict
+
+    @property
+    def n_flagged(self) -> int:
+        return int(np.count_nonzero(self.mask))
+
+
+def validate_dataset(values, columns: tuple[str, ...]) -> DatasetQuality:
+    x = np.array(values, dtype=np.float64).reshape(-1, len(columns))
+    n = len(x)
+
+    nan = np.isnan(x)
+    inf = np.isinf(x)
+    sentinel = (np.abs(x) >= SENTINEL_MIN_ABS) & ~inf
+    x[inf | sentinel] = np.nan
+
+    bounds = [VALIDATION_RANGES.get(c, (None, None)) for c in columns]
+    lo = np.array([-np.inf if b[0] is None else b[0] for b in bounds])
+    hi = np.array([np.inf if b[1] is None else b[1] for b in bounds])
+    out_of_range = (x < lo) | (x > hi)  # NaN compares False
+
+    cell = (
+        nan * np.uint8(NAN)
+        | inf * np.uint8(INF)
+        | sentinel * np.uint8(SENTINEL)
+        | out_of_range * np.uint8(OUT_OF_RANGE)
+    ).astype(np.uint8)
+    mask = np.bitwise_or.reduce(cell, axis=1) if n else np.zeros(0, dtype=np.uint8)
+
+    summary: dict = {
+        "n_rows": n,
+        "columns": {
+            c: {
+                "nan": int(nan[:, j].sum()),
+                "inf": int(inf[:, j].sum()),
+                "sentinel": int(sentinel[:, j].sum()),
+                "out_of_range": int(out_of_range[:, j].sum()),
+            }
+            for j, c in enumerate(columns)
+        },
+    }
+
+    for j, c in enumerate(columns):
+        if c not in MONOTONIC_COLUMNS:
+            continue
+        idx = np.flatnonzero(~np.isnan(x[:, j]))
+        d = np.diff(x[idx, j])
+        direction = MONOTONIC_COLUMNS[c] or (1 if np.sign(d).sum() >= 0 else -1)
+        breaks = idx[1:][d * direction <= 0]  # repeats count as breaks too
+        mask[breaks] |= NON_MONOTONIC
+        summary["order"] = {
+            "column": c,
+            "direction": "ascending" if direction > 0 else "descending",
+            "breaks": int(len(breaks)),
+        }
+
+    summary["n_flagged"] = int(np.count_nonzero(mask))
+    summary["flags"] = int(np.bitwise_or.reduce(mask)) if n else 0
+    return DatasetQuality(values=x, mask=mask, summary=summary)
+
+
+def store_quality(cur: sqlite3.Cursor, measurement_id: str, kind: str, quality: DatasetQuality) -> None:
+    cur.execute(
+        """
+        INSERT OR REPLACE INTO dataset_quality (
+            measurement_id, kind, n_rows, n_flagged, flags, mask, summary, checked_at
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            measurement_id,
+            kind,
+            quality.summary["n_rows"],
+            quality.n_flagged,
+            quality.summary["flags"],
+            zlib.compress(quality.mask.tobytes()) if quality.n_flagged else None,
+            json.dumps(quality.summary),
+            datetime.utcnow().isoformat(),
+        ),
+    )
+
+
+def get_dataset_quality(db_path: Path, measurement_id: str, kind: str) -> tuple[dict, np.ndarray] | None:
+    """(summary, per-row mask) recorded at ingest, or None if never validated."""
+    conn = connect(db_path)
+    row = conn.execute(
+        "SELECT n_rows, mask, summary FROM dataset_quality WHERE measurement_id = ? AND kind = ?",
+        (measurement_id, kind),
+    ).fetchone()
+    conn.close()
+    if row is None:
+        return None
+    n_rows, mask, summary = row
+    if mask is None:
+        return json.loads(summary), np.zeros(n_rows, dtype=np.uint8)
+    return json.loads(summary), np.frombuffer(zlib.decompress(mask), dtype=np.uint8)
+
+
+def describe_quality(summary: dict) -> str | None:
+    """One-line description of the problems in a summary, or None if clean."""
+    if not summary.get("n_flagged"):
+        return None
+    parts = []
+    for col, counts in summary["columns"].items():
+        found = [f"{n} {name.replace('_', ' ')}" for name, n in counts.items() if n]
+        if found:
+            parts.append(f"{col}: {', '.join(found)}")
+    order = summary.get("order")
+    if order and order["breaks"]:
+        parts.append(f"{order['column']} not {order['direction']} at {order['breaks']} row(s)")
+    return f"{summary['n_flagged']} of {summary['n_rows']} row(s) flagged — " + "; ".join(parts)
@@ -0,0 +1,260 @@
+"""
+Watch-folder ingest: instrument CSVs dropped into
+`root/devices/<device>/<measurement>/` are imported without anyone opening the UI.
+
+The folder tree is polled (portable, works on network shares where inotify
+does not). A file is ingested only after its size and mtime have stayed the
+same for WATCH_SETTLE_S seconds, so half-written files are never read. Ready
+files are parsed through the blob store, written in one transaction per poll
+and queued in `upload_queue`; the queue is pushed to the server afterwards and
+retried later if the server is unreachable.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+
+from thermal_local.config import WATCH_POLL_INTERVAL_S, WATCH_SETTLE_S
+from thermal_local.db.connection import writer
+from thermal_local.db.shards import points_writer, shard_groups
+from thermal_local.services.blobs import load_raw_csv
+from thermal_local.services.measurements import open_sqlite, replace_dataset
+
+log = logging.getLogger(__name__)
+
+# Checked in order: "_" would also match the other two prefixes.
+FILE_PREFIXES = (("CC_", "cole_cole"), ("nn_", "nanothickness"), ("_", "standard_plot"))
+
+UPLOAD_RETRY_S = 60.0
+
+
+@dataclass
+class IngestReport:
+    ingested: list[tuple[str, str, str]] = field(default_factory=list)  # (path, measurement_id, kind)
+    skipped: list[tuple[str, str]] = field(default_factory=list)  # (path, reason)
+    uploaded: int = 0
+
+
+def file_kind(name: str) -> str | None:
+    if not name.lower().endswith(".csv"):
+        return None
+    for prefix, kind in FILE_PREFIXES:
+        if name.startswith(prefix):
+            return kind
+    return None
+
+
+def _scan(devices_root: Path) -> dict[tuple[str, str, str], tuple[Path, os.stat_result]]:
+    """Newest file per (device, measurement, kind), via scandir (one stat per file)."""
+    found: dict[tuple[str, str, str], tuple[Path, os.stat_result]] = {}
+    try:
+        devices = [e for e in os.scandir(devices_root) if e.is_dir()]
+    except FileNotFoundError:
+        return found
+    for device in devices:
+        for meas in os.scandir(device.path):
+            if not meas.is_dir():
+                continue
+            for entry in os.scandir(meas.path):
+                kind = file_kind(entry.name)
+                if kind is None or not entry.is_file():
+                    continue
+                st = entry.stat()
+                key = (device.name, meas.name, kind)
+                if key not in found or st.st_mtime_ns > found[key][1].st_mtime_ns:
+                    found[key] = (Path(entry.path), st)
+    return found
+
+
+class FolderWatcher:
+    def __init__(
+        self,
+        db_path: Path,
+        blobs_dir: Path,
+        devices_root: Path,
+        *,
+        poll_interval: float = WATCH_POLL_INTERVAL_S,
+        settle: float = WATCH_SETTLE_S,
+    ) -> None:
+        self.db_path = db_path
+        self.blobs_dir = blobs_dir
+        self.devices_root = devices_root
+        self.poll_interval = poll_interval
+        self.settle = settle
+        self._last_seen: dict[Path, tuple[int, int]] = {}  # previous poll's (size, mtime_ns)
+        self._handled: dict[Path, tuple[int, int]] = {}  # ingested/rejected at this (size, mtime_ns)
+        self._unmatched: dict[Path, tuple[int, int]] = {}  # reported as unmatched at this (size, mtime_ns)
+        self._next_upload = 0.0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    # ===== POLLING =====
+    def _ready(self) -> list[tuple[str, str, str, Path]]:
+        now = time.time()
+        ready = []
+        last_seen: dict[Path, tuple[int, int]] = {}
+        for (device, meas, kind), (path, st) in _scan(self.devices_root).items():
+            sig = (st.st_size, st.st_mtime_ns)
+            last_seen[path] = sig
+            if self._handled.get(path) == sig:
+                continue
+            # Debounce: unchanged since the previous poll and quiet for `settle` seconds.
+            if self._last_seen.get(path) != sig or now - st.st_mtime < self.settle:
+                continue
+            ready.append((device, meas, kind, path))
+        self._last_seen = last_seen
+        return ready
+
+    def _measurement_ids(self, pairs: set[tuple[str, str]]) -> dict[tuple[str, str], str]:
+        if not pairs:
+            return {}
+        conn = open_sqlite(self.db_path)
+        devices = sorted({d for d, _ in pairs})
+        rows = conn.execute(
+            f"""
+            SELECT d.name, m.name, m.id
+            FROM measurements m
+            JOIN devices d ON d.id = m.device_id
+            WHERE d.name IN ({','.join('?' * len(devices))}) AND m.is_delete = 0
+            """,
+            devices,
+        ).fetchall()
+        conn.close()
+        return {(d, m): mid for d, m, mid in rows if (d, m) in pairs}
+
+    def _current_refs(self, keys: list[tuple[str, str]]) -> dict[tuple[str, str], str]:
+        conn = open_sqlite(self.db_path)
+        refs = {}
+        for mid, kind in keys:
+            row = conn.execute(
+                "SELECT sha256 FROM raw_blob_refs WHERE measurement_id = ? AND kind = ?",
+                (mid, kind),
+            ).fetchone()
+            if row:
+                refs[(mid, kind)] = row[0]
+        conn.close()
+        return refs
+
+    def poll_once(self) -> IngestReport:
+        report = IngestReport()
+        ready = self._ready()
+        ids = self._measurement_ids({(d, m) for d, m, _, _ in ready})
+        refs = self._current_refs([(ids[(d, m)], k) for d, m, k, _ in ready if (d, m) in ids])
+
+        batch = []
+        for device, meas, kind, path in ready:
+            sig = self._last_seen[path]
+            mid = ids.get((device, meas))
+            if mid is None:
+                # Folder without a measurement row yet (not created or synced in):
+                # retried every poll, reported once per file version.
+                if self._unmatched.get(path) != sig:
+                    self._unmatched[path] = sig
+                    report.skipped.append((str(path), "no matching measurement"))
+                continue
+            self._unmatched.pop(path, None)
+            try:
+                df, sha256 = load_raw_csv(self.db_path, self.blobs_dir, path, kind)
+            except Exception as e:
+                self._handled[path] = sig
+                report.skipped.append((str(path), str(e)))
+                log.warning("Skipping %s: %s", path, e)
+                continue
+            self._handled[path] = sig
+            if refs.get((mid, kind)) == sha256:
+                continue  # already imported from identical content
+            batch.append((path, mid, kind, sha256, df))
+
+        if batch:
+            now = datetime.utcnow().isoformat()
+            # One transaction per shard (a single one in the single layout).
+            for device_id, ids in shard_groups(self.db_path, [b[1] for b in batch]).items():
+                self._ingest(device_id, [b for b in batch if ids is None or b[1] in ids], now, report)
+            log.info("Ingested %d file(s)", len(batch))
+
+        if batch or time.monotonic() >= self._next_upload:
+            report.uploaded = self.drain_upload_queue()
+        return report
+
+    def _ingest(self, device_id: str | None, batch: list, now: str, report: IngestReport) -> None:
+        with points_writer(self.db_path, device_id) as conn:
+            cur = conn.cursor()
+            for path, mid, kind, sha256, df in batch:
+                replace_dataset(cur, mid, kind, df.to_numpy())
+                cur.execute(
+                    """
+                    INSERT OR REPLACE INTO raw_blob_refs (measurement_id, kind, sha256, source_name, added_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    (mid, kind, sha256, path.name, now),
+                )
+                cur.execute(
+                    """
+                    INSERT INTO upload_queue (measurement_id, queued_at) VALUES (?, ?)
+                    ON CONFLICT (measurement_id) DO UPDATE SET queued_at = excluded.queued_at
+                    """,
+                    (mid, now),
+                )
+                report.ingested.append((str(path), mid, kind))
+
+    # ===== SERVER UPLOAD =====
+    def drain_upload_queue(self) -> int:
+        """Push queued measurements in one server transaction; returns how many were uploaded."""
+        from thermal_local.services.reconcile import upload_measurements
+
+        conn = open_sqlite(self.db_path)
+        queued = conn.execute("SELECT measurement_id, queued_at FROM upload_queue").fetchall()
+        conn.close()
+        if not queued:
+            self._next_upload = time.monotonic() + UPLOAD_RETRY_S
+            return 0
+        ids = [mid for mid, _ in queued]
+        try:
+            upload_measurements(self.db_path, ids)
+        except Exception as e:
+            log.warning("Upload of %d queued measurement(s) failed: %s", len(ids), e)
+            with writer(self.db_path) as w:
+                w.execute(
+                    f"""
+                    UPDATE upload_queue SET attempts = attempts + 1, last_error = ?
+                    WHERE measurement_id IN ({','.join('?' * len(ids))})
+                    """,
+                    [str(e), *ids],
+                )
+            self._next_upload = time.monotonic() + UPLOAD_RETRY_S
+            return 0
+        # Entries re-queued while uploading (newer queued_at) stay in the queue.
+        with writer(self.db_path) as w:
+            w.executemany(
+                "DELETE FROM upload_queue WHERE measurement_id = ? AND queued_at = ?",
+                queued,
+            )
+        self._next_upload = time.monotonic() + UPLOAD_RETRY_S
+        return len(ids)
+
+    # ===== THREAD =====
+    def run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+            except Exception:
+                log.exception("Watch-folder poll failed")
+            self._stop.wait(self.poll_interval)
+
+    def start(self) -> "FolderWatcher":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, name="folder-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
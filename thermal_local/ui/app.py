@@ -1,44 +1,167 @@
 from __future__ import annotations
 
+import functools
+import logging
+import math
 import os
 import platform
+import statistics
 import subprocess
+import time
+from collections import deque
 from pathlib import Path
 
 import pandas as pd
 import streamlit as st
 
+from thermal_local.config import CHART_MAX_POINTS, SNAPSHOT_SOURCE, TABLE_PAGE_ROWS, WATCH_ENABLED
 from thermal_local.db.migrations import migrate_sqlite
 from thermal_local.paths import get_paths
 from thermal_local.utils import Hasher
+from thermal_local.services.analysis import get_cole_cole_fit, impedance_derived
+from thermal_local.services.blobs import add_reference, load_raw_csv
+from thermal_local.services.maintenance import start_scheduled_maintenance
+from thermal_local.services.reconcile import reconcile_to_server, upload_measurements
 from thermal_local.services.measurements import (
+    DATASET_COLUMNS,
     LocalContext,
     create_measurement,
-    get_device_id,
+    find_devices_by_structure,
+    get_all_device_structures,
+    get_data_version,
     get_device_structure,
-    get_devices_and_measurements,
+    get_measurements_for_devices,
     get_measurement_id,
+    get_trace_metrics,
     has_cole_cole,
     has_standard_plot,
     has_nanothickness,
     is_measurement_owner,
+    list_measurements,
+    open_sqlite,
     insert_cole_cole,
     insert_standard_plot,
     insert_nanothickness,
-    read_cole_cole_from_db,
-    read_nanothickness_from_db,
-    read_standard_plot_from_db,
+    column_extent,
+    read_frequency_band,
+    read_nanothickness_arrays,
+    read_page,
+    read_time_window,
+    search_devices,
+    seq_span,
     soft_delete_measurement,
+    soft_delete_measurements,
     sync_db_to_filesystem,
     sync_measurement_to_server,
-    sync_sqlite_to_server,
 )
+from thermal_local.services.point_cache import POINT_CACHE
+from thermal_local.services.snapshot import sync_from_snapshot
 from thermal_local.services.sync import (
-    read_cole_cole_csv,
-    read_standard_plot_csv,
-    read_nanothickness_csv,
+    ensure_points_local,
     sync_server_to_sqlite,
 )
+from thermal_local.services.validation import describe_quality, get_dataset_quality, validate_dataset
+from thermal_local.services.watcher import FolderWatcher
+
+
+SIDEBAR_PAGE_SIZE = 20
+STRUCTURES_PAGE_SIZE = 50
+# Per-part run times kept per session for the Performance panel.
+TIMING_SAMPLES = 50
+
+log = logging.getLogger(__name__)
+
+
+@st.cache_resource(show_spinner=False)
+def _folder_watcher(db_path: str, blobs_dir: str, devices_root: str) -> FolderWatcher:
+    # One watcher thread per server process, shared by all sessions.
+    return FolderWatcher(Path(db_path), Path(blobs_dir), Path(devices_root)).start()
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _cached_all_structures(db_path: str, generation: int) -> pd.DataFrame:
+    # `generation` is only part of the cache key: it changes whenever devices change.
+    return get_all_device_structures(Path(db_path))
+
+
+def _parse_structure_query(text: str) -> dict[str, object]:
+    criteria: dict[str, object] = {}
+    for part in text.split(","):
+        if not part.strip():
+            continue
+        if "=" not in part:
+            raise ValueError(f"Expected key=value, got: {part.strip()}")
+        key, value = (p.strip() for p in part.split("=", 1))
+        if ".." in value:
+            lo, hi = (v.strip() for v in value.split("..", 1))
+            try:
+                criteria[key] = (float(lo) if lo else None, float(hi) if hi else None)
+            except ValueError:
+                raise ValueError(f"Invalid range for {key}: {value}") from None
+            continue
+        try:
+            criteria[key] = float(value)
+        except ValueError:
+            criteria[key] = value
+    return criteria
+
+
+def _quality_warning(db_path: Path, measurement_id: str, kind: str, df: pd.DataFrame, *, from_csv: bool) -> None:
+    """Warn about flagged rows: checked on the fly for CSVs, as recorded at ingest for DB data."""
+    cols = DATASET_COLUMNS[kind]
+    if from_csv:
+        summary = validate_dataset(df[list(cols)].to_numpy(dtype=float), cols).summary
+    else:
+        stored = get_dataset_quality(db_path, measurement_id, kind)
+        summary = stored[0] if stored else None
+    message = describe_quality(summary) if summary else None
+    if message:
+        st.warning(f"⚠️ Data quality: {message}")
+
+
+def _range_slider(
+    label: str,
+    extent: tuple[float, float] | None,
+    *,
+    key: str,
+    log: bool = False,
+) -> tuple[float, float]:
+    """Select a (lo, hi) range within a column's extent; `log` uses a log10 slider."""
+    if extent is None or not all(map(math.isfinite, extent)) or not extent[1] > extent[0]:
+        return -math.inf, math.inf
+    lo, hi = float(extent[0]), float(extent[1])
+    # The extent is part of the key, so new data resets the selection.
+    key = f"{key}_{lo:g}_{hi:g}"
+    if log and lo > 0:
+        a = math.floor(math.log10(lo) * 100) / 100
+        b = math.ceil(math.log10(hi) * 100) / 100
+        a, b = st.slider(label, a, b, (a, b), step=0.01, format="10^%.2f", key=key)
+        return 10 ** a, 10 ** b
+    return st.slider(label, lo, hi, (lo, hi), step=(hi - lo) / 1000, key=key)
+
+
+def _thin(df: pd.DataFrame) -> pd.DataFrame:
+    """Every k-th row, so a chart never gets more than CHART_MAX_POINTS points."""
+    step = -(-len(df) // CHART_MAX_POINTS)
+    return df.iloc[::step] if step > 1 else df
+
+
+def _table_page(db_path: Path, measurement_id: str, table: str, df: pd.DataFrame | None) -> pd.DataFrame:
+    """One TABLE_PAGE_ROWS page of a dataset: read from the DB, or sliced from a loaded CSV (`df`)."""
+    if df is None:
+        first, last = seq_span(db_path, measurement_id, table)
+        n_rows = last - first + 1
+    else:
+        n_rows = len(df)
+    n_pages = max(1, math.ceil(n_rows / TABLE_PAGE_ROWS))
+    page = st.number_input(
+        f"Page (of {n_pages})", min_value=1, max_value=n_pages, value=1, step=1,
+        key=f"page_{table}_{measurement_id}_{n_rows}",
+    )
+    offset = (int(page) - 1) * TABLE_PAGE_ROWS
+    if df is None:
+        return pd.DataFrame(read_page(db_path, measurement_id, table, offset, TABLE_PAGE_ROWS))
+    return df.iloc[offset:offset + TABLE_PAGE_ROWS]
 
 
 def _open_folder(path: Path) -> None:
@@ -68,6 +191,11 @@ def _init_session_state() -> None:
         "cole_cole_synced": False,
         "standard_plot_synced": False,
         "nanothickness_synced": False,
+        "sidebar_page": 0,
+        "sidebar_last_search": "",
+        "structures_grid_nonce": 0,
+        "bulk_grid_nonce": 0,
+        "orphaned_folders": [],
     }
     for k, v in defaults.items():
         if k not in st.session_state:
@@ -85,414 +213,606 @@ def _bootstrap(paths) -> None:
     # Always run migrations to upgrade existing DBs too.
     migrate_sqlite(paths.db_path)
 
-    # Always sync from server on start (keeps behavior of original app.py)
-    sync_server_to_sqlite(paths.db_path)
+    # Always sync from server on start (keeps behavior of original app.py).
+    # With a snapshot source, an empty station installs the snapshot and then
+    # every sync is an incremental catch-up.
+    if SNAPSHOT_SOURCE:
+        sync_from_snapshot(paths.db_path, Path(SNAPSHOT_SOURCE))
+    else:
+        sync_server_to_sqlite(paths.db_path)
+
+    # Archive/compact in the background if the last run is overdue.
+    start_scheduled_maintenance(paths.db_path, paths.archive_path)
+
+    if WATCH_ENABLED:
+        _folder_watcher(str(paths.db_path), str(paths.blobs_dir), str(paths.data_root / "devices"))
 
     st.session_state.bootstrapped = True
     st.session_state.logged_in = False
     st.session_state.username = None
 
 
-def run() -> None:
-    st.set_page_config(
-        page_title="Thermal Data Local Measurement Manager",
-        layout="wide",
-    )
+def _timed(part: str):
+    """Record how long each run of a UI part takes (last TIMING_SAMPLES, per session)."""
 
-    paths = get_paths()
-    ctx = LocalContext(db_path=paths.db_path, data_root=paths.data_root)
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - t0
+                timings = st.session_state.setdefault("ui_timings", {})
+                timings.setdefault(part, deque(maxlen=TIMING_SAMPLES)).append(elapsed)
+                log.debug("%s ran in %.1f ms", part, elapsed * 1000)
 
-    _init_session_state()
-    _bootstrap(paths)
+        return wrapper
 
-    # ================================
-    # HEADER
-    # ================================
-    col_title, col_user = st.columns([8, 2])
-    with col_title:
-        st.title("Thermal Data Local Measurement Manager")
-    with col_user:
-        if st.session_state.get("logged_in"):
-            col_u1, col_u2 = st.columns([3, 2])
-            with col_u1:
-                st.markdown(
-                    f"""
-                    <div style="text-align: right; padding-top: 8px;">
-                        👤 <b>{st.session_state.username}</b>
-                    </div>
-                    """,
-                    unsafe_allow_html=True,
-                )
-            with col_u2:
-                if st.button("Logout"):
-                    st.session_state.logged_in = False
-                    st.session_state.username = None
-                    st.session_state.selected_measurement = None
-                    st.session_state.selected_view = None
-                    st.session_state.selected_device_structure = None
-                    st.session_state.show_all_structures = False
-                    st.rerun()
+    return decorate
 
-    # ================================
-    # LOGIN
-    # ================================
-    if not st.session_state.logged_in:
 
-        col_left, col_center, col_right = st.columns([1, 1, 1])
+def _navigate(**state) -> None:
+    """Widget callback: update the selection and rerun only the main panel."""
+    for key, value in state.items():
+        st.session_state[key] = value
+    st.rerun("main")
 
-        with col_center:
-            # with st.container():
-            #     st.markdown(
-            #         """
-            #         <div style="
-            #             background-color: #f9f9f9;
-            #             padding: 30px;
-            #             border-radius: 12px;
-            #             box-shadow: 0 4px 12px rgba(0,0,0,0.1);
-            #         ">
-            #         """,
-            #         unsafe_allow_html=True,
-            #     )
-                st.markdown("## 🔐 Login")
 
-                username = st.text_input("Username")
-                password = st.text_input("Password", type="password")
+def _open_structure_row(grid_key: str, devices: list[str]) -> None:
+    rows = st.session_state[grid_key].selection.rows
+    if not rows:
+        return
+    _navigate(
+        selected_device_structure=devices[rows[0]],
+        selected_measurement=None,
+        selected_view=None,
+        show_all_structures=False,
+        structures_grid_nonce=st.session_state.structures_grid_nonce + 1,
+    )
 
-                if st.button("Login", use_container_width=True):
-                    if not username or not password:
-                        st.error("Username and password are required")
-                    else:
-                        import sqlite3
-                        conn = sqlite3.connect(paths.db_path)
-                        cur = conn.cursor()
-                        cur.execute(
-                            """
-                            SELECT username, active, hashed_password
-                            FROM users
-                            WHERE username = ?
-                            """,
-                            (username,),
-                        )
-                        row = cur.fetchone()
-                        conn.close()
 
-                        if not row:
-                            st.error("❌ User not found")
-                        elif not row[1]:
-                            st.error("🚫 User is inactive")
-                        else:
-                            db_username, active, db_hashed_password = row
-                            if not Hasher.verify_password(password, db_hashed_password):
-                                st.error("❌ Invalid password")
-                            else:
-                                st.session_state.logged_in = True
-                                st.session_state.username = db_username
-                                sync_server_to_sqlite(paths.db_path)
-                                sync_db_to_filesystem(ctx)
-                                st.success(f"Logged in as {db_username}")
-                                st.rerun()
+def _show_all_structures() -> None:
+    _navigate(
+        show_all_structures=True,
+        selected_device_structure=None,
+        selected_measurement=None,
+        selected_view=None,
+    )
 
-                st.markdown("</div>", unsafe_allow_html=True)
 
-        st.stop()
+def _logout() -> None:
+    st.session_state.logged_in = False
+    st.session_state.username = None
+    st.session_state.selected_measurement = None
+    st.session_state.selected_view = None
+    st.session_state.selected_device_structure = None
+    st.session_state.show_all_structures = False
+
+
+# ================================
+# MAIN PANEL
+# ================================
+# The main panel and the sidebar device browser are fragments: a widget inside
+# one reruns only that fragment. Navigation buttons update session state from
+# their callback and rerun the "main" fragment alone; only writes that change
+# what both show (deletes, new measurements, trace metrics) rerun the app.
+@st.fragment
+@_timed("structures")
+def _structures_panel(paths) -> None:
+    st.subheader("All Device Structures")
+
+    all_df = _cached_all_structures(
+        str(paths.db_path), get_data_version(paths.db_path, "devices")
+    )
 
-    # ================================
-    # MAIN PANEL
-    # ================================
-    if st.session_state.show_all_structures:
-        st.subheader("All Device Structures")
-
-        import sqlite3
-
-        conn = sqlite3.connect(paths.db_path)
-        cur = conn.cursor()
-        cur.execute(
-            """
-            SELECT name, structure_json
-            FROM devices
-            WHERE structure_json IS NOT NULL
-            ORDER BY name
-            """
-        )
-        rows = cur.fetchall()
-        conn.close()
+    if all_df.empty:
+        st.info("No device structures defined")
+    else:
+        col_f1, col_f2 = st.columns(2)
+        with col_f1:
+            text_filter = st.text_input("Filter (any column contains)", key="structures_filter")
+        with col_f2:
+            structure_query = st.text_input(
+                "Structure query (e.g. material=Fe3O4, thickness=20, thickness=10..30)",
+                key="structures_query",
+            )
 
-        if not rows:
-            st.info("No device structures defined")
+        view_df = all_df
+        if structure_query.strip():
+            try:
+                matches = find_devices_by_structure(
+                    paths.db_path, _parse_structure_query(structure_query)
+                )
+                view_df = view_df[view_df["device"].isin(matches)]
+            except ValueError as e:
+                st.error(str(e))
+        if text_filter.strip():
+            hit = view_df.astype(str).apply(
+                lambda col: col.str.contains(text_filter, case=False, regex=False)
+            ).any(axis=1)
+            view_df = view_df[hit]
+
+        n_pages = max(1, math.ceil(len(view_df) / STRUCTURES_PAGE_SIZE))
+        page = 1
+        if n_pages > 1:
+            page = st.number_input("Page", min_value=1, max_value=n_pages, value=1, key="structures_page")
+        page_df = view_df.iloc[(page - 1) * STRUCTURES_PAGE_SIZE : page * STRUCTURES_PAGE_SIZE]
+
+        # Selecting a row opens that device; the nonce resets the selection afterwards.
+        grid_key = f"structures_grid_{st.session_state.structures_grid_nonce}"
+        st.dataframe(
+            page_df,
+            use_container_width=True,
+            hide_index=True,
+            on_select=functools.partial(_open_structure_row, grid_key, page_df["device"].tolist()),
+            selection_mode="single-row",
+            key=grid_key,
+        )
+        st.caption(f"{len(view_df)} of {len(all_df)} devices · select a row to open the device")
+
+
+@st.fragment
+@_timed("device")
+def _device_panel(paths, device_name: str) -> None:
+    st.subheader("Device Structure")
+    st.caption(f"Device: {device_name}")
+    structure = get_device_structure(paths.db_path, device_name)
+
+    if structure is None:
+        st.warning("No structure defined for this device yet")
+    elif "_error" in structure:
+        st.error("Device structure JSON is invalid")
+        st.code(structure, language="json")
+    else:
+        if not isinstance(structure, dict):
+            st.error("Device structure must be a JSON object (dict)")
         else:
-            import json
-
-            for device_name, structure_json in rows:
-                col_left, col_right = st.columns([1, 7])
-                with col_left:
-                    if st.button(
-                        f"📁 {device_name}",
-                        key=f"select_from_all_{device_name}",
-                        use_container_width=True,
-                    ):
-                        st.session_state.selected_device_structure = device_name
-                        st.session_state.selected_measurement = None
-                        st.session_state.selected_view = None
-                        st.session_state.show_all_structures = False
-                        st.rerun()
-                with col_right:
+            df = pd.DataFrame([structure])
+            st.dataframe(df, use_container_width=True)
+
+    metrics = get_trace_metrics(paths.db_path, [device_name])
+    if not metrics.empty:
+        st.markdown("#### Thermal trace metrics")
+        st.dataframe(metrics.drop(columns=["device"]), use_container_width=True, hide_index=True)
+
+    # ===== BULK ACTIONS =====
+    # Selected measurements are handled as one set: one local transaction and
+    # one server transaction per action.
+    bulk_df = list_measurements(paths.db_path, device_name)
+    if not bulk_df.empty:
+        st.markdown("#### Measurements")
+        bulk_event = st.dataframe(
+            bulk_df.drop(columns=["id"]),
+            use_container_width=True,
+            hide_index=True,
+            on_select="rerun",
+            selection_mode="multi-row",
+            key=f"bulk_grid_{device_name}_{st.session_state.bulk_grid_nonce}",
+        )
+        selected = bulk_df.iloc[bulk_event.selection.rows]
+        selected_ids = selected["id"].tolist()
+        col_b1, col_b2, col_b3 = st.columns(3)
+        with col_b1:
+            if st.button(f"🗑 Delete selected ({len(selected_ids)})", disabled=not selected_ids):
+                try:
+                    soft_delete_measurements(
+                        paths.db_path, selected_ids, username=st.session_state.username
+                    )
+                    st.session_state.bulk_grid_nonce += 1
+                    st.rerun()
+                except PermissionError:
+                    st.error("You can only delete measurements you created")
+                except Exception as e:
+                    st.error(f"Error deleting measurements: {e}")
+        with col_b2:
+            if st.button(f"⬆ Upload selected ({len(selected_ids)})", disabled=not selected_ids):
+                if (selected["created_by"] != st.session_state.username).any():
+                    st.error("Only the creator of a measurement can upload it")
+                else:
                     try:
-                        structure = json.loads(structure_json) if structure_json else None
-                        if isinstance(structure, dict):
-                            df = pd.DataFrame([structure])
-                            st.dataframe(df, use_container_width=True)
-                        else:
-                            st.warning("Structure must be a JSON object")
-                    except json.JSONDecodeError:
-                        st.error("Invalid JSON in structure_json")
-                st.divider()
+                        uploaded = upload_measurements(paths.db_path, selected_ids)
+                        st.success(f"Uploaded {len(uploaded)} dataset(s)")
+                    except Exception as e:
+                        st.error(f"Upload failed: {e}")
+        with col_b3:
+            if st.button(f"🔄 Re-sync selected ({len(selected_ids)})", disabled=not selected_ids):
+                if (selected["created_by"] != st.session_state.username).any():
+                    st.error("Only the creator of a measurement can sync it")
+                else:
+                    try:
+                        report = reconcile_to_server(paths.db_path, measurement_ids=selected_ids)
+                        st.success(
+                            f"{report.measurements_differing} measurement(s) differed · "
+                            f"uploaded {len(report.uploaded)} dataset(s)"
+                        )
+                    except Exception as e:
+                        st.error(f"Re-sync failed: {e}")
+    st.divider()
+
+
+def _cole_cole_view(paths, measurement_id: str, base: Path, can_edit: bool) -> None:
+    col_h, col_r = st.columns([8, 2])
+    with col_h:
+        st.markdown("### Cole–Cole")
+    with col_r:
+        # Reruns this view only: the folder and the DB are read again.
+        st.button("Refresh", key=f"refresh_cc_{measurement_id}", use_container_width=True)
+
+    if st.session_state.get("cole_cole_synced"):
+        st.success("Cole–Cole synced")
+        st.session_state.cole_cole_synced = False
+
+    uploaded_cc = st.file_uploader(
+        "Browse Cole–Cole CSV",
+        type=["csv"],
+        key=f"upload_cc_{measurement_id}",
+    )
 
-    if st.session_state.selected_device_structure:
-        device_name = st.session_state.selected_device_structure
-        st.subheader("Device Structure")
-        st.caption(f"Device: {device_name}")
-        structure = get_device_structure(paths.db_path, device_name)
-
-        if structure is None:
-            st.warning("No structure defined for this device yet")
-        elif "_error" in structure:
-            st.error("Device structure JSON is invalid")
-            st.code(structure, language="json")
+    cc_files = list(base.glob("CC_*.csv"))
+    df = None
+    raw_sha = raw_name = None
+    in_db = has_cole_cole(paths.db_path, measurement_id)
+    from_db = uploaded_cc is None and not cc_files and in_db
+
+    if uploaded_cc is not None:
+        try:
+            df, raw_sha = load_raw_csv(paths.db_path, paths.blobs_dir, uploaded_cc, "cole_cole")
+            raw_name = uploaded_cc.name
+            st.info("Loaded Cole–Cole data from uploaded CSV.")
+        except ValueError as e:
+            st.error(str(e))
+        except Exception as e:
+            st.error(f"Error reading uploaded Cole–Cole CSV: {e}")
+    elif cc_files:
+        try:
+            df, raw_sha = load_raw_csv(paths.db_path, paths.blobs_dir, cc_files[0], "cole_cole")
+            raw_name = cc_files[0].name
+            st.info(f"Loaded Cole–Cole data from local CSV: {cc_files[0].name}")
+        except ValueError as e:
+            st.error(str(e))
+        except Exception as e:
+            st.error(f"Error reading Cole–Cole CSV: {e}")
+    elif from_db:
+        st.info("Loaded Cole–Cole data from DB (no local CSV).")
+    else:
+        st.info("No Cole–Cole data available. Add a CSV to the folder or use Browse, then click Refresh.")
+
+    if from_db or (df is not None and not df.empty):
+        _quality_warning(paths.db_path, measurement_id, "cole_cole", df, from_csv=not from_db)
+        # Only the selected band (chart) and one page (table) are read from the DB.
+        if from_db:
+            extent = column_extent(paths.db_path, measurement_id, "cole_cole", "frequency")
+        else:
+            extent = (df["frequency"].min(), df["frequency"].max())
+        f_lo, f_hi = _range_slider(
+            "Frequency band (Hz)", extent, key=f"cc_band_{measurement_id}", log=True
+        )
+        if from_db:
+            band = pd.DataFrame(read_frequency_band(
+                paths.db_path, measurement_id, f_lo, f_hi, max_points=CHART_MAX_POINTS
+            ))
         else:
-            if not isinstance(structure, dict):
-                st.error("Device structure must be a JSON object (dict)")
+            band = _thin(df[df["frequency"].between(f_lo, f_hi)].sort_values("frequency"))
+        # Nyquist plot: -X against R.
+        st.scatter_chart(
+            pd.DataFrame({"R (Ω)": band["resistance"], "-X (Ω)": -band["reactance"]}),
+            x="R (Ω)",
+            y="-X (Ω)",
+        )
+        st.dataframe(impedance_derived(
+            _table_page(paths.db_path, measurement_id, "cole_cole", None if from_db else df)
+        ))
+
+        if in_db:
+            fit = get_cole_cole_fit(paths.db_path, measurement_id)
+            if fit:
+                c1, c2, c3, c4, c5 = st.columns(5)
+                c1.metric("R0 (Ω)", f"{fit['r0']:.4g}")
+                c2.metric("R∞ (Ω)", f"{fit['r_inf']:.4g}")
+                c3.metric("τ (s)", f"{fit['tau']:.4g}")
+                c4.metric("α", f"{fit['alpha']:.3f}")
+                c5.metric("RMSE (rel.)", f"{fit['rmse']:.3g}")
+
+        if not in_db:
+            if not can_edit:
+                st.info("Cole–Cole data not in DB. Only the creator of this measurement can add or sync data.")
             else:
-                df = pd.DataFrame([structure])
-                st.dataframe(df, use_container_width=True)
-        st.divider()
-
-    if st.session_state.selected_measurement and st.session_state.selected_view:
-        device_name, measurement_name = st.session_state.selected_measurement
-        view = st.session_state.selected_view
-
-        st.subheader(f"📄 {measurement_name}")
-        st.caption(f"Device: {device_name}")
+                if st.button("Add Cole–Cole to DB"):
+                    insert_cole_cole(paths.db_path, measurement_id, df)
+                    if raw_sha:
+                        add_reference(paths.db_path, measurement_id, "cole_cole", raw_sha, raw_name)
+                    reconcile_to_server(paths.db_path, measurement_ids=[measurement_id])
+                    st.session_state.cole_cole_synced = True
+                    st.rerun(scope="fragment")
+        else:
+            if not can_edit:
+                st.info("Cole–Cole data already in DB. Only the creator of this measurement can sync again.")
+            else:
+                st.info("Cole–Cole data already in DB, do you want to sync again?")
+                if st.button("Sync again"):
+                    if not from_db:
+                        insert_cole_cole(paths.db_path, measurement_id, df)
+                        if raw_sha:
+                            add_reference(paths.db_path, measurement_id, "cole_cole", raw_sha, raw_name)
+                    reconcile_to_server(paths.db_path, measurement_ids=[measurement_id])
+                    st.session_state.cole_cole_synced = True
+                    st.rerun(scope="fragment")
+
+
+def _standard_plot_view(paths, measurement_id: str, base: Path, can_edit: bool) -> None:
+    col_h, col_r = st.columns([8, 2])
+    with col_h:
+        st.markdown("### Standard Plot")
+    with col_r:
+        # Reruns this view only: the folder and the DB are read again.
+        st.button("Refresh", key=f"refresh_sp_{measurement_id}", use_container_width=True)
+
+    if st.session_state.get("standard_plot_synced"):
+        st.success("Standard Plot synced")
+        st.session_state.standard_plot_synced = False
+
+    uploaded_sp = st.file_uploader(
+        "Browse Standard Plot CSV",
+        type=["csv"],
+        key=f"upload_sp_{measurement_id}",
+    )
 
-        base = paths.data_root / "devices" / device_name / measurement_name
-        measurement_id = get_measurement_id(paths.db_path, device_name, measurement_name)
-        can_edit = is_measurement_owner(paths.db_path, measurement_id, st.session_state.username)
+    sp_files = list(base.glob("_*.csv"))
+    df = None
+    raw_sha = raw_name = None
+    in_db = has_standard_plot(paths.db_path, measurement_id)
+    from_db = uploaded_sp is None and not sp_files and in_db
+
+    if uploaded_sp is not None:
+        try:
+            df, raw_sha = load_raw_csv(paths.db_path, paths.blobs_dir, uploaded_sp, "standard_plot")
+            raw_name = uploaded_sp.name
+            st.info("Loaded Standard Plot data from uploaded CSV.")
+        except ValueError as e:
+            st.error(str(e))
+        except Exception as e:
+            st.error(f"Error reading uploaded Standard Plot CSV: {e}")
+    elif sp_files:
+        try:
+            df, raw_sha = load_raw_csv(paths.db_path, paths.blobs_dir, sp_files[0], "standard_plot")
+            raw_name = sp_files[0].name
+            st.info(f"Loaded Standard Plot data from local CSV: {sp_files[0].name}")
+        except ValueError as e:
+            st.error(str(e))
+        except Exception as e:
+            st.error(f"Error reading Standard Plot CSV: {e}")
+    elif from_db:
+        st.info("Loaded Standard Plot data from DB (no local CSV).")
+    else:
+        st.info("No Standard Plot data available. Add a CSV to the folder or use Browse, then click Refresh.")
+
+    if from_db or (df is not None and not df.empty):
+        _quality_warning(paths.db_path, measurement_id, "standard_plot", df, from_csv=not from_db)
+        # Only the selected window (chart) and one page (table) are read from the DB.
+        if from_db:
+            extent = column_extent(paths.db_path, measurement_id, "standard_plot", "time")
+        else:
+            extent = (df["time"].min(), df["time"].max())
+        t0, t1 = _range_slider("Time window (s)", extent, key=f"sp_window_{measurement_id}")
+        if from_db:
+            window = pd.DataFrame(read_time_window(
+                paths.db_path, measurement_id, t0, t1, max_points=CHART_MAX_POINTS
+            ))
+        else:
+            window = _thin(df[df["time"].between(t0, t1)].sort_values("time"))
+        st.line_chart(window, x="time", y="voltage")
+        st.dataframe(_table_page(paths.db_path, measurement_id, "standard_plot", None if from_db else df))
 
-        if view == "cole_cole":
-            col_h, col_r = st.columns([8, 2])
-            with col_h:
-                st.markdown("### Cole–Cole")
-            with col_r:
-                if st.button("Refresh", key=f"refresh_cc_{measurement_id}", use_container_width=True):
+        if not in_db:
+            if not can_edit:
+                st.info("Standard Plot data not in DB. Only the creator of this measurement can add or sync data.")
+            else:
+                if st.button("Add Standard Plot to DB"):
+                    insert_standard_plot(paths.db_path, measurement_id, df)
+                    if raw_sha:
+                        add_reference(paths.db_path, measurement_id, "standard_plot", raw_sha, raw_name)
+                    reconcile_to_server(paths.db_path, measurement_ids=[measurement_id])
+                    st.session_state.standard_plot_synced = True
+                    # Full rerun: the device panel and sidebar show the trace metrics.
+                    st.rerun()
+        else:
+            if not can_edit:
+                st.info("Standard Plot data already in DB. Only the creator of this measurement can sync again.")
+            else:
+                st.info("Standard Plot data already in DB, do you want to sync again?")
+                if st.button("Sync again"):
+                    if not from_db:
+                        insert_standard_plot(paths.db_path, measurement_id, df)
+                        if raw_sha:
+                            add_reference(paths.db_path, measurement_id, "standard_plot", raw_sha, raw_name)
+                    reconcile_to_server(paths.db_path, measurement_ids=[measurement_id])
+                    st.session_state.standard_plot_synced = True
+                    # Full rerun: the device panel and sidebar show the trace metrics.
                     st.rerun()
 
-            if st.session_state.get("cole_cole_synced"):
-                st.success("Cole–Cole synced")
-                st.session_state.cole_cole_synced = False
-
-            uploaded_cc = st.file_uploader(
-                "Browse Cole–Cole CSV",
-                type=["csv"],
-                key=f"upload_cc_{measurement_id}",
-            )
 
-            cc_files = list(base.glob("CC_*.csv"))
-            df = None
+def _nanothickness_view(paths, measurement_id: str, base: Path, can_edit: bool) -> None:
+    col_h, col_r = st.columns([8, 2])
+    with col_h:
+        st.markdown("### Nanothickness")
+    with col_r:
+        # Reruns this view only: the folder and the DB are read again.
+        st.button("Refresh", key=f"refresh_nano_{measurement_id}", use_container_width=True)
 
-            if uploaded_cc is not None:
-                try:
-                    df = read_cole_cole_csv(uploaded_cc)
-                    st.info("Loaded Cole–Cole data from uploaded CSV.")
-                except ValueError as e:
-                    st.error(str(e))
-                except Exception as e:
-                    st.error(f"Error reading uploaded Cole–Cole CSV: {e}")
-            elif cc_files:
-                try:
-                    df = read_cole_cole_csv(cc_files[0])
-                    st.info(f"Loaded Cole–Cole data from local CSV: {cc_files[0].name}")
-                except ValueError as e:
-                    st.error(str(e))
-                except Exception as e:
-                    st.error(f"Error reading Cole–Cole CSV: {e}")
-            else:
-                df = read_cole_cole_from_db(paths.db_path, measurement_id)
-                if not df.empty:
-                    st.info("Loaded Cole–Cole data from DB (no local CSV).")
-                else:
-                    st.info("No Cole–Cole data available. Add a CSV to the folder or use Browse, then click Refresh.")
+    if st.session_state.get("nanothickness_synced"):
+        st.success("Nanothickness synced")
+        st.session_state.nanothickness_synced = False
 
-            if df is not None and not df.empty:
-                st.dataframe(df)
+    uploaded_nano = st.file_uploader(
+        "Browse Nanothickness CSV",
+        type=["csv"],
+        key=f"upload_nano_{measurement_id}",
+    )
 
-                if not has_cole_cole(paths.db_path, measurement_id):
-                    if not can_edit:
-                        st.info("Cole–Cole data not in DB. Only the creator of this measurement can add or sync data.")
-                    else:
-                        if st.button("Add Cole–Cole to DB"):
-                            insert_cole_cole(paths.db_path, measurement_id, df)
-                            sync_sqlite_to_server(paths.db_path, measurement_id)
-                            st.session_state.cole_cole_synced = True
-                            st.rerun()
-                else:
-                    if not can_edit:
-                        st.info("Cole–Cole data already in DB. Only the creator of this measurement can sync again.")
-                    else:
-                        st.info("Cole–Cole data already in DB, do you want to sync again?")
-                        if st.button("Sync again"):
-                            insert_cole_cole(paths.db_path, measurement_id, df)
-                            sync_sqlite_to_server(paths.db_path, measurement_id)
-                            st.session_state.cole_cole_synced = True
-                            st.rerun()
+    nano_files = list(base.glob("nn_*.csv"))
+    df = None
+    raw_sha = raw_name = None
+
+    if uploaded_nano is not None:
+        try:
+            df, raw_sha = load_raw_csv(paths.db_path, paths.blobs_dir, uploaded_nano, "nanothickness")
+            raw_name = uploaded_nano.name
+            st.info("Loaded Nanothickness data from uploaded CSV.")
+        except ValueError as e:
+            st.error(str(e))
+        except Exception as e:
+            st.error(f"Error reading uploaded Nanothickness CSV: {e}")
+    elif nano_files:
+        try:
+            df, raw_sha = load_raw_csv(paths.db_path, paths.blobs_dir, nano_files[0], "nanothickness")
+            raw_name = nano_files[0].name
+            st.info(f"Loaded Nanothickness data from local CSV: {nano_files[0].name}")
+        except ValueError as e:
+            st.error(str(e))
+        except Exception as e:
+            st.error(f"Error reading Nanothickness CSV: {e}")
+    else:
+        df = pd.DataFrame(read_nanothickness_arrays(paths.db_path, measurement_id))
+        if not df.empty:
+            st.info("Loaded Nanothickness data from DB (no local CSV).")
+        else:
+            st.info("No Nanothickness data available. Add a CSV to the folder or use Browse, then click Refresh.")
 
-        elif view == "standard_plot":
-            col_h, col_r = st.columns([8, 2])
-            with col_h:
-                st.markdown("### Standard Plot")
-            with col_r:
-                if st.button("Refresh", key=f"refresh_sp_{measurement_id}", use_container_width=True):
-                    st.rerun()
+    if df is not None and not df.empty:
+        _quality_warning(paths.db_path, measurement_id, "nanothickness", df, from_csv=raw_sha is not None)
+        st.dataframe(df)
 
-            if st.session_state.get("standard_plot_synced"):
-                st.success("Standard Plot synced")
-                st.session_state.standard_plot_synced = False
+        if not has_nanothickness(paths.db_path, measurement_id):
+            if not can_edit:
+                st.info("Nanothickness data not in DB. Only the creator of this measurement can add or sync data.")
+            else:
+                if st.button("Add Nanothickness to DB"):
+                    insert_nanothickness(paths.db_path, measurement_id, df)
+                    if raw_sha:
+                        add_reference(paths.db_path, measurement_id, "nanothickness", raw_sha, raw_name)
+                    reconcile_to_server(paths.db_path, measurement_ids=[measurement_id])
+                    st.session_state.nanothickness_synced = True
+                    st.rerun(scope="fragment")
+        else:
+            if not can_edit:
+                st.info("Nanothickness data already in DB. Only the creator of this measurement can sync again.")
+            else:
+                st.info("Nanothickness data already in DB, do you want to sync again?")
+                if st.button("Sync again"):
+                    insert_nanothickness(paths.db_path, measurement_id, df)
+                    if raw_sha:
+                        add_reference(paths.db_path, measurement_id, "nanothickness", raw_sha, raw_name)
+                    reconcile_to_server(paths.db_path, measurement_ids=[measurement_id])
+                    st.session_state.nanothickness_synced = True
+                    st.rerun(scope="fragment")
+
+
+@st.fragment
+@_timed("measurement")
+def _measurement_view(paths, device_name: str, measurement_name: str, view: str) -> None:
+    st.subheader(f"📄 {measurement_name}")
+    st.caption(f"Device: {device_name}")
+
+    base = paths.data_root / "devices" / device_name / measurement_name
+    measurement_id = get_measurement_id(paths.db_path, device_name, measurement_name)
+    try:
+        ensure_points_local(paths.db_path, measurement_id)
+    except Exception as e:
+        st.warning(f"Could not fetch this measurement's data from the server: {e}")
+    can_edit = is_measurement_owner(paths.db_path, measurement_id, st.session_state.username)
 
-            uploaded_sp = st.file_uploader(
-                "Browse Standard Plot CSV",
-                type=["csv"],
-                key=f"upload_sp_{measurement_id}",
-            )
+    if view == "cole_cole":
+        _cole_cole_view(paths, measurement_id, base, can_edit)
+    elif view == "standard_plot":
+        _standard_plot_view(paths, measurement_id, base, can_edit)
+    elif view == "nanothickness":
+        _nanothickness_view(paths, measurement_id, base, can_edit)
 
-            sp_files = list(base.glob("_*.csv"))
-            df = None
 
-            if uploaded_sp is not None:
-                try:
-                    df = read_standard_plot_csv(uploaded_sp)
-                    st.info("Loaded Standard Plot data from uploaded CSV.")
-                except ValueError as e:
-                    st.error(str(e))
-                except Exception as e:
-                    st.error(f"Error reading uploaded Standard Plot CSV: {e}")
-            elif sp_files:
-                try:
-                    df = read_standard_plot_csv(sp_files[0])
-                    st.info(f"Loaded Standard Plot data from local CSV: {sp_files[0].name}")
-                except ValueError as e:
-                    st.error(str(e))
-                except Exception as e:
-                    st.error(f"Error reading Standard Plot CSV: {e}")
-            else:
-                df = read_standard_plot_from_db(paths.db_path, measurement_id)
-                if not df.empty:
-                    st.info("Loaded Standard Plot data from DB (no local CSV).")
-                else:
-                    st.info("No Standard Plot data available. Add a CSV to the folder or use Browse, then click Refresh.")
+@st.fragment(key="main")
+@_timed("main")
+def _main_panel(paths) -> None:
+    if st.session_state.show_all_structures:
+        _structures_panel(paths)
 
-            if df is not None and not df.empty:
-                st.dataframe(df)
+    if st.session_state.selected_device_structure:
+        _device_panel(paths, st.session_state.selected_device_structure)
 
-                if not has_standard_plot(paths.db_path, measurement_id):
-                    if not can_edit:
-                        st.info("Standard Plot data not in DB. Only the creator of this measurement can add or sync data.")
-                    else:
-                        if st.button("Add Standard Plot to DB"):
-                            insert_standard_plot(paths.db_path, measurement_id, df)
-                            sync_sqlite_to_server(paths.db_path, measurement_id)
-                            st.session_state.standard_plot_synced = True
-                            st.rerun()
-                else:
-                    if not can_edit:
-                        st.info("Standard Plot data already in DB. Only the creator of this measurement can sync again.")
-                    else:
-                        st.info("Standard Plot data already in DB, do you want to sync again?")
-                        if st.button("Sync again"):
-                            insert_standard_plot(paths.db_path, measurement_id, df)
-                            sync_sqlite_to_server(paths.db_path, measurement_id)
-                            st.session_state.standard_plot_synced = True
-                            st.rerun()
+    if st.session_state.selected_measurement and st.session_state.selected_view:
+        device_name, measurement_name = st.session_state.selected_measurement
+        _measurement_view(paths, device_name, measurement_name, st.session_state.selected_view)
+
+
+# ================================
+# SIDEBAR
+# ================================
+def _show_measurement(device_name: str, measurement_name: str, view: str) -> None:
+    _navigate(
+        selected_device_structure=device_name,
+        selected_measurement=(device_name, measurement_name),
+        selected_view=view,
+        show_all_structures=False,
+    )
 
-        elif view == "nanothickness":
-            col_h, col_r = st.columns([8, 2])
-            with col_h:
-                st.markdown("### Nanothickness")
-            with col_r:
-                if st.button("Refresh", key=f"refresh_nano_{measurement_id}", use_container_width=True):
-                    st.rerun()
 
-            if st.session_state.get("nanothickness_synced"):
-                st.success("Nanothickness synced")
-                st.session_state.nanothickness_synced = False
+def _set_creating(device_name: str | None) -> None:
+    st.session_state.creating_measurement_for = device_name
 
-            uploaded_nano = st.file_uploader(
-                "Browse Nanothickness CSV",
-                type=["csv"],
-                key=f"upload_nano_{measurement_id}",
-            )
 
-            nano_files = list(base.glob("nn_*.csv"))
-            df = None
+def _turn_sidebar_page(delta: int) -> None:
+    st.session_state.sidebar_page += delta
 
-            if uploaded_nano is not None:
-                try:
-                    df = read_nanothickness_csv(uploaded_nano)
-                    st.info("Loaded Nanothickness data from uploaded CSV.")
-                except ValueError as e:
-                    st.error(str(e))
-                except Exception as e:
-                    st.error(f"Error reading uploaded Nanothickness CSV: {e}")
-            elif nano_files:
-                try:
-                    df = read_nanothickness_csv(nano_files[0])
-                    st.info(f"Loaded Nanothickness data from local CSV: {nano_files[0].name}")
-                except ValueError as e:
-                    st.error(str(e))
-                except Exception as e:
-                    st.error(f"Error reading Nanothickness CSV: {e}")
-            else:
-                df = read_nanothickness_from_db(paths.db_path, measurement_id)
-                if not df.empty:
-                    st.info("Loaded Nanothickness data from DB (no local CSV).")
-                else:
-                    st.info("No Nanothickness data available. Add a CSV to the folder or use Browse, then click Refresh.")
 
-            if df is not None and not df.empty:
-                st.dataframe(df)
+@st.fragment(key="browser")
+@_timed("sidebar")
+def _device_browser(paths, ctx: LocalContext) -> None:
+    st.title("📂 Devices and Measurements")
 
-                if not has_nanothickness(paths.db_path, measurement_id):
-                    if not can_edit:
-                        st.info("Nanothickness data not in DB. Only the creator of this measurement can add or sync data.")
-                    else:
-                        if st.button("Add Nanothickness to DB"):
-                            insert_nanothickness(paths.db_path, measurement_id, df)
-                            sync_sqlite_to_server(paths.db_path, measurement_id)
-                            st.session_state.nanothickness_synced = True
-                            st.rerun()
-                else:
-                    if not can_edit:
-                        st.info("Nanothickness data already in DB. Only the creator of this measurement can sync again.")
-                    else:
-                        st.info("Nanothickness data already in DB, do you want to sync again?")
-                        if st.button("Sync again"):
-                            insert_nanothickness(paths.db_path, measurement_id, df)
-                            sync_sqlite_to_server(paths.db_path, measurement_id)
-                            st.session_state.nanothickness_synced = True
-                            st.rerun()
-    # ================================
-    # SIDEBAR
-    # ================================
-    st.sidebar.title("📂 Devices Structures")
+    # Only one page of devices is queried and rendered per run, so rerun cost
+    # does not grow with the number of devices in the lab.
+    search = st.text_input("🔍 Search devices / measurements", key="sidebar_search")
+    if search != st.session_state.sidebar_last_search:
+        st.session_state.sidebar_last_search = search
+        st.session_state.sidebar_page = 0
 
-    if st.sidebar.button("Show all device structures", use_container_width=True):
-        st.session_state.show_all_structures = True
-        st.session_state.selected_device_structure = None
-        st.session_state.selected_measurement = None
-        st.session_state.selected_view = None
-        st.rerun()
+    def query_page():
+        return search_devices(
+            paths.db_path,
+            search,
+            offset=st.session_state.sidebar_page * SIDEBAR_PAGE_SIZE,
+            limit=SIDEBAR_PAGE_SIZE,
+        )
 
-    st.sidebar.title("📂 Devices and Measurements")
+    page_devices, total = query_page()
+    n_pages = max(1, math.ceil(total / SIDEBAR_PAGE_SIZE))
+    if st.session_state.sidebar_page >= n_pages:
+        st.session_state.sidebar_page = n_pages - 1
+        page_devices, total = query_page()
+
+    col_prev, col_info, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        st.button(
+            "◀", key="sidebar_prev", disabled=st.session_state.sidebar_page == 0,
+            on_click=_turn_sidebar_page, args=(-1,),
+        )
+    with col_info:
+        st.caption(f"Page {st.session_state.sidebar_page + 1}/{n_pages} · {total} devices")
+    with col_next:
+        st.button(
+            "▶", key="sidebar_next", disabled=st.session_state.sidebar_page >= n_pages - 1,
+            on_click=_turn_sidebar_page, args=(1,),
+        )
 
-    devices = get_devices_and_measurements(paths.db_path)
-    for device_name, measurements in devices.items():
+    devices = get_measurements_for_devices(paths.db_path, [d_id for d_id, _ in page_devices])
+    trace_metrics = {
+        (r.device, r.measurement): r
+        for r in get_trace_metrics(
+            paths.db_path, [name for _, name in page_devices]
+        ).itertuples(index=False)
+    }
+    for device_id, device_name in page_devices:
+        measurements = devices[device_id]
         is_selected = False
         if st.session_state.selected_device_structure == device_name:
             is_selected = True
@@ -502,11 +822,15 @@ def run() -> None:
         ):
             is_selected = True
 
-        with st.sidebar.expander(f"📁 {device_name}", expanded=is_selected):
-            device_id = get_device_id(paths.db_path, device_name)
-
+        with st.expander(f"📁 {device_name}", expanded=is_selected):
             for m in measurements:
                 with st.expander(f"📁 {m}"):
+                    tm = trace_metrics.get((device_name, m))
+                    if tm is not None:
+                        st.caption(
+                            f"τ {tm.time_constant:.3g} s · rise {tm.rise_time:.3g} s · "
+                            f"V∞ {tm.v_steady:.4g} V · drift {tm.drift:.2g} V/s"
+                        )
                     measurement_folder = paths.data_root / "devices" / device_name / m
                     if st.button(
                         "📂 Open in Folder",
@@ -515,26 +839,18 @@ def run() -> None:
                     ):
                         _open_folder(measurement_folder)
 
-                    if st.button("Cole–Cole", key=f"cc_{device_name}_{m}", use_container_width=True):
-                        st.session_state.selected_device_structure = device_name
-                        st.session_state.selected_measurement = (device_name, m)
-                        st.session_state.selected_view = "cole_cole"
-                        st.session_state.show_all_structures = False
-                        st.rerun()
-
-                    if st.button("Standard Plot", key=f"sp_{device_name}_{m}", use_container_width=True):
-                        st.session_state.selected_device_structure = device_name
-                        st.session_state.selected_measurement = (device_name, m)
-                        st.session_state.selected_view = "standard_plot"
-                        st.session_state.show_all_structures = False
-                        st.rerun()
-
-                    if st.button("Nanothickness", key=f"nano_{device_name}_{m}", use_container_width=True):
-                        st.session_state.selected_device_structure = device_name
-                        st.session_state.selected_measurement = (device_name, m)
-                        st.session_state.selected_view = "nanothickness"
-                        st.session_state.show_all_structures = False
-                        st.rerun()
+                    for label, view, prefix in (
+                        ("Cole–Cole", "cole_cole", "cc"),
+                        ("Standard Plot", "standard_plot", "sp"),
+                        ("Nanothickness", "nanothickness", "nano"),
+                    ):
+                        st.button(
+                            label,
+                            key=f"{prefix}_{device_name}_{m}",
+                            use_container_width=True,
+                            on_click=_show_measurement,
+                            args=(device_name, m, view),
+                        )
 
                     # Soft delete measurement (and related data) if created_by matches logged-in user
                     if st.button("🗑 Delete measurement", key=f"del_{device_name}_{m}", use_container_width=True):
@@ -555,9 +871,10 @@ def run() -> None:
             # ===== CREATE FLOW =====
             device_folder = paths.data_root / "devices" / device_name
             if st.session_state.creating_measurement_for != device_name:
-                if st.button("➕ New Measurement", key=f"new_{device_name}", use_container_width=True):
-                    st.session_state.creating_measurement_for = device_name
-                    st.rerun()
+                st.button(
+                    "➕ New Measurement", key=f"new_{device_name}", use_container_width=True,
+                    on_click=_set_creating, args=(device_name,),
+                )
             else:
                 name = st.text_input("Measurement name", key=f"name_{device_name}")
                 col1, col2 = st.columns(2)
@@ -582,7 +899,136 @@ def run() -> None:
                             except ValueError as e:
                                 st.error(str(e))
                 with col2:
-                    if st.button("Cancel", key=f"cancel_{device_name}"):
-                        st.session_state.creating_measurement_for = None
-                        st.rerun()
+                    st.button("Cancel", key=f"cancel_{device_name}", on_click=_set_creating, args=(None,))
+
+
+def _performance_expander() -> None:
+    stats = POINT_CACHE.stats()
+    with st.sidebar.expander("Performance"):
+        st.caption(
+            f"Point cache: {stats.entries} read(s), {stats.bytes / 1024 / 1024:.1f} of "
+            f"{stats.budget / 1024 / 1024:.0f} MiB · {stats.hits} hit(s), {stats.misses} miss(es) "
+            f"({stats.hit_rate:.0%}) · {stats.evictions} evicted"
+        )
+        # As of this app run; fragment reruns since then are included on the next one.
+        for part, samples in st.session_state.get("ui_timings", {}).items():
+            st.caption(
+                f"{part}: last {samples[-1] * 1000:.0f} ms · "
+                f"median {statistics.median(samples) * 1000:.0f} ms over {len(samples)} run(s)"
+            )
+
+
+@_timed("app")
+def run() -> None:
+    st.set_page_config(
+        page_title="Thermal Data Local Measurement Manager",
+        layout="wide",
+    )
+
+    paths = get_paths()
+    ctx = LocalContext(db_path=paths.db_path, data_root=paths.data_root)
+
+    _init_session_state()
+    _bootstrap(paths)
+
+    # ================================
+    # HEADER
+    # ================================
+    col_title, col_user = st.columns([8, 2])
+    with col_title:
+        st.title("Thermal Data Local Measurement Manager")
+    with col_user:
+        if st.session_state.get("logged_in"):
+            col_u1, col_u2 = st.columns([3, 2])
+            with col_u1:
+                st.markdown(
+                    f"""
+                    <div style="text-align: right; padding-top: 8px;">
+                        👤 <b>{st.session_state.username}</b>
+                    </div>
+                    """,
+                    unsafe_allow_html=True,
+                )
+            with col_u2:
+                st.button("Logout", on_click=_logout)
+
+    # ================================
+    # LOGIN
+    # ================================
+    if not st.session_state.logged_in:
+
+        col_left, col_center, col_right = st.columns([1, 1, 1])
+
+        with col_center:
+            # with st.container():
+            #     st.markdown(
+            #         """
+            #         <div style="
+            #             background-color: #f9f9f9;
+            #             padding: 30px;
+            #             border-radius: 12px;
+            #             box-shadow: 0 4px 12px rgba(0,0,0,0.1);
+            #         ">
+            #         """,
+            #         unsafe_allow_html=True,
+            #     )
+                st.markdown("## 🔐 Login")
+
+                username = st.text_input("Username")
+                password = st.text_input("Password", type="password")
+
+                if st.button("Login", use_container_width=True):
+                    if not username or not password:
+                        st.error("Username and password are required")
+                    else:
+                        conn = open_sqlite(paths.db_path)
+                        cur = conn.cursor()
+                        cur.execute(
+                            """
+                            SELECT username, active, hashed_password
+                            FROM users
+                            WHERE username = ?
+                            """,
+                            (username,),
+                        )
+                        row = cur.fetchone()
+                        conn.close()
+
+                        if not row:
+                            st.error("❌ User not found")
+                        elif not row[1]:
+                            st.error("🚫 User is inactive")
+                        else:
+                            db_username, active, db_hashed_password = row
+                            if not Hasher.verify_password(password, db_hashed_password):
+                                st.error("❌ Invalid password")
+                            else:
+                                st.session_state.logged_in = True
+                                st.session_state.username = db_username
+                                if SNAPSHOT_SOURCE:
+                                    sync_from_snapshot(paths.db_path, Path(SNAPSHOT_SOURCE))
+                                else:
+                                    sync_server_to_sqlite(paths.db_path, username=db_username)
+                                st.session_state.orphaned_folders = sync_db_to_filesystem(ctx).orphaned
+                                st.success(f"Logged in as {db_username}")
+                                st.rerun()
+
+                st.markdown("</div>", unsafe_allow_html=True)
+
+        st.stop()
+
+    _main_panel(paths)
+
+    st.sidebar.title("📂 Devices Structures")
+    st.sidebar.button("Show all device structures", use_container_width=True, on_click=_show_all_structures)
+
+    if st.session_state.orphaned_folders:
+        with st.sidebar.expander(f"⚠️ {len(st.session_state.orphaned_folders)} orphaned folder(s)"):
+            st.caption("On disk under root/devices but deleted in the database. Not removed automatically.")
+            for rel_path in st.session_state.orphaned_folders:
+                st.text(rel_path)
+
+    with st.sidebar:
+        _device_browser(paths, ctx)
 
+    _performance_expander()